@@ -0,0 +1,116 @@
+# benchmarks/common.py
+"""Общие помощники для офлайн-бенчмарков (запуск: python -m benchmarks.<имя>)."""
+import os
+import sys
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+DATA_DIR = BASE_DIR / 'benchmarks' / '.data'
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def setup_django():
+    """Инициализация Django с настройками проекта."""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nepit.settings')
+    # Замеряются рабочие базы, снимки для отчетов (munepit/snapshots.py) не нужны
+    os.environ.setdefault('NEPIT_REPORT_SNAPSHOT_INTERVAL', '0')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Временная тестовая база (как в manage.py test), удаляется на выходе."""
+    from django.db import connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_names = []
+    for alias in connections:
+        connection = connections[alias]
+        old_names.append((connection, connection.settings_dict['NAME']))
+        connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        for connection, old_name in old_names:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def generated_database(rows, players=300, seed=1):
+    """
+    Путь к SQLite-базе с rows записями лога (generate_game_data).
+
+    База создается один раз и переиспользуется: данные детерминированы
+    зерном и фиксированным началом игры, поэтому замеры сравнимы между запусками.
+    """
+    import io
+    from django.core.management import call_command
+    from django.db import connections
+    from django.db.migrations.loader import MigrationLoader
+
+    # Последняя миграция в имени файла: после изменения схемы база генерируется заново
+    schema = max(name for app, name in MigrationLoader(None).graph.leaf_nodes('munepit'))[:4]
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f'game-{rows}-p{players}-s{seed}-m{schema}'
+    # Журнал может жить в отдельной базе (munepit/routers.py) - у нее свой файл
+    paths = {
+        alias: DATA_DIR / (f'{stem}.sqlite3' if alias == 'default' else f'{stem}.{alias}.sqlite3')
+        for alias in connections
+    }
+    fresh = not all(path.exists() for path in paths.values())
+    connections.close_all()
+    for alias, path in paths.items():
+        connections[alias].settings_dict['NAME'] = str(path)
+    if fresh:
+        for path in paths.values():
+            path.unlink(missing_ok=True)
+        try:
+            for alias in paths:
+                call_command('migrate', database=alias, verbosity=0)
+            call_command(
+                'generate_game_data', events=rows, players=players, seed=seed,
+                start='2026-01-01T18:00:00+00:00', stdout=io.StringIO(),
+            )
+        except BaseException:
+            connections.close_all()
+            for path in paths.values():
+                path.unlink(missing_ok=True)
+            raise
+    return paths['default']
+
+
+@contextmanager
+def capture_queries():
+    """
+    Как CaptureQueriesContext, но по всем базам: журнал и сессии могут
+    жить в отдельной базе (munepit/routers.py). Список заполняется на выходе.
+    """
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    queries = []
+    with ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        yield queries
+    for ctx in contexts:
+        queries.extend(ctx.captured_queries)
+
+
+def count_writes(captured_queries, table=None):
+    """Количество пишущих SQL-запросов (опционально - только в таблицу table)."""
+    total = 0
+    for query in captured_queries:
+        sql = query['sql'].lstrip().upper()
+        if not sql.startswith(WRITE_PREFIXES):
+            continue
+        if table and table.upper() not in sql:
+            continue
+        total += 1
+    return total
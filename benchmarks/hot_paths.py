@@ -0,0 +1,251 @@
+# benchmarks/hot_paths.py
+"""
+Микробенчмарки горячих функций моделей и представлений.
+
+    python -m benchmarks.hot_paths run --rows 10000 100000 --output base.json
+    python -m benchmarks.hot_paths run --rows 10000 100000 --output new.json
+    python -m benchmarks.hot_paths compare base.json new.json --threshold 0.1
+
+Базы генерируются командой generate_game_data и кэшируются в benchmarks/.data.
+Каждый замер - медиана из --repeat прогонов по --loops вызовов после прогрева.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks.common import generated_database, setup_django
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Регистрирует фабрику бенчмарка: fixture(rnd) -> вызываемый объект без аргументов."""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+@benchmark('infer_building_type_and_income')
+def bench_infer(rnd):
+    from munepit.models import PriceList
+    from munepit.views import _infer_building_type_and_income
+
+    catalog = list(PriceList.objects.filter(category='building').values_list('name', 'description'))
+
+    def run():
+        for name, description in catalog:
+            _infer_building_type_and_income(name, description)
+    return run
+
+
+@benchmark('get_player_resource_balance')
+def bench_resource_balance(rnd):
+    from munepit.models import LogEntry
+    from munepit.views import _get_player_resource_balance
+
+    players = list(
+        LogEntry.objects.filter(action_type='purchase').values_list('player_id', flat=True).distinct()[:50]
+    )
+    keys = ['coffee', 'cocoa', 'tobacco', 'sugar_cane']
+
+    def run():
+        _get_player_resource_balance(rnd.choice(players), rnd.choice(keys))
+    return run
+
+
+@benchmark('credit_make_payment')
+def bench_credit_payment(rnd):
+    from munepit.models import Credit
+
+    credits = list(Credit.objects.all()[:100])
+
+    def run():
+        for credit in credits:
+            credit.remaining_payments = credit.term_months
+            credit.make_payment(credit.monthly_payment * Decimal('1.7'))
+    return run
+
+
+@benchmark('dynamic_price_record_sale')
+def bench_record_sale(rnd):
+    from munepit.models import DynamicPrice
+
+    prices = list(DynamicPrice.objects.all())
+
+    def run():
+        rnd.choice(prices).record_sale(1)
+    return run
+
+
+@benchmark('dynamic_price_check_recovery')
+def bench_check_recovery(rnd):
+    from datetime import timedelta
+    from django.utils import timezone
+    from munepit.models import DynamicPrice
+
+    prices = list(DynamicPrice.objects.all())
+
+    def run():
+        # Каждый вызов проходит путь с восстановлением цены и сохранением
+        price = rnd.choice(prices)
+        price.current_price = 0
+        price.last_update = timezone.now() - timedelta(seconds=price.t_recovery)
+        price.check_recovery()
+    return run
+
+
+@benchmark('calculate_accumulated_profit')
+def bench_accumulated_profit(rnd):
+    from munepit.models import ConstructedBuilding
+
+    buildings = list(ConstructedBuilding.objects.all())
+
+    def run():
+        for building in buildings:
+            building.calculate_accumulated_profit()
+    return run
+
+
+@benchmark('statistics_view')
+def bench_statistics(rnd):
+    from django.test import RequestFactory
+    from munepit.views import statistics as statistics_view
+
+    factory = RequestFactory()
+
+    def run():
+        request = factory.get('/statistics/', {'days': 3650})
+        request.session = {'session_id': 'benchmark'}
+        statistics_view(request)
+    return run
+
+
+@benchmark('search_log')
+def bench_search_log(rnd):
+    from munepit.models import Game, LogEntry
+    from munepit.search import search_log
+
+    game_id = Game.current_id()
+    words = ['контрабанда', 'бриг', 'гавани', 'таверна', 'кофе', 'рынок']
+
+    def run():
+        # Первая страница журнала с поиском: ранжирование и подсчет для пагинации
+        results = search_log(LogEntry.objects.filter(game_id=game_id), rnd.choice(words))
+        results.count()
+        list(results[:20])
+    return run
+
+
+def measure(func, loops, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / loops)
+    return {
+        'median_s': statistics.median(samples),
+        'mean_s': statistics.fmean(samples),
+        'stdev_s': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'min_s': min(samples),
+        'loops': loops,
+        'repeat': repeat,
+    }
+
+
+def run(args):
+    setup_django()
+    from django.db import connections, transaction
+    from munepit.routers import atomic_game_and_log
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'benchmarks': {},
+    }
+    names = args.only or list(BENCHMARKS)
+    for rows in args.rows:
+        generated_database(rows, seed=args.seed)
+        for name in names:
+            rnd = random.Random(args.seed)
+            # Изменения (record_sale и т.п.) откатываются, база остается эталонной
+            with atomic_game_and_log():
+                func = BENCHMARKS[name](rnd)
+                loops = args.loops or 1
+                stats = measure(func, loops, args.repeat)
+                for alias in connections:
+                    transaction.set_rollback(True, using=alias)
+            key = f'{name}@{rows}'
+            results['benchmarks'][key] = stats
+            print(f"{key:<48} {stats['median_s'] * 1000:>10.3f} ms  ±{stats['stdev_s'] * 1000:.3f}")
+        connections.close_all()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2, ensure_ascii=False)
+        print(f'Результаты записаны в {args.output}')
+
+
+def compare(args):
+    with open(args.base, encoding='utf-8') as fh:
+        base = json.load(fh)['benchmarks']
+    with open(args.new, encoding='utf-8') as fh:
+        new = json.load(fh)['benchmarks']
+
+    regressions = 0
+    print(f"{'benchmark':<48} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for key in sorted(set(base) & set(new)):
+        before, after = base[key]['median_s'], new[key]['median_s']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -args.threshold:
+            flag = '  faster'
+        print(f'{key:<48} {before * 1000:>10.3f} {after * 1000:>10.3f} {change:>+8.1%}{flag}')
+    for key in sorted(set(base) ^ set(new)):
+        print(f'{key:<48} есть только в одном из файлов')
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='Выполнить замеры')
+    run_parser.add_argument('--rows', type=int, nargs='+', default=[10000],
+                            help='Размеры лога (например 10000 100000 1000000)')
+    run_parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Только эти бенчмарки')
+    run_parser.add_argument('--loops', type=int, default=20, help='Вызовов в одном прогоне')
+    run_parser.add_argument('--repeat', type=int, default=5, help='Количество прогонов')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--output', help='Файл JSON с результатами')
+
+    compare_parser = sub.add_parser('compare', help='Сравнить два файла результатов')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Допустимое замедление медианы (0.1 = 10%%)')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# benchmarks/session_writes.py
+"""
+Нагрузка на запись в БД на одну завершенную операцию для разных SESSION_ENGINE.
+
+Прогоняет полные сценарии "форма -> подтверждение" (сделка, суд, кредит)
+тестовым клиентом и считает пишущие запросы: всего и в django_session.
+
+    python -m benchmarks.session_writes --ops 50
+"""
+import argparse
+import json
+
+from benchmarks.common import capture_queries, count_writes, setup_django, test_database
+
+
+def _flows(client, index, prefix):
+    """Один набор завершенных операций; возвращает их количество."""
+    player = f'{prefix}{index:05d}'
+    client.post('/island/deal/', {
+        'player_a': player, 'player_b': f'{player}-2', 'description': 'Обмен ресурсами',
+    })
+    client.get('/island/deal/confirm/')
+    client.post('/island/deal/confirm/')
+
+    client.post('/island/court/', {
+        'player_id': player, 'player_name': '', 'crime_description': 'Контрабанда',
+        'fine_amount': '50.00', 'sentence_years': 1,
+    })
+    client.get('/island/court/confirm/')
+    client.post('/island/court/confirm/')
+    return 2
+
+
+def _credit_flow(client, index, prefix):
+    client.post('/britain/credit-issue/', {
+        'player_id': f'{prefix}{index:05d}', 'credit_amount': '300.00', 'term': 3,
+    })
+    client.post('/britain/credit-confirm/')
+    return 1
+
+
+def run(backend, ops):
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    engine = settings.SESSION_BACKENDS[backend]
+    alias = 'default' if backend == 'memory' else 'sessions'
+    with override_settings(SESSION_ENGINE=engine, SESSION_CACHE_ALIAS=alias):
+        island, britain = Client(), Client()
+        island.post('/', {'username': 'bench', 'table': 'island'})
+        britain.post('/', {'username': 'bench', 'table': 'britain'})
+
+        completed = 0
+        with capture_queries() as queries:
+            for index in range(ops):
+                completed += _flows(island, index, backend)
+                completed += _credit_flow(britain, index, backend)
+
+    return {
+        'backend': backend,
+        'engine': engine,
+        'operations': completed,
+        'writes_per_op': round(count_writes(queries) / completed, 2),
+        'session_writes_per_op': round(
+            count_writes(queries, 'django_session') / completed, 2
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=50, help='Повторов набора сценариев')
+    parser.add_argument('--backend', action='append', help='Только указанные движки')
+    parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+
+    backends = args.backend or list(settings.SESSION_BACKENDS)
+    with test_database():
+        results = [run(backend, args.ops) for backend in backends]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"{'backend':<8} {'ops':>6} {'writes/op':>10} {'session/op':>11}")
+    for row in results:
+        print(f"{row['backend']:<8} {row['operations']:>6} "
+              f"{row['writes_per_op']:>10} {row['session_writes_per_op']:>11}")
+
+
+if __name__ == '__main__':
+    main()
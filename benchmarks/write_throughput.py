@@ -0,0 +1,146 @@
+# benchmarks/write_throughput.py
+"""
+Пропускная способность записи журнала на текущем бэкенде БД.
+
+N потоков-столов в цикле подтверждают операции: в одной транзакции
+(на обеих базах, если журнал вынесен отдельно) пишется LogEntry
+и обновляется DynamicPrice - как при продаже товара.
+Бэкенд задается так же, как для сервера (NEPIT_DB_BACKEND), поэтому
+один и тот же прогон воспроизводится на SQLite и на PostgreSQL:
+
+    python -m benchmarks.write_throughput --writers 1 4 16 --duration 10
+    NEPIT_DB_BACKEND=postgres python -m benchmarks.write_throughput --writers 1 4 16 --duration 10
+
+SQLite работает на временном файле, PostgreSQL - на тестовой базе test_<NAME>.
+"""
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from benchmarks.common import setup_django, test_database
+
+
+@contextmanager
+def scratch_database():
+    """Пустая база с примененными миграциями на выбранном бэкенде."""
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    if connection.vendor != 'sqlite':
+        with test_database():
+            yield
+        return
+
+    # Тестовая SQLite-база живет в памяти, а нужны файлы с настоящими блокировками
+    workdir = Path(tempfile.mkdtemp(prefix='nepit-writes-'))
+    connections.close_all()
+    for alias in connections:
+        connections[alias].settings_dict['NAME'] = str(workdir / f'{alias}.sqlite3')
+    try:
+        for alias in connections:
+            call_command('migrate', database=alias, verbosity=0)
+        yield
+    finally:
+        connections.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def writer(number, deadline, latencies, failures, lock):
+    from django.db import OperationalError, connections
+    from django.db.models import F
+    from munepit.models import DynamicPrice, LogEntry
+    from munepit.routers import atomic_game_and_log
+
+    local, failed, counter = [], 0, 0
+    try:
+        while time.monotonic() < deadline:
+            counter += 1
+            started = time.perf_counter()
+            try:
+                with atomic_game_and_log():
+                    LogEntry.objects.create(
+                        author=f'writer-{number}', table='britain', action_type='sale',
+                        player_id=str(1000 + counter % 200),
+                        details={'good_key': 'rum', 'quantity': 1, 'total': 5.0},
+                    )
+                    DynamicPrice.objects.filter(good_name='rum').update(sales_count=F('sales_count') + 1)
+            except OperationalError:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+        with lock:
+            latencies.extend(local)
+            failures.append(failed)
+
+
+def run_round(writers, duration):
+    from munepit.models import DynamicPrice, LogEntry
+
+    LogEntry.objects.all().delete()
+    DynamicPrice.objects.update_or_create(
+        good_name='rum', defaults={'current_price': 5, 'pmax': 5, 'n_for_drop': 10, 't_recovery': 300},
+    )
+
+    latencies, failures, lock = [], [], threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=writer, args=(number, deadline, latencies, failures, lock))
+        for number in range(writers)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'writers': writers,
+        'commits': len(latencies),
+        'commits_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2) if latencies else 0.0,
+        'failed': sum(failures),
+        'rows': LogEntry.objects.count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 16], help='Количество пишущих потоков')
+    parser.add_argument('--duration', type=float, default=5, help='Длительность раунда (сек)')
+    parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from munepit.routers import log_database_enabled
+
+    vendor = connection.vendor
+    split = log_database_enabled()
+    with scratch_database():
+        rounds = [run_round(writers, args.duration) for writers in args.writers]
+
+    if args.json:
+        print(json.dumps({'backend': vendor, 'split_log': split, 'rounds': rounds}, indent=2))
+        return
+    print(f"Бэкенд: {vendor}, журнал в отдельной базе: {'да' if split else 'нет'}")
+    print(f"{'writers':>8} {'commits':>8} {'commit/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'failed':>7}")
+    for row in rounds:
+        print(
+            f"{row['writers']:>8} {row['commits']:>8} {row['commits_per_s']:>10} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['failed']:>7}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,4 +3,14 @@ from django.apps import AppConfig
 class MunepitConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'munepit'
-    verbose_name = 'Статистика сделок'
\ No newline at end of file
+    verbose_name = 'Статистика сделок'
+
+    def ready(self):
+        from django.core.checks import register
+
+        from .checks import check_log_split
+        from .fragments import connect_signals
+        from .snapshots import connect_signals as connect_snapshot_signals
+        connect_signals()
+        connect_snapshot_signals()
+        register(check_log_split)
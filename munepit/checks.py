@@ -0,0 +1,44 @@
+# munepit/checks.py
+"""
+Проверки конфигурации (manage.py check, runserver, migrate).
+
+munepit.E001: отдельная база журнала включена (SPLIT_LOG_DATABASE) и уже
+мигрирована, но таблицы LOG_MODELS (журнал, проводки и счета, контрольные
+точки, история цен, сессии) остались в основной базе - страницы
+показывали бы пустую историю, пока не выполнен split_log.
+"""
+from django.core.checks import Error
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .routers import LOG_DATABASE, log_database_enabled, log_models
+
+
+def _has_rows(alias, table):
+    connection = connections[alias]
+    if table not in connection.introspection.table_names():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {connection.ops.quote_name(table)} LIMIT 1')
+        return cursor.fetchone() is not None
+
+
+def check_log_split(app_configs=None, **kwargs):
+    if not log_database_enabled():
+        return []
+    stranded = []
+    try:
+        for model in log_models():
+            table = model._meta.db_table
+            # None - таблицы нет: база журнала еще не мигрирована, запросы упадут и так
+            if _has_rows(DEFAULT_DB_ALIAS, table) and _has_rows(LOG_DATABASE, table) is False:
+                stranded.append(table)
+    except DatabaseError:
+        return []
+    if stranded:
+        return [Error(
+            'Данные журнала остались в основной базе, а в базе журнала эти таблицы пусты: '
+            + ', '.join(stranded),
+            hint='Перенесите их: python manage.py split_log (или выключите NEPIT_SPLIT_LOG)',
+            id='munepit.E001',
+        )]
+    return []
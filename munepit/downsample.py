@@ -0,0 +1,111 @@
+# munepit/downsample.py
+"""
+Прореживание рядов для графиков: клиент получает не больше заданного
+числа точек, сколько бы их ни было за игру.
+
+Ряд - список (x, y) по возрастанию x. lttb() (Largest-Triangle-Three-
+Buckets) оставляет точки, которые сильнее всего меняют форму линии;
+minmax() - минимум и максимум каждого отрезка x, чтобы не терялись
+пики. Первая и последняя точки ряда сохраняются всегда.
+
+Счетчики по времени не прореживаются, а складываются в корзины в SQL:
+bucket_unit() выбирает самую мелкую единицу (минута, час, день), при
+которой корзин отрезка не больше заданного числа, а merge_buckets()
+склеивает дни, если их и так слишком много.
+"""
+import math
+
+# Единицы корзин по времени: имя (как у Trunc* в Django) и длина в секундах
+UNITS = (('minute', 60), ('hour', 3600), ('day', 86400))
+
+
+def lttb(points, threshold):
+    """Не больше threshold точек ряда (threshold >= 3)."""
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    # Внутренние точки делятся на threshold - 2 корзины поровну
+    every = (count - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        # Вершина треугольника справа - среднее следующей корзины (для последней - последняя точка)
+        start = int((bucket + 1) * every) + 1
+        end = min(int((bucket + 2) * every) + 1, count)
+        next_x = sum(x for x, _ in points[start:end]) / (end - start)
+        next_y = sum(y for _, y in points[start:end]) / (end - start)
+
+        ax, ay = points[previous]
+        chosen, largest = None, -1.0
+        for index in range(int(bucket * every) + 1, start):
+            x, y = points[index]
+            area = abs((ax - next_x) * (y - ay) - (ax - x) * (next_y - ay))
+            if area > largest:
+                chosen, largest = index, area
+        sampled.append(points[chosen])
+        previous = chosen
+    sampled.append(points[-1])
+    return sampled
+
+
+def minmax(points, threshold):
+    """Минимум и максимум на каждом из (threshold - 2) // 2 равных отрезков x."""
+    count = len(points)
+    if threshold >= count:
+        return list(points)
+    # Две точки на отрезок и еще две - концы ряда
+    buckets = (threshold - 2) // 2
+    if buckets < 1:
+        return [points[0], points[-1]]
+
+    first, last = points[0][0], points[-1][0]
+    width = (last - first) / buckets or 1
+    extremes = {}
+    for index, (x, y) in enumerate(points):
+        bucket = min(int((x - first) / width), buckets - 1)
+        low, high = extremes.get(bucket, (index, index))
+        if y < points[low][1]:
+            low = index
+        if y > points[high][1]:
+            high = index
+        extremes[bucket] = (low, high)
+
+    keep = {0, count - 1}
+    for low, high in extremes.values():
+        keep.update((low, high))
+    return [points[index] for index in sorted(keep)]
+
+
+METHODS = {'lttb': lttb, 'minmax': minmax}
+
+
+def bucket_unit(start, end, points):
+    """
+    (единица, шаг) для отрезка [start, end]: не больше points корзин.
+    Шаг больше 1 только у дней - столько дней склеивает merge_buckets().
+    """
+    span = max((end - start).total_seconds(), 1)
+    for unit, seconds in UNITS:
+        # Начало и конец отрезка попадают в неполные корзины
+        if math.ceil(span / seconds) + 1 <= points:
+            return unit, 1
+    return 'day', math.ceil((math.ceil(span / 86400) + 1) / points)
+
+
+def merge_buckets(rows, step, seconds):
+    """
+    Склеивает соседние корзины [(начало в секундах Unix, значение, ...)] по
+    step штук длиной seconds: значения складываются, начало - у первой.
+    """
+    if step <= 1:
+        return [list(row) for row in rows]
+    merged = []
+    for row in rows:
+        if merged and row[0] < merged[-1][0] + step * seconds:
+            last = merged[-1]
+            for i, value in enumerate(row[1:], 1):
+                last[i] = (last[i] or 0) + (value or 0)
+        else:
+            merged.append(list(row))
+    return merged
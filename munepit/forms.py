@@ -1,7 +1,21 @@
 # munepit/forms.py
 from django import forms
 from django.db.models import Q
-from .models import Convict, ConstructedBuilding, Credit, Privateer, PriceList  # Добавлен PriceList
+from .models import Convict, ConstructedBuilding, Credit, Privateer, PriceList, GameQuerySet, LogEntry  # Добавлен PriceList
+from .jobs import REPORTS
+from .replay import parse_at
+
+
+class CurrentGameMixin:
+    """Списки выбора из записей игры (здания, кредиты, каперы) - только текущая игра"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            queryset = getattr(field, 'queryset', None)
+            if isinstance(queryset, GameQuerySet):
+                field.queryset = queryset.current()
+
 
 class UserLoginForm(forms.Form):
     """Форма авторизации за столом"""
@@ -90,8 +104,15 @@ class CourtForm(forms.ModelForm):
             }, choices=[(0, '0 лет'), (1, '1 год'), (2, '2 года'), (3, '3 года'), (4, '4 года'), (5, '5 лет')]),
         }
 
+    def clean_player_id(self):
+        # Уникальность номера - в пределах игры (ограничение game + player_id)
+        player_id = self.cleaned_data['player_id']
+        if Convict.objects.current().filter(player_id=player_id).exists():
+            raise forms.ValidationError('Игрок уже на каторге')
+        return player_id
 
-class ConvictReleaseForm(forms.Form):
+
+class ConvictReleaseForm(CurrentGameMixin, forms.Form):
     """Форма выхода с каторги"""
     player = forms.ModelChoiceField(
         queryset=Convict.objects.all(),
@@ -164,7 +185,7 @@ class BuildingForm(forms.Form):
     )
 
 
-class ResourceProcessingForm(forms.Form):
+class ResourceProcessingForm(CurrentGameMixin, forms.Form):
     """Обработка ресурса"""
     factory = forms.ModelChoiceField(
         queryset=ConstructedBuilding.objects.filter(
@@ -187,13 +208,13 @@ class ResourceProcessingForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['factory'].queryset = ConstructedBuilding.objects.filter(
+        self.fields['factory'].queryset = ConstructedBuilding.objects.current().filter(
             Q(building_type='factory') |
             Q(building_type='other', building_name__iregex=r'(фабрик|ферм|плантац|завод)')
         )
 
 
-class BusinessProfitForm(forms.Form):
+class BusinessProfitForm(CurrentGameMixin, forms.Form):
     """Получение прибыли от бизнеса/фабрики"""
     business = forms.ModelChoiceField(
         queryset=ConstructedBuilding.objects.filter(
@@ -209,15 +230,14 @@ class BusinessProfitForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Принудительно обновляем queryset
-        self.fields['business'].queryset = ConstructedBuilding.objects.filter(
+        self.fields['business'].queryset = ConstructedBuilding.objects.current().filter(
             Q(building_type='business') |
             Q(building_type='factory') |
             Q(building_type='other', building_name__iregex=r'(магазин|ресторан|таверн|гостиниц|рынок|бизнес|фабрик|ферм|плантац|завод)')
         )
-        print(f"BusinessProfitForm инициализирована. Объектов: {self.fields['business'].queryset.count()}")
 
 
-class BuildingDemolitionForm(forms.Form):
+class BuildingDemolitionForm(CurrentGameMixin, forms.Form):
     """Снос здания"""
     building = forms.ModelChoiceField(
         queryset=ConstructedBuilding.objects.all(),
@@ -385,7 +405,7 @@ class CreditIssueForm(forms.Form):
     )
 
 
-class CreditPaymentForm(forms.Form):
+class CreditPaymentForm(CurrentGameMixin, forms.Form):
     """Внесение платежа по кредиту"""
     debtor = forms.ModelChoiceField(
         queryset=Credit.objects.all(),
@@ -472,7 +492,7 @@ class PrivateerLicenseForm(forms.Form):
     )
 
 
-class PrivateerChangeShipForm(forms.Form):
+class PrivateerChangeShipForm(CurrentGameMixin, forms.Form):
     """Смена корабля капера"""
     SHIP_CHOICES = [
         ('frigate', 'Фрегат'),
@@ -493,7 +513,7 @@ class PrivateerChangeShipForm(forms.Form):
     )
 
 
-class PrivateerComplaintForm(forms.Form):
+class PrivateerComplaintForm(CurrentGameMixin, forms.Form):
     """Подача жалобы на капера"""
     privateer = forms.ModelChoiceField(
         queryset=Privateer.objects.filter(is_active=True),
@@ -510,7 +530,7 @@ class PrivateerComplaintForm(forms.Form):
     )
 
 
-class PrivateerPaymentForm(forms.Form):
+class PrivateerPaymentForm(CurrentGameMixin, forms.Form):
     """Внесение платежа капером"""
     privateer = forms.ModelChoiceField(
         queryset=Privateer.objects.filter(is_active=True),
@@ -546,4 +566,83 @@ class QuestAcceptForm(forms.Form):
             'rows': 3,
             'placeholder': 'Опишите задание'
         })
-    )
\ No newline at end of file
+    )
+
+
+class GameStateForm(forms.Form):
+    """Момент времени и игрок для восстановления состояния по журналу"""
+    at = forms.CharField(
+        label="Момент",
+        widget=forms.DateTimeInput(attrs={
+            'class': 'form-control',
+            'type': 'datetime-local',
+            'step': 1
+        })
+    )
+    player_id = forms.CharField(
+        max_length=50,
+        required=False,
+        label="Номер игрока",
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Все игроки'
+        })
+    )
+
+    def clean_at(self):
+        try:
+            return parse_at(self.cleaned_data['at'])
+        except ValueError:
+            raise forms.ValidationError("Укажите дату и время или только время (ЧЧ:ММ)")
+
+
+class ReportJobForm(forms.Form):
+    """Заказ фонового отчета (munepit/jobs.py)"""
+    kind = forms.ChoiceField(
+        label="Отчет",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    days = forms.IntegerField(
+        min_value=1,
+        max_value=3650,
+        required=False,
+        initial=365,
+        label="За дней",
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    table = forms.ChoiceField(
+        choices=[('', 'Все столы')] + LogEntry.TABLE_CHOICES,
+        required=False,
+        label="Стол",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    player_id = forms.CharField(
+        max_length=50,
+        required=False,
+        label="Номер игрока",
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Для выгрузки игрока'
+        })
+    )
+    game = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['kind'].choices = [(kind, title) for kind, (title, _) in REPORTS.items()]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('kind') == 'player_export' and not cleaned_data.get('player_id'):
+            self.add_error('player_id', "Укажите номер игрока")
+        return cleaned_data
+
+    def params(self, game_id):
+        """Параметры задачи: только те, от которых зависит отчет, - по ним ищется готовый"""
+        kind = self.cleaned_data['kind']
+        params = {'game': self.cleaned_data.get('game') or game_id}
+        if kind == 'statistics':
+            params.update(days=self.cleaned_data.get('days') or 30, table=self.cleaned_data.get('table') or '')
+        elif kind == 'player_export':
+            params['player_id'] = self.cleaned_data['player_id'].strip()
+        return params
@@ -0,0 +1,74 @@
+# munepit/fragments.py
+"""
+Версии данных для кэша фрагментов шаблонов.
+
+Панели "последние постройки", "последние сносы", таблицы кредитов и каперов
+меняются только при записи, а рендерятся на каждом GET. У каждой модели
+есть метка версии в общем кэше settings.FRAGMENT_VERSION_CACHE; сигналы
+post_save/post_delete заменяют ее новой, и {% cache %} с этой меткой
+среди vary_on перестает находить старый фрагмент.
+
+Метка - случайная строка, а не счетчик: два воркера, записавшие одновременно,
+не могут "потерять" инкремент и оставить устаревший фрагмент.
+
+Те же сигналы и bump() обновляют версию состояния столов (munepit/state.py).
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .state import bump_tables, tables_of
+
+VERSION_KEY = 'munepit:version:{}'
+
+
+def _cache():
+    return caches[settings.FRAGMENT_VERSION_CACHE]
+
+
+def _key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def model_version(*models):
+    """Текущая метка версии данных моделей (одна строка на все)."""
+    keys = [_key(model) for model in models]
+    versions = _cache().get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        _cache().set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(versions[key] for key in keys)
+
+
+def bump(*models, instance=None):
+    """
+    Делает недействительными фрагменты, построенные по данным моделей,
+    и увеличивает версию столов этих моделей (для журнала - стола instance).
+    """
+    _cache().set_many({_key(model): uuid.uuid4().hex for model in models}, None)
+    bump_tables(*tables_of(*models, instance=instance))
+
+
+def _on_change(sender, instance=None, using=None, **kwargs):
+    # Сразу - чтобы этот же запрос не прочитал свой старый фрагмент, и после
+    # COMMIT - чтобы не остался фрагмент, отрендеренный другим запросом
+    # до фиксации записи
+    bump(sender, instance=instance)
+    transaction.on_commit(lambda: bump(sender, instance=instance), using=using)
+
+
+def connect_signals():
+    from .models import ConstructedBuilding, Convict, Credit, DynamicPrice, Game, LogEntry, PriceList, Privateer
+
+    # Game и DynamicPrice фрагментов не имеют, но меняют состояние столов
+    for model in (ConstructedBuilding, Convict, Credit, Privateer, PriceList, LogEntry, Game, DynamicPrice):
+        post_save.connect(_on_change, sender=model, dispatch_uid=f'fragments-save-{model._meta.label_lower}')
+    # Для журнала post_delete не подключается: обработчик заставил бы
+    # archive_game удалять записи по одной. Массовые операции (bulk_create,
+    # delete/update по queryset) вызывают bump() сами.
+    for model in (ConstructedBuilding, Convict, Credit, Privateer, PriceList, DynamicPrice):
+        post_delete.connect(_on_change, sender=model, dispatch_uid=f'fragments-delete-{model._meta.label_lower}')
@@ -0,0 +1,246 @@
+# munepit/jobs.py
+"""
+Фоновые отчеты.
+
+Годовая статистика, выгрузка всех операций игрока и итоги игры сканируют
+весь журнал: в запросе они могут не уложиться в таймаут воркера, а пока
+строятся - занимают поток, который нужен кассам. Поэтому страница только
+ставит задачу в очередь (submit), а строит ее отдельный процесс
+manage.py run_jobs: берет самую старую задачу (claim), читает снимки
+отчетов (munepit/snapshots.py) и пишет CSV в settings.REPORT_JOB_DIR.
+Ход задачи (процент и этап) сохраняется в ReportJob не чаще раза в
+PROGRESS_INTERVAL секунд, страница опрашивает его через api_report_job.
+
+Отчет регистрируется декоратором @report(kind, title): функция получает
+csv.writer, параметры задачи и progress(done, total, message).
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import suppress
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from . import ledger
+from .models import ConstructedBuilding, Convict, Credit, LedgerAccount, LogEntry, Privateer, ReportJob
+from .snapshots import reading_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Ход задачи пишется в базу не чаще раза в столько секунд
+PROGRESS_INTERVAL = 1.0
+
+# kind -> (название, функция отчета)
+REPORTS = {}
+
+
+def report(kind, title):
+    """Регистрирует функцию отчета под именем kind."""
+    def register(func):
+        REPORTS[kind] = (title, func)
+        return func
+    return register
+
+
+def params_key(kind, params):
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def submit(kind, params, username=''):
+    """
+    Ставит отчет в очередь: (задача, создана ли). Такой же отчет в очереди,
+    в работе или готовый не старше REPORT_JOB_CACHE_SECONDS возвращается
+    вместо новой задачи.
+    """
+    if kind not in REPORTS:
+        raise ValueError(f'Неизвестный отчет: {kind}')
+    key = params_key(kind, params)
+    fresh = timezone.now() - timedelta(seconds=settings.REPORT_JOB_CACHE_SECONDS)
+    existing = ReportJob.objects.filter(key=key).filter(
+        Q(status__in=('queued', 'running')) | Q(status='done', finished_at__gte=fresh)
+    ).order_by('-created_at').first()
+    if existing:
+        return existing, False
+    return ReportJob.objects.create(kind=kind, params=params, key=key, created_by=username), True
+
+
+def claim():
+    """
+    Самая старая задача из очереди или None. UPDATE с условием на статус:
+    два обработчика одну задачу не возьмут.
+    """
+    queued = ReportJob.objects.filter(status='queued').order_by('created_at', 'id').values_list('pk', flat=True)
+    for pk in queued[:10]:
+        now = timezone.now()
+        if ReportJob.objects.filter(pk=pk, status='queued').update(status='running', started_at=now, updated_at=now):
+            return ReportJob.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, которые давно не обновлялись (обработчик упал)."""
+    stale = timezone.now() - timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS)
+    return ReportJob.objects.filter(status='running', updated_at__lt=stale).update(
+        status='queued', progress=0, message='Возвращен в очередь',
+    )
+
+
+class Progress:
+    """progress(done, total, message): ход задачи; новый этап пишется сразу."""
+
+    def __init__(self, job):
+        self.job = job
+        self.written = 0.0
+
+    def __call__(self, done, total, message=''):
+        if message == self.job.message and time.monotonic() - self.written < PROGRESS_INTERVAL:
+            return
+        # 100% - только когда файл записан
+        percent = min(99, done * 100 // total) if total else 0
+        self.job.progress, self.job.message = percent, message
+        ReportJob.objects.filter(pk=self.job.pk).update(progress=percent, message=message, updated_at=timezone.now())
+        self.written = time.monotonic()
+
+
+def result_path(job):
+    return os.path.join(settings.REPORT_JOB_DIR, job.result)
+
+
+def run(job):
+    """Строит отчет взятой задачи и отмечает результат (готов или ошибка)."""
+    name = f'{job.pk}-{job.kind}.csv'
+    path = os.path.join(settings.REPORT_JOB_DIR, name)
+    partial = path + '.partial'
+    os.makedirs(settings.REPORT_JOB_DIR, exist_ok=True)
+    try:
+        if job.kind not in REPORTS:
+            raise ValueError(f'Неизвестный отчет: {job.kind}')
+        build = REPORTS[job.kind][1]
+        # utf-8-sig: Excel без метки порядка байтов показывает кириллицу кракозябрами
+        with reading_snapshot(), open(partial, 'w', newline='', encoding='utf-8-sig') as fh:
+            build(csv.writer(fh), job.params, Progress(job))
+        # Файл появляется под своим именем только целиком
+        os.replace(partial, path)
+    except Exception as exc:
+        logger.exception('Фоновый отчет #%s не построен', job.pk)
+        with suppress(OSError):
+            os.unlink(partial)
+        fields = {'status': 'failed', 'error': str(exc) or exc.__class__.__name__}
+    else:
+        fields = {'status': 'done', 'progress': 100, 'message': '', 'result': name}
+    now = timezone.now()
+    ReportJob.objects.filter(pk=job.pk).update(finished_at=now, updated_at=now, **fields)
+    job.refresh_from_db()
+    return job
+
+
+def _money(value):
+    return round(value, 2) if value else ''
+
+
+@report('statistics', 'Статистика за период')
+def statistics_report(writer, params, progress):
+    """Операции по дням, по типам действий и по игрокам за последние params['days'] дней."""
+    logs = LogEntry.objects.filter(
+        game_id=params['game'], timestamp__gte=timezone.now() - timedelta(days=int(params.get('days') or 30)),
+    )
+    if params.get('table'):
+        logs = logs.filter(table=params['table'])
+    logs = logs.annotate(amount=ledger.OPERATION_AMOUNT)
+    totals = {'count': Count('id'), 'total': Sum('amount', filter=Q(amount__gt=0))}
+    actions = dict(LogEntry.ACTION_TYPES)
+    # (раздел, столбец, строки, поле группировки, порядок, подпись)
+    sections = [
+        ('По дням', 'День', logs.annotate(day=TruncDay('timestamp')), 'day', 'day', lambda day: day.date()),
+        ('По типам действий', 'Действие', logs, 'action_type', '-count', lambda action: actions.get(action, action)),
+        ('По игрокам', 'Игрок', logs.exclude(player_id__isnull=True), 'player_id', '-count', str),
+    ]
+    for done, (title, column, queryset, field, order, label) in enumerate(sections):
+        progress(done, len(sections), title)
+        rows = queryset.values(field).annotate(**totals).order_by(order).values_list(field, 'count', 'total')
+        writer.writerow([title])
+        writer.writerow([column, 'Операций', 'Сумма, ₽'])
+        for key, count, total in rows:
+            writer.writerow([label(key), count, _money(total)])
+        writer.writerow([])
+
+
+@report('player_export', 'Операции игрока')
+def player_export(writer, params, progress):
+    """Все операции игрока по порядку с деньгами по проводкам и остатком после каждой."""
+    player_id = str(params['player_id'])
+    entries = LogEntry.objects.filter(game_id=params['game']).filter(
+        # Накопленную прибыль снесенного здания получает владелец, а не тот, кто сносил
+        Q(player_id=player_id) | Q(action_type='demolition', details__owner=player_id)
+    ).order_by('timestamp', 'id')
+    total = entries.count()
+    writer.writerow(['Время', 'Стол', 'Действие', 'Сумма, ₽', 'Остаток, ₽', 'Подробности'])
+    balance = Decimal(0)
+    for done, entry in enumerate(entries.iterator(chunk_size=2000), 1):
+        amount = sum((value for account, value in ledger.postings(entry) if account == player_id), Decimal(0))
+        balance += amount
+        writer.writerow([
+            timezone.localtime(entry.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+            entry.get_table_display(), entry.get_action_type_display(),
+            amount or '', balance, json.dumps(entry.details, ensure_ascii=False),
+        ])
+        progress(done, total, 'Операции')
+
+
+@report('game_summary', 'Итоги игры')
+def game_summary(writer, params, progress):
+    """Строка на игрока: деньги по счету, операции, здания, долг, каторга и капер."""
+    game_id = params['game']
+    stages = 6
+    progress(0, stages, 'Счета')
+    accounts = {
+        account.account: account for account in LedgerAccount.objects.filter(game_id=game_id)
+        if not ledger.is_bank(account.account)
+    }
+    progress(1, stages, 'Журнал')
+    operations = dict(
+        LogEntry.objects.filter(game_id=game_id).exclude(player_id__isnull=True)
+        .values('player_id').annotate(count=Count('id')).values_list('player_id', 'count')
+    )
+    progress(2, stages, 'Здания')
+    buildings = dict(
+        ConstructedBuilding.objects.filter(game_id=game_id)
+        .values('owner_id').annotate(count=Count('id')).values_list('owner_id', 'count')
+    )
+    progress(3, stages, 'Кредиты')
+    debts = {}
+    for player_id, monthly, remaining in Credit.objects.filter(game_id=game_id).values_list(
+        'player_id', 'monthly_payment', 'remaining_payments',
+    ):
+        debts[player_id] = debts.get(player_id, 0) + monthly * remaining
+    progress(4, stages, 'Каторга и каперы')
+    convicts = set(Convict.objects.filter(game_id=game_id).values_list('player_id', flat=True))
+    privateers = {
+        privateer.player_id: privateer
+        for privateer in Privateer.objects.filter(game_id=game_id, is_active=True)
+    }
+
+    progress(5, stages, 'Запись')
+    writer.writerow([
+        'Игрок', 'Остаток, ₽', 'Внесено, ₽', 'Получено, ₽', 'Операций', 'Зданий',
+        'Долг по кредиту, ₽', 'На каторге', 'Капер', 'Жалоб',
+    ])
+    players = set(accounts) | set(operations) | set(buildings) | set(debts) | convicts | set(privateers)
+    for player_id in sorted(players, key=lambda p: (len(p), p)):
+        account = accounts.get(player_id)
+        privateer = privateers.get(player_id)
+        writer.writerow([
+            player_id,
+            account.balance if account else 0, account.paid_in if account else 0, account.received if account else 0,
+            operations.get(player_id, 0), buildings.get(player_id, 0), debts.get(player_id) or '',
+            'да' if player_id in convicts else '',
+            privateer.get_ship_type_display() if privateer else '', privateer.complaints if privateer else '',
+        ])
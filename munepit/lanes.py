@@ -0,0 +1,174 @@
+# munepit/lanes.py
+"""
+Полосы запросов: кассы отдельно от отчетов.
+
+В одном WSGI-процессе модератор, открывший годовую статистику или
+карточку игрока с тысячами операций, занимает те же потоки и соединения
+с базой, что и кассы столов. LaneMiddleware относит запрос к полосе по
+имени маршрута (nepit/urls.py):
+
+    cash    - операции столов, их API, вход и выход (по умолчанию - все,
+              что не отнесено к другим полосам: новую кассу не задушит)
+    reports - отчеты из REPORT_ROUTES
+    other   - статика и служебные адреса, без учета
+
+Кассы пропускаются всегда. Отчетов одновременно не больше
+settings.REPORT_LANE_LIMIT, и они не начинаются, пока в кассах
+settings.CASH_LANE_BUSY и больше запросов: отчет ждет до
+settings.REPORT_LANE_WAIT секунд, а потом получает 503 с Retry-After.
+
+Задержки по полосам (число, отказы, в работе, среднее, p50, p95, максимум
+по последним LATENCY_SAMPLES запросам) отдает stats() - ее показывает
+api_lanes; у каждого ответа - заголовок Server-Timing с полосой,
+ожиданием и временем.
+Счетчики живут в памяти процесса: при нескольких воркерах лимиты и
+метрики - на воркер.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+
+# Маршруты отчетов: долгие чтения журнала, снимков и фоновых отчетов
+REPORT_ROUTES = {
+    'transaction_list', 'transaction_detail', 'statistics', 'statistics_table',
+    'player_search', 'player_detail', 'game_state', 'report_jobs', 'report_job_download',
+    'api_report_job', 'api_statistics_series', 'api_price_history',
+}
+
+# Без учета и ограничений: статика и сами метрики
+OTHER_ROUTES = {'static_asset', 'api_lanes'}
+
+# Сколько последних времен ответа хранится для перцентилей
+LATENCY_SAMPLES = 1000
+
+
+class Lane:
+    """Счетчики полосы; меняются только под _condition."""
+
+    def __init__(self, name):
+        self.name = name
+        self.in_flight = 0
+        self.requests = 0
+        self.rejected = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=LATENCY_SAMPLES)
+
+    def stats(self):
+        recent = sorted(self.recent)
+
+        def percentile(share):
+            return round(recent[min(len(recent) - 1, int(len(recent) * share))] * 1000, 1) if recent else None
+
+        return {
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'mean_ms': round(self.total / self.requests * 1000, 1) if self.requests else None,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max * 1000, 1),
+        }
+
+
+LANES = {name: Lane(name) for name in ('cash', 'reports')}
+
+_condition = threading.Condition()
+
+
+def route_name(path):
+    try:
+        return resolve(path).url_name
+    except Resolver404:
+        return None
+
+
+def classify(name):
+    """Полоса запроса по имени маршрута (None - адрес не найден)."""
+    if name is None or name in OTHER_ROUTES:
+        return 'other'
+    return 'reports' if name in REPORT_ROUTES else 'cash'
+
+
+def _has_room(lane):
+    if lane.name != 'reports':
+        return True
+    limit = settings.REPORT_LANE_LIMIT
+    if limit and lane.in_flight >= limit:
+        return False
+    return LANES['cash'].in_flight < settings.CASH_LANE_BUSY
+
+
+def admit(name, wait=0):
+    """Занимает место в полосе; False - не дождались wait секунд (отказ учтен)."""
+    lane = LANES[name]
+    with _condition:
+        if not _condition.wait_for(lambda: _has_room(lane), timeout=wait):
+            lane.rejected += 1
+            return False
+        lane.in_flight += 1
+        return True
+
+
+def release(name, elapsed):
+    """Освобождает место и учитывает время ответа (вместе с ожиданием допуска)."""
+    lane = LANES[name]
+    with _condition:
+        lane.in_flight -= 1
+        lane.requests += 1
+        lane.total += elapsed
+        lane.max = max(lane.max, elapsed)
+        lane.recent.append(elapsed)
+        # Освободилось место отчету или касса перестала быть занятой
+        _condition.notify_all()
+
+
+def stats():
+    with _condition:
+        return {name: dict(lane.stats(), name=name) for name, lane in LANES.items()}
+
+
+def reset():
+    """Сбрасывает счетчики (для тестов и после смены лимитов)."""
+    with _condition:
+        for name in LANES:
+            LANES[name] = Lane(name)
+        _condition.notify_all()
+
+
+class LaneMiddleware:
+    """Допуск запроса в полосу, учет времени ответа и заголовок Server-Timing."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        name = route_name(request.path_info)
+        lane = classify(name)
+        if lane == 'other':
+            return self.get_response(request)
+
+        started = time.monotonic()
+        wait = settings.REPORT_LANE_WAIT if lane == 'reports' else 0
+        if not admit(lane, wait):
+            message = 'Кассы заняты, отчет будет доступен через несколько секунд'
+            if name.startswith('api_'):
+                response = JsonResponse({'success': False, 'error': message}, status=503)
+            else:
+                response = HttpResponse(message, status=503, content_type='text/plain; charset=utf-8')
+            response['Retry-After'] = str(max(1, round(settings.REPORT_LANE_WAIT)))
+            return response
+        queued = time.monotonic() - started
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.monotonic() - started
+            release(lane, elapsed)
+        response['Server-Timing'] = (
+            f'lane;desc="{lane}", queue;dur={queued * 1000:.1f}, app;dur={(elapsed - queued) * 1000:.1f}'
+        )
+        return response
@@ -0,0 +1,200 @@
+# munepit/ledger.py
+"""
+Денежные проводки по журналу.
+
+Суммы операций лежат в details под разными ключами (total, amount, fine,
+profit, price, reward, accumulated_profit). postings() переводит запись
+журнала в проводки с подписанной суммой: игрок платит банку стола
+(bank:island, bank:britain) или получает от него, и сумма проводок
+записи равна нулю.
+
+record() пишет проводки и прибавляет обороты к LedgerAccount (один upsert
+на пачку) в транзакции записи журнала (LogEntry.save), поэтому "сколько
+внес и получил игрок" и "самые богатые игроки" - чтение одной строки или
+начала индекса.
+rebuild() пересчитывает проводки игры по журналу заново: после
+bulk_create и для игр, записанных до появления проводок.
+"""
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import FloatField
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import LedgerAccount, LedgerEntry, LogEntry
+
+BANK_ACCOUNT = 'bank:{}'
+
+# Игрок платит банку стола: ключ суммы в details
+PAYMENTS = {
+    'court': 'fine',
+    'purchase': 'total',
+    'building': 'cost',
+    'processing': 'total',
+    'sale': 'total',
+    'factory_work': 'total',
+    'credit_payment': 'amount',
+    'coal_purchase': 'amount',
+    'privateer_payment': 'amount',
+}
+
+# Игрок получает от банка стола
+RECEIPTS = {
+    'profit': 'profit',
+    'credit_issue': 'amount',
+    'quest_accept': 'reward',
+}
+
+CENT = Decimal('0.01')
+
+# Сумма операции для отчетов (выражение SQL): первый из ключей details
+# total, amount, fine - без знака и без учета, кто платит
+OPERATION_AMOUNT = Coalesce(*(Cast(KT(f'details__{key}'), FloatField()) for key in ('total', 'amount', 'fine')))
+
+
+def _money(value):
+    try:
+        return Decimal(str(value or 0)).quantize(CENT)
+    except ArithmeticError:
+        return Decimal(0)
+
+
+def is_bank(account):
+    return account.startswith(BANK_ACCOUNT.format(''))
+
+
+def postings(entry):
+    """[(счет, сумма)] записи журнала; пустой список, если денег в ней нет."""
+    details = entry.details or {}
+    player_id, amount = entry.player_id, Decimal(0)
+    if entry.action_type in PAYMENTS:
+        amount = -_money(details.get(PAYMENTS[entry.action_type]))
+    elif entry.action_type in RECEIPTS:
+        amount = _money(details.get(RECEIPTS[entry.action_type]))
+    elif entry.action_type == 'ship_deal':
+        price = _money(details.get('price'))
+        amount = price if details.get('deal_type') == 'продажа' else -price
+    elif entry.action_type == 'demolition':
+        # Накопленную прибыль снесенного здания получает владелец
+        player_id = details.get('owner') or player_id
+        amount = _money(details.get('accumulated_profit'))
+    if not player_id or not amount:
+        return []
+    return [(str(player_id), amount), (BANK_ACCOUNT.format(entry.table), -amount)]
+
+
+def _apply(account, amount, at):
+    account.balance += amount
+    if amount < 0:
+        account.paid_in -= amount
+    else:
+        account.received += amount
+    account.updated_at = at
+
+
+def _entry(log_entry, account, amount, balance_after):
+    return LedgerEntry(
+        log_entry_id=log_entry.pk, timestamp=log_entry.timestamp, table=log_entry.table,
+        account=account, amount=amount, balance_after=balance_after, game_id=log_entry.game_id,
+    )
+
+
+def _add_to_accounts(game_id, deltas, at, using):
+    """
+    Прибавляет обороты {счет: (остаток, внесено, получено)} к счетам игры
+    одним INSERT ... ON CONFLICT DO UPDATE ... RETURNING (SQLite 3.35+,
+    PostgreSQL) и возвращает новые остатки. Строки счетов заблокированы до
+    конца транзакции: одновременные проводки по счету не теряются, а
+    недостающие счета создаются тем же запросом.
+    """
+    connection = connections[using]
+    ops = connection.ops
+    quote = ops.quote_name
+    table = quote(LedgerAccount._meta.db_table)
+    game, account, balance, paid_in, received, updated_at = [
+        quote(LedgerAccount._meta.get_field(name).column)
+        for name in ('game', 'account', 'balance', 'paid_in', 'received', 'updated_at')
+    ]
+    params = []
+    for name, amounts in deltas.items():
+        params += [game_id, name, *map(ops.adapt_decimalfield_value, amounts), ops.adapt_datetimefield_value(at)]
+    rows = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(deltas))
+    sql = (
+        f'INSERT INTO {table} ({game}, {account}, {balance}, {paid_in}, {received}, {updated_at}) '
+        f'VALUES {rows} ON CONFLICT ({game}, {account}) DO UPDATE SET '
+        f'{balance} = {table}.{balance} + excluded.{balance}, '
+        f'{paid_in} = {table}.{paid_in} + excluded.{paid_in}, '
+        f'{received} = {table}.{received} + excluded.{received}, '
+        f'{updated_at} = excluded.{updated_at} '
+        f'RETURNING {account}, {balance}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {name: _money(value) for name, value in cursor.fetchall()}
+
+
+def record(entries, using=None):
+    """Проводки сохраненных записей журнала: upsert счетов и одна вставка на игру."""
+    using = using or router.db_for_write(LedgerEntry)
+    by_game = {}
+    for entry in entries:
+        lines = postings(entry)
+        if lines:
+            by_game.setdefault(entry.game_id, []).append((entry, lines))
+    if not by_game:
+        return []
+
+    created = []
+    with transaction.atomic(using=using):
+        for game_id, items in by_game.items():
+            deltas = {}
+            for entry, lines in items:
+                for name, amount in lines:
+                    delta = deltas.setdefault(name, [Decimal(0)] * 3)
+                    delta[0] += amount
+                    delta[1 if amount < 0 else 2] += abs(amount)
+            balances = _add_to_accounts(game_id, deltas, items[-1][0].timestamp, using)
+
+            # Остаток после каждой проводки: итог счета минус более поздние проводки
+            rows = []
+            for entry, lines in reversed(items):
+                for name, amount in reversed(lines):
+                    rows.append(_entry(entry, name, amount, balances[name]))
+                    balances[name] -= amount
+            created += LedgerEntry.objects.using(using).bulk_create(rows[::-1])
+    return created
+
+
+def rebuild(game_id, batch_size=5000):
+    """Проводки и счета игры заново по всему журналу (в порядке записи)."""
+    using = router.db_for_write(LedgerEntry)
+    with transaction.atomic(using=using):
+        LedgerEntry.objects.using(using).filter(game_id=game_id).delete()
+        LedgerAccount.objects.using(using).filter(game_id=game_id).delete()
+
+        accounts = {}
+        rows = []
+        count = 0
+        log = LogEntry.objects.using(router.db_for_read(LogEntry)).filter(game_id=game_id).order_by('id')
+        for entry in log.iterator(chunk_size=2000):
+            for name, amount in postings(entry):
+                if name not in accounts:
+                    accounts[name] = LedgerAccount(game_id=game_id, account=name, updated_at=timezone.now())
+                _apply(accounts[name], amount, entry.timestamp)
+                rows.append(_entry(entry, name, amount, accounts[name].balance))
+            if len(rows) >= batch_size:
+                count += len(LedgerEntry.objects.using(using).bulk_create(rows))
+                rows = []
+        count += len(LedgerEntry.objects.using(using).bulk_create(rows))
+        LedgerAccount.objects.using(using).bulk_create(accounts.values(), batch_size=batch_size)
+    return {'entries': count, 'accounts': len(accounts)}
+
+
+def top_accounts(game_id, limit=10):
+    """Игроки с наибольшим остатком (банки столов не в счет)."""
+    return [
+        account for account in LedgerAccount.objects.filter(game_id=game_id).order_by('-balance')[:limit + 2]
+        if not is_bank(account.account)
+    ][:limit]
@@ -0,0 +1,112 @@
+# munepit/management/commands/archive_game.py
+import gzip
+import os
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+from django.utils import timezone
+
+from munepit.models import (
+    Game, LogEntry, ConstructedBuilding, Convict, Credit, Privateer, LedgerAccount, LedgerEntry,
+    StateCheckpoint, PriceHistory,
+)
+from munepit.routers import atomic_game_and_log
+
+
+# Таблицы, строки которых принадлежат игре
+GAME_MODELS = [LogEntry, ConstructedBuilding, Convict, Credit, Privateer, PriceHistory]
+
+# Проводки и контрольные точки пересчитываются по журналу (rebuild_ledger,
+# replay_state) - в архив не идут, только удаляются
+DERIVED_MODELS = [LedgerEntry, LedgerAccount, StateCheckpoint]
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос завершенной игры из рабочих таблиц в архив '
+        '(таблицы archive_* или сжатый JSONL) с последующим VACUUM'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_id', type=int, help='id завершенной игры')
+        parser.add_argument('--format', choices=['jsonl', 'tables'], default='jsonl',
+                            help='jsonl - файл game-<id>.jsonl.gz, tables - таблицы archive_* в той же базе')
+        parser.add_argument('--output', default=os.path.join(settings.BASE_DIR, 'archive'),
+                            help='Каталог для JSONL-архивов')
+        parser.add_argument('--no-vacuum', action='store_true', help='Не выполнять VACUUM после переноса')
+
+    def handle(self, *args, **options):
+        try:
+            game = Game.objects.get(pk=options['game_id'])
+        except Game.DoesNotExist:
+            raise CommandError(f"Игра #{options['game_id']} не найдена")
+        if not game.is_finished:
+            raise CommandError('Игра еще идет: сначала начните новую (manage.py new_game)')
+        if game.archived_at:
+            raise CommandError(f'Игра уже в архиве: {game.archive_location}')
+
+        if options['format'] == 'jsonl':
+            location = self.write_jsonl(game, options['output'])
+        else:
+            location = 'archive_* tables'
+
+        # Журнал может жить в отдельной базе - транзакция на обеих
+        with atomic_game_and_log():
+            for model in DERIVED_MODELS:
+                model.objects.for_game(game).delete()
+            for model in GAME_MODELS:
+                queryset = model.objects.for_game(game)
+                if options['format'] == 'tables':
+                    self.copy_to_table(model, game)
+                count, _ = queryset.delete()
+                self.stdout.write(f'  {model._meta.verbose_name_plural}: {count}')
+            game.archived_at = timezone.now()
+            game.archive_location = location
+            game.save(update_fields=['archived_at', 'archive_location'])
+
+        if not options['no_vacuum']:
+            self.vacuum()
+        self.stdout.write(self.style.SUCCESS(f'Игра #{game.pk} перенесена в архив: {location}'))
+
+    def write_jsonl(self, game, output):
+        """Строки игры в формате сериализатора jsonl (их можно вернуть через loaddata)."""
+        os.makedirs(output, exist_ok=True)
+        path = os.path.join(output, f'game-{game.pk}.jsonl.gz')
+        partial = path + '.partial'
+        with gzip.open(partial, 'wt', encoding='utf-8') as fh:
+            serializers.serialize('jsonl', [game], stream=fh)
+            for model in GAME_MODELS:
+                rows = model.objects.for_game(game).order_by('pk').iterator(chunk_size=2000)
+                serializers.serialize('jsonl', rows, stream=fh)
+        # Файл появляется под своим именем только целиком
+        os.replace(partial, path)
+        return path
+
+    def copy_to_table(self, model, game):
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        table = model._meta.db_table
+        archive = quote(f'archive_{table}')
+        columns = ', '.join(quote(field.column) for field in model._meta.concrete_fields)
+        game_column = quote(model._meta.get_field('game').column)
+        with connection.cursor() as cursor:
+            # CREATE TABLE ... AS SELECT работает и в SQLite, и в PostgreSQL
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {archive} AS SELECT {columns} FROM {quote(table)} WHERE 1 = 0')
+            cursor.execute(
+                f'INSERT INTO {archive} ({columns}) SELECT {columns} FROM {quote(table)} WHERE {game_column} = %s',
+                [game.pk],
+            )
+
+    def vacuum(self):
+        """Возврат освободившегося места: VACUUM нельзя выполнять внутри транзакции."""
+        for alias in sorted({router.db_for_write(model) for model in GAME_MODELS}):
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute('VACUUM')
+                elif connection.vendor == 'postgresql':
+                    for model in GAME_MODELS:
+                        if router.db_for_write(model) == alias:
+                            cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
@@ -0,0 +1,59 @@
+# munepit/management/commands/build_static.py
+import gzip
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Текстовые форматы, которые имеет смысл сжимать заранее
+COMPRESSIBLE = {'.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml'}
+# Мельче - заголовки ответа съедают выигрыш
+MIN_SIZE = 256
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает статику в STATIC_ROOT: имена с хешем содержимого (collectstatic) '
+        'и сжатые копии .gz и .br (если установлен пакет brotli)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-clear', action='store_true',
+                            help='Не удалять прежнюю сборку из STATIC_ROOT')
+
+    def handle(self, *args, **options):
+        call_command('collectstatic', interactive=False, clear=not options['no_clear'],
+                     verbosity=0, stdout=self.stdout)
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('Пакет brotli не установлен: только .gz'))
+
+        root = Path(settings.STATIC_ROOT)
+        files = original = compressed = 0
+        for path in sorted(root.rglob('*')):
+            if not path.is_file() or path.suffix not in COMPRESSIBLE:
+                continue
+            data = path.read_bytes()
+            if len(data) < MIN_SIZE:
+                continue
+            # mtime=0 - одинаковые файлы дают одинаковые .gz от сборки к сборке
+            variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, payload in variants.items():
+                if len(payload) < len(data):
+                    path.with_name(path.name + suffix).write_bytes(payload)
+            files += 1
+            original += len(data)
+            compressed += min(len(payload) for payload in variants.values())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Статика собрана в {root}: сжато {files} файлов, '
+            f'{original / 1024:.0f} КБ -> {compressed / 1024:.0f} КБ'
+        ))
@@ -0,0 +1,454 @@
+# munepit/management/commands/generate_game_data.py
+import io
+import math
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from munepit.forms import GoodsSaleForm, ResourcePurchaseForm, ShipDealForm
+from munepit.fragments import bump
+from munepit.ledger import rebuild
+from munepit.replay import forget
+from munepit.models import (
+    LogEntry, PriceList, Convict, ConstructedBuilding,
+    Credit, Privateer, DynamicPrice, Game, PriceHistory
+)
+from munepit.routers import atomic_game_and_log
+from munepit.views import _infer_building_type_and_income
+
+
+# Доля каждого действия в потоке событий игрового вечера
+ACTION_WEIGHTS = {
+    'island': [
+        ('deal', 6), ('court', 2), ('release', 1), ('purchase', 14), ('building', 6),
+        ('processing', 6), ('profit', 12), ('demolition', 1),
+    ],
+    'britain': [
+        ('sale', 20), ('ship_deal', 3), ('factory_work', 8), ('credit_issue', 2),
+        ('credit_payment', 6), ('coal_purchase', 5), ('privateer_license', 2),
+        ('privateer_ship', 1), ('privateer_complaint', 2), ('privateer_payment', 4),
+        ('quest_accept', 3),
+    ],
+}
+
+CRIMES = ['Контрабанда рома', 'Драка в порту', 'Кража со склада', 'Подделка векселя', 'Пиратство']
+QUESTS = ['Сопроводить конвой', 'Доставить почту на остров', 'Найти пропавший бриг', 'Охрана гавани']
+AUTHORS = {'island': ['Анна', 'Иван', 'Мария'], 'britain': ['Джон', 'Елена', 'Петр']}
+
+# Начало игры по умолчанию: одно и то же зерно дает одни и те же данные
+# при любом запуске, включая время записей и точек истории цен
+DEFAULT_START = '2026-01-01T18:00:00+00:00'
+
+
+class Bag:
+    """Множество ключей с выбором случайного элемента за O(1)."""
+
+    def __init__(self):
+        self.items = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, key):
+        if key not in self.index:
+            self.index[key] = len(self.items)
+            self.items.append(key)
+
+    def discard(self, key):
+        position = self.index.pop(key, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.index[last] = position
+
+    def choice(self, rnd):
+        return rnd.choice(self.items)
+
+
+class GameState:
+    """Состояние игры, которое поддерживается по мере генерации событий."""
+
+    def __init__(self, rnd, players, next_building_id, catalog, goods):
+        self.rnd = rnd
+        self.players = players
+        self.next_building_id = next_building_id
+        self.catalog = catalog
+        self.goods = goods
+        self.buildings = {}
+        self.convicts = {}
+        self.credits = {}
+        self.privateers = {}
+        self.factories = Bag()
+        self.earning = Bag()
+        self.standing = Bag()
+        self.active_privateers = Bag()
+        self.prices = {
+            key: {'price': item.pmax, 'sales': 0, 'updated': None, 'item': item}
+            for key, item in goods.items()
+        }
+        # Изменения цен по ходу игры: DynamicPrice.save() записал бы их текущим временем
+        self.price_points = []
+
+    def player(self):
+        return self.rnd.choice(self.players)
+
+    def add_building(self, building):
+        self.buildings[building.id] = building
+        self.standing.add(building.id)
+        if building.building_type == 'factory':
+            self.factories.add(building.id)
+        if building.building_type in ('business', 'factory'):
+            self.earning.add(building.id)
+
+    def remove_building(self, building_id):
+        for bag in (self.standing, self.factories, self.earning):
+            bag.discard(building_id)
+        return self.buildings.pop(building_id)
+
+
+class Command(BaseCommand):
+    help = 'Детерминированная генерация игровых данных для бенчмарков (лог и таблицы состояния)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=300, help='Количество игроков')
+        parser.add_argument('--events', type=int, default=100000, help='Количество записей лога')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора')
+        parser.add_argument('--hours', type=float, default=4, help='Длительность игрового вечера (ч)')
+        parser.add_argument('--start', default=DEFAULT_START, help=f'Начало игры (ISO 8601), по умолчанию {DEFAULT_START}')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--clear', action='store_true', help='Удалить данные текущей игры')
+
+    def handle(self, *args, **options):
+        if options['players'] < 2:
+            raise CommandError('Нужно минимум два игрока')
+
+        if not PriceList.objects.exists():
+            call_command('init_prices', stdout=io.StringIO())
+
+        start = datetime.fromisoformat(options['start'])
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+
+        with atomic_game_and_log():
+            if options['clear']:
+                for model in (LogEntry, Convict, ConstructedBuilding, Credit, Privateer, PriceHistory):
+                    model.objects.current().delete()
+                DynamicPrice.objects.all().delete()
+            counts = self.generate(options, start)
+        # bulk_create и удаление по queryset не шлют сигналов, которые сбрасывают кэш панелей
+        bump(LogEntry, Convict, ConstructedBuilding, Credit, Privateer, DynamicPrice)
+
+        for label, value in counts.items():
+            self.stdout.write(f'  {label}: {value}')
+        self.stdout.write(self.style.SUCCESS('Генерация завершена'))
+
+    def generate(self, options, start):
+        rnd = random.Random(options['seed'])
+        catalog = list(PriceList.objects.filter(category='building').order_by('name'))
+        goods = {
+            key: PriceList.objects.get(name=label, category='goods')
+            for key, label in GoodsSaleForm.GOODS_CHOICES
+        }
+        next_building_id = (ConstructedBuilding.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        players = [str(1000 + i) for i in range(options['players'])]
+        state = GameState(rnd, players, next_building_id, catalog, goods)
+        # Все записи - в текущую игру; явный game_id не дергает default на каждой строке
+        state.game_id = Game.current_id()
+
+        duration = options['hours'] * 3600
+        offsets = sorted(rnd.random() * duration for _ in range(options['events']))
+        tables = ['island', 'britain']
+
+        batch = []
+        for offset in offsets:
+            now = start + timedelta(seconds=offset)
+            table = rnd.choice(tables)
+            names, weights = zip(*ACTION_WEIGHTS[table])
+            action_type = rnd.choices(names, weights)[0]
+            action_type, player_id, details = self.event(state, action_type, now)
+            batch.append(LogEntry(
+                timestamp=now,
+                author=rnd.choice(AUTHORS[table]),
+                table=table,
+                action_type=action_type,
+                player_id=player_id,
+                details=details,
+                game_id=state.game_id,
+            ))
+            if len(batch) >= options['batch_size']:
+                LogEntry.objects.bulk_create(batch)
+                batch = []
+        LogEntry.objects.bulk_create(batch)
+        # bulk_create не пишет проводок - они считаются по журналу игры целиком
+        rebuild(state.game_id, batch_size=options['batch_size'])
+        # Записи легли задним числом - контрольные точки состояния устарели
+        forget(state.game_id)
+
+        self.save_state(state, start, options['batch_size'])
+        return {
+            'Записей лога': options['events'],
+            'Зданий': len(state.buildings),
+            'Каторжников': len(state.convicts),
+            'Кредитов': len(state.credits),
+            'Каперов': len(state.active_privateers),
+        }
+
+    def event(self, state, action_type, now):
+        """Возвращает (action_type, player_id, details) в формате соответствующей view."""
+        rnd = state.rnd
+        player_id = state.player()
+        money = lambda total: float(math.ceil(total) + rnd.choice([0, 0, 5, 10, 50]))
+
+        # Действия над отсутствующими объектами заменяются на их создание
+        if action_type == 'release' and not state.convicts:
+            action_type = 'court'
+        if action_type in ('processing', 'profit', 'demolition') and not state.standing:
+            action_type = 'building'
+        if action_type == 'credit_payment' and not state.credits:
+            action_type = 'credit_issue'
+        if action_type in ('privateer_ship', 'privateer_complaint', 'privateer_payment', 'quest_accept') \
+                and not state.active_privateers:
+            action_type = 'privateer_license'
+
+        if action_type == 'deal':
+            return action_type, None, {
+                'player_a': player_id, 'player_b': state.player(),
+                'description': f'Обмен ресурсами #{rnd.randint(1, 999)}',
+            }
+
+        if action_type == 'court':
+            if player_id in state.convicts:
+                return self.event(state, 'release', now)
+            convict = Convict(
+                player_id=player_id, crime_description=rnd.choice(CRIMES),
+                fine_amount=Decimal(rnd.choice([20, 50, 100, 200])),
+                confiscation=rnd.random() < 0.2, sentence_years=rnd.randint(1, 5),
+                sentenced_by='generator', sentenced_at=now,
+            )
+            # Каторжники пишутся bulk_create, без save()
+            convict.schedule_release()
+            state.convicts[player_id] = convict
+            return action_type, player_id, {
+                'crime': convict.crime_description, 'fine': float(convict.fine_amount),
+                'confiscation': convict.confiscation, 'sentence': convict.sentence_years,
+            }
+
+        if action_type == 'release':
+            player_id = rnd.choice(list(state.convicts))
+            convict = state.convicts.pop(player_id)
+            served = now - convict.sentenced_at
+            return action_type, player_id, {
+                'early_release': rnd.random() < 0.3,
+                'time_served_seconds': int(served.total_seconds()),
+                'time_served_formatted': str(served).split('.')[0],
+            }
+
+        if action_type == 'purchase':
+            key, name = rnd.choice(ResourcePurchaseForm.RESOURCE_CHOICES)
+            quantity = rnd.randint(1, 5)
+            price = {'coffee': 10, 'cocoa': 12, 'tobacco': 15, 'sugar_cane': 8}[key]
+            total = quantity * price
+            money_input = money(total)
+            return action_type, player_id, {
+                'resource': name, 'resource_key': key, 'quantity': quantity,
+                'price_per_unit': price, 'total': total, 'money_input': money_input,
+                'change': money_input - total, 'operation': 'resource_sale',
+                'stock_delta': -quantity,
+            }
+
+        if action_type == 'building':
+            item = rnd.choice(state.catalog)
+            building_type, income = _infer_building_type_and_income(item.name, item.description)
+            building = ConstructedBuilding(
+                id=state.next_building_id, building_name=item.name, building_type=building_type,
+                owner_id=player_id, built_by='generator', built_at=now, cost=item.base_price,
+                last_profit_collected=now, income_per_minute=income,
+            )
+            state.add_building(building)
+            state.next_building_id += 1
+            return action_type, player_id, {'building': item.name, 'cost': float(item.base_price)}
+
+        if action_type == 'processing':
+            if not state.factories:
+                return self.event(state, 'building', now)
+            factory = state.buildings[state.factories.choice(rnd)]
+            quantity = rnd.randint(1, 10)
+            total = quantity * 5.0
+            money_input = money(total)
+            return action_type, factory.owner_id, {
+                'factory': factory.building_name, 'quantity': quantity, 'total': total,
+                'money_input': money_input, 'change': money_input - total,
+            }
+
+        if action_type == 'profit':
+            if not state.earning:
+                return self.event(state, 'building', now)
+            business = state.buildings[state.earning.choice(rnd)]
+            minutes = (now - business.last_profit_collected).total_seconds() / 60
+            profit = round(minutes * float(business.income_per_minute), 2)
+            business.last_profit_collected = now
+            return action_type, business.owner_id, {
+                'business': business.building_name, 'business_id': business.id,
+                'building_type': business.building_type, 'profit': profit,
+                'income_per_minute': float(business.income_per_minute),
+            }
+
+        if action_type == 'demolition':
+            building = state.remove_building(state.standing.choice(rnd))
+            accumulated = 0
+            if building.building_type == 'business':
+                minutes = (now - building.last_profit_collected).total_seconds() / 60
+                accumulated = round(minutes * float(building.income_per_minute), 2)
+            return action_type, player_id, {
+                'building': building.building_name, 'building_type': building.building_type,
+                'owner': building.owner_id, 'demolisher': player_id,
+                'accumulated_profit': accumulated,
+            }
+
+        if action_type == 'sale':
+            key = rnd.choice(sorted(state.prices))
+            price = state.prices[key]
+            item = price['item']
+            if price['updated'] and (now - price['updated']).total_seconds() >= item.t_recovery:
+                if float(price['price']) != float(item.pmax):
+                    state.price_points.append(PriceHistory(good_name=key, price=item.pmax, timestamp=now))
+                price['price'], price['sales'] = item.pmax, 0
+            quantity = rnd.randint(1, 5)
+            price_per_unit = float(price['price'])
+            total = quantity * price_per_unit
+            money_input = money(total)
+            price['sales'] += quantity
+            new_price = max(0, float(item.pmax) - price['sales'] // item.n_for_drop)
+            if new_price != float(price['price']):
+                state.price_points.append(PriceHistory(good_name=key, price=new_price, timestamp=now))
+            price['price'] = new_price
+            price['updated'] = now
+            return action_type, player_id, {
+                'good': key, 'quantity': quantity, 'price_per_unit': price_per_unit,
+                'total': total, 'money_input': money_input, 'change': money_input - total,
+            }
+
+        if action_type == 'ship_deal':
+            ship = rnd.choice(ShipDealForm.SHIP_CHOICES)[0]
+            price = float(rnd.choice([800, 1500, 3000, 5000]))
+            if rnd.random() < 0.7:
+                money_input = money(price)
+                return action_type, player_id, {
+                    'ship': ship, 'deal_type': 'покупка', 'price': price,
+                    'money_input': money_input, 'change': money_input - price,
+                }
+            return action_type, player_id, {'ship': ship, 'deal_type': 'продажа', 'price': price * 0.5}
+
+        if action_type == 'factory_work':
+            quantity = rnd.randint(1, 20)
+            total = quantity * 2.0
+            money_input = money(total)
+            return action_type, player_id, {
+                'quantity': quantity, 'price_per_unit': 2.0, 'total': total,
+                'money_input': money_input, 'change': money_input - total,
+            }
+
+        if action_type == 'credit_issue':
+            if player_id in state.credits:
+                return self.event(state, 'credit_payment', now)
+            amount = Decimal(rnd.choice([200, 300, 500, 1000]))
+            term = rnd.randint(2, 6)
+            monthly = (amount / term) * Decimal('1.5')
+            state.credits[player_id] = Credit(
+                player_id=player_id, credit_amount=amount, term_months=term,
+                monthly_payment=monthly, remaining_payments=term, issued_by='generator',
+                issued_at=now, last_payment_at=now,
+            )
+            return action_type, player_id, {'amount': float(amount), 'term': term, 'monthly': float(monthly)}
+
+        if action_type == 'credit_payment':
+            player_id = rnd.choice(list(state.credits))
+            credit = state.credits[player_id]
+            amount = credit.monthly_payment.quantize(Decimal('0.01'))
+            closed = credit.make_payment(amount)
+            credit.last_payment_at = now
+            if closed:
+                del state.credits[player_id]
+            return action_type, player_id, {
+                'amount': float(amount), 'remaining': 0 if closed else credit.remaining_payments,
+                'closed': closed,
+            }
+
+        if action_type == 'coal_purchase':
+            amount = float(rnd.choice([10, 20, 30, 50]))
+            money_input = money(amount)
+            return action_type, player_id, {
+                'amount': amount, 'money_input': money_input, 'change': money_input - amount,
+            }
+
+        if action_type == 'privateer_license':
+            privateer = state.privateers.get(player_id)
+            if privateer and privateer.is_active and rnd.random() < 0.3:
+                privateer.is_active = False
+                state.active_privateers.discard(player_id)
+                return action_type, player_id, {'action': 'dismiss', 'ship_type': None}
+            ship_type = rnd.choice(Privateer.SHIP_CHOICES)[0]
+            if privateer:
+                privateer.is_active = True
+            else:
+                state.privateers[player_id] = Privateer(
+                    player_id=player_id, ship_type=ship_type, licensed_by='generator',
+                    licensed_at=now, last_payment_at=now,
+                )
+            state.active_privateers.add(player_id)
+            return action_type, player_id, {'action': 'issue', 'ship_type': ship_type}
+
+        player_id = state.active_privateers.choice(rnd)
+        privateer = state.privateers[player_id]
+
+        if action_type == 'privateer_ship':
+            old_ship = privateer.ship_type
+            privateer.ship_type = rnd.choice(Privateer.SHIP_CHOICES)[0]
+            return action_type, player_id, {'old_ship': old_ship, 'new_ship': privateer.ship_type}
+
+        if action_type == 'privateer_complaint':
+            value = rnd.choice([1, 1, 1, 2, -1])
+            privateer.complaints += value
+            return action_type, player_id, {'value': value, 'new_total': privateer.complaints}
+
+        if action_type == 'privateer_payment':
+            privateer.last_payment_at = now
+            return action_type, player_id, {'amount': 50.0}
+
+        return 'quest_accept', player_id, {
+            'reward': float(rnd.choice([100, 200, 300, 500])), 'description': rnd.choice(QUESTS),
+        }
+
+    def save_state(self, state, start, batch_size):
+        ConstructedBuilding.objects.bulk_create(state.buildings.values(), batch_size=batch_size)
+        # id зданий заданы явно; PostgreSQL не сдвигает последовательность сам
+        for sql in connection.ops.sequence_reset_sql(no_style(), [ConstructedBuilding]):
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+        Convict.objects.bulk_create(state.convicts.values(), batch_size=batch_size)
+        Credit.objects.bulk_create(state.credits.values(), batch_size=batch_size)
+        Privateer.objects.bulk_create(state.privateers.values(), batch_size=batch_size)
+        PriceHistory.objects.bulk_create(state.price_points, batch_size=batch_size)
+        # Цены - тоже без save(): он добавил бы в историю точку с текущим временем
+        DynamicPrice.objects.filter(good_name__in=state.prices).delete()
+        DynamicPrice.objects.bulk_create([
+            DynamicPrice(
+                good_name=key, current_price=price['price'], pmax=price['item'].pmax,
+                n_for_drop=price['item'].n_for_drop, t_recovery=price['item'].t_recovery,
+                sales_count=price['sales'],
+            )
+            for key, price in state.prices.items()
+        ])
+        # auto_now ставит last_update при вставке; update() - время последней продажи в игре
+        for key, price in state.prices.items():
+            DynamicPrice.objects.filter(good_name=key).update(last_update=price['updated'] or start)
@@ -0,0 +1,103 @@
+# munepit/management/commands/index_advisor.py
+import io
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import get_resolver, resolve, reverse
+
+from munepit.models import Game, LogEntry, UserSession
+from munepit.query_plans import analyze, capture
+
+# Страницы без чтения (выход, статика) и вход, который пишет сессию
+SKIP = {'login', 'logout', 'static_asset'}
+
+# Страницы с параметрами: горячие фильтры журнала и карточки.
+# {player} и {entry} заменяются игроком и записью текущей игры
+VARIANTS = [
+    ('transaction_list', {}, {'table': 'island', 'action_type': 'purchase'}),
+    ('transaction_list', {}, {'player_id': '{player}'}),
+    ('transaction_list', {}, {'q': 'бриг'}),
+    ('statistics_table', {'table': 'britain'}, {'days': '7'}),
+    ('player_search', {}, {'q': '{player}'}),
+    ('player_detail', {'player_id': '{player}'}, {}),
+    ('transaction_detail', {'pk': '{entry}'}, {}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Обходит страницы столов и отчетов (только GET), выполняет EXPLAIN для каждого '
+        'их SQL-запроса и сообщает полные сканы таблиц и индексы, не выбранные ни одним планом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться с ошибкой, если найден полный скан')
+
+    def handle(self, *args, **options):
+        substitutions = self.sample_values()
+        pages = [
+            (pattern.name, {}, {}) for pattern in get_resolver().url_patterns
+            if pattern.name and pattern.name not in SKIP and not pattern.pattern.regex.groups
+        ]
+        pages += VARIANTS
+
+        factory = RequestFactory()
+        queries = []
+        first_page = {}
+        # Страницы столов требуют активную сессию стола - она удаляется после обхода
+        session = UserSession.objects.create(username='index_advisor', table='island')
+        try:
+            for name, kwargs, params in pages:
+                try:
+                    kwargs = {key: value.format(**substitutions) for key, value in kwargs.items()}
+                    params = {key: value.format(**substitutions) for key, value in params.items()}
+                except KeyError:
+                    # В игре еще нет записей журнала
+                    continue
+                path = reverse(name, kwargs=kwargs)
+                request = factory.get(path, params)
+                request.session = {'session_id': str(session.session_id), 'username': session.username}
+                match = resolve(path)
+                # Отладочный print() представлений не смешивается с отчетом
+                with capture() as page_queries, redirect_stdout(io.StringIO()):
+                    match.func(request, *match.args, **match.kwargs)
+                label = f"{path}?{request.META['QUERY_STRING']}".rstrip('?')
+                for query in page_queries:
+                    first_page.setdefault(query, label)
+                queries.extend(page_queries)
+        finally:
+            session.delete()
+
+        report = analyze(queries)
+        verbose = options['verbosity'] > 1
+        scans = 0
+        for alias, sql, plan, full_scans in report['queries']:
+            if not full_scans and not verbose:
+                continue
+            scans += bool(full_scans)
+            title = f"{first_page[(alias, sql)]} [{alias}]"
+            if full_scans:
+                title += ': полный скан ' + ', '.join(full_scans)
+            self.stdout.write(self.style.WARNING(title) if full_scans else title)
+            self.stdout.write(f'  {sql}')
+            for line in plan:
+                self.stdout.write(f'    {line}')
+
+        for (alias, table), indexes in report['unused'].items():
+            self.stdout.write(self.style.NOTICE(
+                f"{table} [{alias}]: не используются индексы {', '.join(indexes)}"
+            ))
+
+        self.stdout.write(
+            f"Страниц: {len(pages)}, запросов: {len(report['queries'])}, с полным сканом: {scans}"
+        )
+        if scans and options['check']:
+            raise CommandError('Есть запросы с полным сканом таблицы')
+
+    def sample_values(self):
+        entry = LogEntry.objects.filter(game_id=Game.current_id()).exclude(player_id=None).first()
+        if entry is None:
+            return {}
+        return {'player': entry.player_id, 'entry': entry.pk}
@@ -0,0 +1,331 @@
+# munepit/management/commands/load_game_night.py
+import io
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.urls import resolve
+
+from munepit.models import ConstructedBuilding, Convict, Credit, LogEntry, Privateer
+
+
+# Сценарии столов и их относительная частота за игровой вечер
+ISLAND_SCENARIOS = [
+    ('deal', 3),
+    ('purchase', 5),
+    ('build', 3),
+    ('profit', 4),
+    ('process', 2),
+    ('court', 1),
+]
+BRITAIN_SCENARIOS = [
+    ('sale', 6),
+    ('factory_work', 2),
+    ('coal', 2),
+    ('credit_issue', 1),
+    ('credit_payment', 3),
+    ('privateer_payment', 2),
+]
+POLL_URLS = ['/api/dynamic-price/', '/api/building-profit/', '/api/convict-time/', '/api/timers/']
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Recorder:
+    """Потокобезопасный сборщик задержек по именам URL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.locked = defaultdict(int)
+
+    def add(self, name, seconds, status, exc=None):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if exc is not None and 'locked' in str(exc):
+                self.locked[name] += 1
+            elif exc is not None or status >= 500:
+                self.errors[name] += 1
+
+
+class Station(threading.Thread):
+    """Один стол: логинится и выполняет сценарии с экспоненциальными паузами."""
+
+    def __init__(self, table, number, recorder, deadline, think, seed):
+        super().__init__(name=f'{table}-{number}', daemon=True)
+        self.table = table
+        self.number = number
+        self.recorder = recorder
+        self.deadline = deadline
+        self.think = think
+        self.rnd = random.Random(seed)
+        self.client = Client(SERVER_NAME='127.0.0.1', raise_request_exception=False)
+        self.counter = 0
+
+    def request(self, method, path, data=None):
+        name = resolve(path.split('?')[0]).url_name
+        started = time.perf_counter()
+        exc = None
+        status = 0
+        try:
+            response = getattr(self.client, method)(path, data or {})
+            status = response.status_code
+            if getattr(response, 'exc_info', None):
+                exc = response.exc_info[1]
+        except OperationalError as e:
+            exc = e
+        self.recorder.add(name, time.perf_counter() - started, status, exc)
+
+    def player(self):
+        return str(1000 + self.rnd.randint(0, 199))
+
+    def unique_player(self):
+        self.counter += 1
+        return f'{self.name}-{self.counter}'
+
+    def pick(self, model, **filters):
+        ids = list(model.objects.filter(**filters).values_list('id', flat=True)[:200])
+        return self.rnd.choice(ids) if ids else None
+
+    def run(self):
+        try:
+            self.request('post', '/', {'username': self.name, 'table': self.table})
+            scenarios = ISLAND_SCENARIOS if self.table == 'island' else BRITAIN_SCENARIOS
+            names = [name for name, _ in scenarios]
+            weights = [weight for _, weight in scenarios]
+            while time.monotonic() < self.deadline:
+                scenario = self.rnd.choices(names, weights)[0]
+                getattr(self, f'do_{scenario}')()
+                time.sleep(self.rnd.expovariate(1 / self.think) if self.think else 0)
+        finally:
+            connections.close_all()
+
+    # --- Остров ---
+    def do_deal(self):
+        self.request('post', '/island/deal/', {
+            'player_a': self.player(), 'player_b': self.player(), 'description': 'Обмен ресурсами',
+        })
+        self.request('post', '/island/deal/confirm/')
+
+    def do_purchase(self):
+        resource = self.rnd.choice(['coffee', 'cocoa', 'tobacco', 'sugar_cane'])
+        self.request('post', '/island/purchase/', {
+            'resource': resource, 'player_id': self.player(), 'quantity': self.rnd.randint(1, 3),
+        })
+        self.request('post', '/island/purchase/confirm/', {'money_input': '1000'})
+
+    def do_build(self):
+        building = self.rnd.choice(self.buildings)
+        self.request('post', '/island/build/', {'building': building, 'player_id': self.player()})
+        self.request('post', '/island/build/confirm/')
+
+    def do_profit(self):
+        business = self.pick(ConstructedBuilding, building_type__in=['business', 'factory'])
+        if business:
+            self.request('post', '/island/profit/', {'business': business})
+
+    def do_process(self):
+        factory = self.pick(ConstructedBuilding, building_type='factory')
+        if factory:
+            self.request('post', '/island/process/', {'factory': factory, 'quantity': 2})
+            self.request('post', '/island/process/confirm/', {'money_input': '1000'})
+
+    def do_court(self):
+        self.request('post', '/island/court/', {
+            'player_id': self.unique_player(), 'crime_description': 'Контрабанда',
+            'fine_amount': '50.00', 'sentence_years': self.rnd.randint(1, 5),
+        })
+        self.request('post', '/island/court/confirm/')
+
+    # --- Великобритания ---
+    def do_sale(self):
+        self.request('post', '/britain/sale/', {
+            'good': self.rnd.choice(['textile', 'rum', 'tools', 'weapons']),
+            'player_id': self.player(), 'quantity': self.rnd.randint(1, 5), 'money_input': '1000',
+        })
+
+    def do_factory_work(self):
+        self.request('post', '/britain/factory-work/', {
+            'player_id': self.player(), 'quantity': self.rnd.randint(1, 10), 'money_input': '100',
+        })
+
+    def do_coal(self):
+        self.request('post', '/britain/coal/', {
+            'player_id': self.player(), 'amount': '30', 'money_input': '50',
+        })
+
+    def do_credit_issue(self):
+        self.request('post', '/britain/credit-issue/', {
+            'player_id': self.unique_player(), 'credit_amount': '300', 'term': self.rnd.randint(2, 6),
+        })
+        self.request('post', '/britain/credit-confirm/')
+
+    def do_credit_payment(self):
+        credit = self.pick(Credit)
+        if credit:
+            self.request('post', '/britain/credit-payment/', {'debtor': credit, 'payment_amount': '150'})
+
+    def do_privateer_payment(self):
+        privateer = self.pick(Privateer, is_active=True)
+        if privateer:
+            self.request('post', '/britain/privateer-payment/', {'privateer': privateer})
+
+
+class Poller(Station):
+    """Страница стола, опрашивающая /api/ с фиксированным интервалом."""
+
+    def run(self):
+        try:
+            self.request('post', '/', {'username': self.name, 'table': self.table})
+            while time.monotonic() < self.deadline:
+                path = self.rnd.choice(POLL_URLS)
+                if path == '/api/dynamic-price/':
+                    query = {'good': self.rnd.choice(['textile', 'rum', 'tools', 'weapons'])}
+                elif path == '/api/building-profit/':
+                    query = {'building_id': self.pick(ConstructedBuilding) or 0}
+                elif path == '/api/timers/':
+                    query = {'table': self.table}
+                else:
+                    query = {'convict_id': self.pick(Convict) or 0}
+                self.request('get', path, query)
+                time.sleep(self.think)
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный прогон игрового вечера: N столов Остров, M столов Великобритания и опрос /api/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--island', type=int, default=4, help='Количество столов "Остров"')
+        parser.add_argument('--britain', type=int, default=3, help='Количество столов "Великобритания"')
+        parser.add_argument('--pollers', type=int, default=4, help='Количество страниц, опрашивающих /api/')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность прогона (сек)')
+        parser.add_argument('--think', type=float, default=1.0,
+                            help='Средняя пауза кассира между операциями (сек)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Интервал опроса /api/ (сек)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--from-db', help='Скопировать начальное состояние (база default) из этого SQLite-файла')
+        parser.add_argument('--json', action='store_true', help='Вывести отчет в JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Прогон рассчитан на SQLite: он работает на временной копии базы')
+
+        workdir = Path(tempfile.mkdtemp(prefix='nepit-load-'))
+        if options['from_db']:
+            shutil.copyfile(options['from_db'], workdir / 'default.sqlite3')
+
+        # Все потоки открывают соединения по этим же settings_dict;
+        # журнал может жить в отдельной базе (munepit/routers.py) - ей свой файл
+        connections.close_all()
+        for alias in connections:
+            connections[alias].settings_dict['NAME'] = str(workdir / f'{alias}.sqlite3')
+        try:
+            self.prepare(options['seed'])
+            report = self.run_load(options)
+        finally:
+            connections.close_all()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.print_report(report)
+
+    def prepare(self, seed):
+        # Снимки для отчетов создаются backup'ом из рабочих баз, не миграциями
+        snapshots = set(settings.REPORT_SNAPSHOTS.values())
+        for alias in connections:
+            if alias not in snapshots:
+                call_command('migrate', database=alias, verbosity=0)
+        call_command('init_prices', stdout=io.StringIO())
+        # Стартовые запасы ресурсов, чтобы покупки на Острове проходили проверку склада
+        rnd = random.Random(seed)
+        LogEntry.objects.bulk_create([
+            LogEntry(
+                author='load', table='island', action_type='purchase', player_id=str(1000 + i),
+                details={'resource_key': key, 'quantity': 1000, 'stock_delta': 1000},
+            )
+            for i in range(200)
+            for key in ('coffee', 'cocoa', 'tobacco', 'sugar_cane')
+            if rnd.random() < 0.9
+        ])
+
+    def run_load(self, options):
+        from munepit.models import PriceList
+
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + options['duration']
+        buildings = list(PriceList.objects.filter(category='building').values_list('id', flat=True))
+        connections.close_all()
+
+        workers = []
+        seed = options['seed']
+        for table, count in (('island', options['island']), ('britain', options['britain'])):
+            for number in range(count):
+                seed += 1
+                station = Station(table, number, recorder, deadline, options['think'], seed)
+                station.buildings = buildings
+                workers.append(station)
+        for number in range(options['pollers']):
+            seed += 1
+            table = 'island' if number % 2 == 0 else 'britain'
+            workers.append(Poller(table, f'poll{number}', recorder, deadline, options['poll_interval'], seed))
+
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+
+        urls = {}
+        for name, values in sorted(recorder.latencies.items()):
+            urls[name] = {
+                'requests': len(values),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'errors': recorder.errors[name],
+                'locked': recorder.locked[name],
+            }
+        total = sum(row['requests'] for row in urls.values())
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+            'locked': sum(recorder.locked.values()),
+            'errors': sum(recorder.errors.values()),
+            'urls': urls,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(self.style.NOTICE(
+            f"Запросов: {report['requests']} за {report['elapsed_s']} с "
+            f"({report['throughput_rps']} rps), блокировок SQLite: {report['locked']}, "
+            f"ошибок: {report['errors']}"
+        ))
+        self.stdout.write(f"{'url':<32} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'lock':>5}")
+        for name, row in report['urls'].items():
+            self.stdout.write(
+                f"{name:<32} {row['requests']:>6} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                f"{row['p99_ms']:>8} {row['errors']:>5} {row['locked']:>5}"
+            )
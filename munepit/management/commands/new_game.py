@@ -0,0 +1,24 @@
+# munepit/management/commands/new_game.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from munepit.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Завершить текущую игру и начать новую: журнал и таблицы состояния начинаются с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Название новой игры')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for game in Game.objects.filter(ended_at__isnull=True):
+                game.finish()
+                self.stdout.write(f'Завершена игра #{game.pk}: {game}')
+            game = Game.objects.create(
+                name=options['name'] or f"Игра {timezone.now().strftime('%d.%m.%Y')}"
+            )
+        Game.forget_current()
+        self.stdout.write(self.style.SUCCESS(f'Начата игра #{game.pk}: {game}'))
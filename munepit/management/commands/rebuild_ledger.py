@@ -0,0 +1,25 @@
+# munepit/management/commands/rebuild_ledger.py
+from django.core.management.base import BaseCommand, CommandError
+
+from munepit.ledger import rebuild
+from munepit.models import Game
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать денежные проводки и остатки счетов игры по журналу: '
+        'для игр, записанных до появления проводок, и после загрузки журнала bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', type=int, help='id игры (по умолчанию - текущая)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        game_id = options['game'] or Game.current_id()
+        if not Game.objects.filter(pk=game_id).exists():
+            raise CommandError(f'Игра #{game_id} не найдена')
+        counts = rebuild(game_id, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Игра #{game_id}: проводок {counts['entries']}, счетов {counts['accounts']}"
+        ))
@@ -0,0 +1,58 @@
+# munepit/management/commands/replay_state.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from munepit.models import Game
+from munepit.replay import parse_at, player_state, state_at, write_checkpoints
+
+
+class Command(BaseCommand):
+    help = (
+        'Состояние игры на момент времени по журналу (здания, ресурсы, кредиты, '
+        'каторга, каперы, деньги); --checkpoint - записать контрольные точки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', help="Момент: 'ГГГГ-ММ-ДД ЧЧ:ММ' или 'ЧЧ:ММ' (сегодня)")
+        parser.add_argument('--player', help='Номер игрока (по умолчанию - все игроки)')
+        parser.add_argument('--game', type=int, help='id игры (по умолчанию - текущая)')
+        parser.add_argument('--json', action='store_true', help='Вывести состояние в JSON')
+        parser.add_argument('--checkpoint', action='store_true',
+                            help='Записать контрольные точки по всему журналу (для периодического запуска)')
+
+    def handle(self, *args, **options):
+        game_id = options['game'] or Game.current_id()
+        if not Game.objects.filter(pk=game_id).exists():
+            raise CommandError(f'Игра #{game_id} не найдена')
+
+        if options['checkpoint']:
+            result = write_checkpoints(game_id)
+            self.stdout.write(self.style.SUCCESS(
+                f"Игра #{game_id}: учтено записей {result['entries']}, новых точек {result['saved']}"
+            ))
+            return
+
+        if not options['at']:
+            raise CommandError('Укажите --at или --checkpoint')
+        try:
+            at = parse_at(options['at'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        result = state_at(game_id, at)
+        players = result['state']['players']
+        if options['player']:
+            players = {options['player']: player_state(result['state'], options['player'])}
+
+        if options['json']:
+            self.stdout.write(json.dumps(players, ensure_ascii=False, indent=2, sort_keys=True))
+        else:
+            for player_id in sorted(players):
+                self.stdout.write(f'Игрок {player_id}: {json.dumps(players[player_id], ensure_ascii=False, sort_keys=True)}')
+        start = result['checkpoint']
+        self.stderr.write(
+            f"Состояние на {at:%Y-%m-%d %H:%M:%S}: записей {result['entries']}, "
+            f"проиграно {result['replayed']} "
+            + (f'от точки {start.timestamp:%Y-%m-%d %H:%M:%S}' if start else 'с начала журнала')
+        )
@@ -0,0 +1,15 @@
+# munepit/management/commands/reschedule_convicts.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from munepit.models import Convict
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать сроки выхода каторжников текущей игры после изменения CONVICT_SECONDS_PER_YEAR'
+
+    def handle(self, *args, **options):
+        count = Convict.objects.current().reschedule()
+        self.stdout.write(self.style.SUCCESS(
+            f'Сроки пересчитаны для {count} каторжников: год = {settings.CONVICT_SECONDS_PER_YEAR} с'
+        ))
@@ -0,0 +1,44 @@
+# munepit/management/commands/run_jobs.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from munepit import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Обработчик фоновых отчетов (munepit/jobs.py): строит отчеты из очереди '
+        'отдельным от веб-сервера процессом, чтобы кассы не ждали отчетов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь и выйти (для cron и проверок)')
+        parser.add_argument('--poll', type=float, default=2.0,
+                            help='Пауза между проверками пустой очереди, сек')
+
+    def handle(self, *args, **options):
+        done = 0
+        try:
+            while True:
+                # Соединения рабочих баз не держатся между задачами дольше CONN_MAX_AGE
+                close_old_connections()
+                requeued = jobs.requeue_stale()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших задач: {requeued}'))
+                job = jobs.claim()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                started = time.monotonic()
+                job = jobs.run(job)
+                done += 1
+                status = self.style.SUCCESS('готов') if job.status == 'done' else self.style.ERROR(f'ошибка: {job.error}')
+                self.stdout.write(f'#{job.pk} {job.kind}: {status} за {time.monotonic() - started:.1f} с')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'Обработано задач: {done}')
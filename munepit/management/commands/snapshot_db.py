@@ -0,0 +1,46 @@
+# munepit/management/commands/snapshot_db.py
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from munepit import snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Снимок SQLite-баз через online backup API без остановки столов: '
+        'обновляет снимки для отчетов или пишет резервную копию в --output'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Каталог для резервной копии ({alias}.sqlite3)')
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Только эта база (можно повторять)')
+
+    def handle(self, *args, **options):
+        snapshot_aliases = set(settings.REPORT_SNAPSHOTS.values())
+        aliases = options['databases'] or [alias for alias in connections if alias not in snapshot_aliases]
+        for alias in aliases:
+            if alias not in connections:
+                raise CommandError(f'Нет базы {alias}')
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'База {alias} не SQLite: используйте pg_dump')
+
+        if not options['output']:
+            if not settings.REPORT_SNAPSHOTS:
+                raise CommandError('Снимки для отчетов выключены (NEPIT_REPORT_SNAPSHOT_INTERVAL=0)')
+            sources = [alias for alias in aliases if alias in settings.REPORT_SNAPSHOTS]
+            snapshots.refresh(sources)
+            for source in sources:
+                self.stdout.write(f'{source} -> {settings.REPORT_SNAPSHOTS[source]}')
+            self.stdout.write(self.style.SUCCESS('Снимки для отчетов обновлены'))
+            return
+
+        output = Path(options['output'])
+        for alias in aliases:
+            target = output / f'{alias}.sqlite3'
+            snapshots.backup(alias, target)
+            self.stdout.write(f'{alias} -> {target}')
+        self.stdout.write(self.style.SUCCESS(f'Резервная копия записана в {output}'))
@@ -0,0 +1,75 @@
+# munepit/management/commands/split_log.py
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.utils import timezone
+
+from munepit.models import Game, LogEntry
+from munepit.routers import LOG_DATABASE, log_database_enabled, log_models
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос всех моделей LOG_MODELS (журнал, проводки и счета, контрольные точки, '
+        'история цен, сессии) из основной базы в базу журнала '
+        '(однократно после включения SPLIT_LOG_DATABASE на существующей базе)'
+    )
+
+    # Запускается, пока проверка munepit.E001 (журнал не перенесен) не пройдена
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not log_database_enabled():
+            raise CommandError('Отдельная база журнала выключена (включается NEPIT_SPLIT_LOG=1)')
+
+        source, target = connections['default'], connections[LOG_DATABASE]
+        existing = set(source.introspection.table_names())
+        models = [model for model in log_models() if model._meta.db_table in existing]
+        # Проверка до переноса: иначе часть таблиц осталась бы в основной базе
+        for model in models:
+            if model.objects.using(LOG_DATABASE).exists():
+                raise CommandError(f'{model._meta.db_table} в базе журнала уже не пуст: перенос уже выполнялся?')
+
+        moved = []
+        # Контрольные точки переносятся вместе с журналом, а не сбрасываются:
+        # id записей сохраняются, и точки остаются верными
+        for model in models:
+            table = model._meta.db_table
+            # Старая таблица может отставать по схеме (например, без game_id)
+            with source.cursor() as cursor:
+                legacy = {column.name for column in source.introspection.get_table_description(cursor, table)}
+            columns = [field.column for field in model._meta.concrete_fields if field.column in legacy]
+            column_list = ', '.join(source.ops.quote_name(column) for column in columns)
+            placeholders = ', '.join(['%s'] * len(columns))
+            insert = (
+                f'INSERT INTO {target.ops.quote_name(table)} ({column_list}) VALUES ({placeholders})'
+            )
+
+            copied = 0
+            with transaction.atomic(using='default'), transaction.atomic(using=LOG_DATABASE):
+                with source.cursor() as read, target.cursor() as write:
+                    read.execute(f'SELECT {column_list} FROM {source.ops.quote_name(table)}')
+                    while rows := read.fetchmany(options['batch_size']):
+                        write.executemany(insert, rows)
+                        copied += len(rows)
+                    read.execute(f'DELETE FROM {source.ops.quote_name(table)}')
+            moved.append(model)
+            self.stdout.write(f'  {table}: {copied}')
+
+        # id перенесены как есть - последовательности PostgreSQL продолжают после них
+        with target.cursor() as cursor:
+            for sql in target.ops.sequence_reset_sql(no_style(), moved):
+                cursor.execute(sql)
+
+        # Записи до появления игр - в ту же завершенную игру, что и остальное старое состояние
+        orphans = LogEntry.objects.using(LOG_DATABASE).filter(game__isnull=True)
+        if orphans.exists():
+            legacy = Game.objects.filter(ended_at__isnull=False).order_by('started_at').first()
+            if legacy is None:
+                legacy = Game.objects.create(name='Игры до разделения', ended_at=timezone.now())
+            orphans.update(game_id=legacy.pk)
+
+        self.stdout.write(self.style.SUCCESS('Журнал перенесен в отдельную базу'))
@@ -0,0 +1,89 @@
+# munepit/management/commands/tune_prices.py
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from munepit import simulator
+from munepit.models import Game, PriceList
+
+
+class Command(BaseCommand):
+    help = (
+        'Подобрать pmax, n_for_drop и t_recovery товаров Великобритании перебором '
+        'на истории продаж или синтетическом спросе (нужен numpy)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', type=int, help='Игра, чьи продажи проигрываются (по умолчанию - текущая)')
+        parser.add_argument('--synthetic', action='store_true', help='Синтетический спрос вместо истории')
+        parser.add_argument('--hours', type=float, default=3, help='Длительность синтетической игры, ч')
+        parser.add_argument('--rate', type=float, default=2, help='Покупателей товара в минуту (синтетика)')
+        parser.add_argument('--seed', type=int, default=1, help='Seed синтетического спроса')
+        parser.add_argument('--tolerance', type=float, default=1.2,
+                            help='Во сколько раз покупатель из истории готов переплатить против уплаченной цены')
+        parser.add_argument('--steps', type=int, default=20, help='Точек сетки по каждому параметру')
+        parser.add_argument('--min-fill', type=float, default=0.8, help='Минимальная доля обслуженного спроса')
+        parser.add_argument('--goods', nargs='+', choices=sorted(simulator.GOODS), help='Товары (по умолчанию все)')
+        parser.add_argument('--trace', help='JSON-файл с ценами по покупателям: выбранные и нынешние параметры')
+        parser.add_argument('--apply', action='store_true', help='Записать выбранные параметры в PriceList и DynamicPrice')
+
+    def handle(self, *args, **options):
+        if simulator.np is None:
+            raise CommandError('Для симулятора нужен пакет numpy: pip install numpy')
+        started = time.monotonic()
+        goods = options['goods'] or sorted(simulator.GOODS)
+
+        if options['synthetic']:
+            rng = simulator.np.random.default_rng(options['seed'])
+            streams = {}
+            for good in goods:
+                current = simulator.current_parameters(good)
+                if current:
+                    streams[good] = simulator.synthetic_stream(
+                        rng, options['hours'] * 3600, options['rate'] / 60, current[0],
+                    )
+        else:
+            game_id = options['game'] or Game.current_id()
+            streams = simulator.sale_streams(game_id, tolerance=options['tolerance'])
+
+        reports = {}
+        for good in goods:
+            current = simulator.current_parameters(good)
+            stream = streams.get(good)
+            if current is None or stream is None or not len(stream.times):
+                self.stdout.write(self.style.WARNING(f'{good}: нет продаж или параметров - пропущен'))
+                continue
+            item = PriceList.objects.filter(name=simulator.GOODS[good], category='goods').first()
+            base_price = float(item.base_price) if item and item.base_price else current[0]
+            report = simulator.sweep(stream, base_price, current, options['steps'], options['min_fill'])
+            reports[good] = report
+
+            (pmax, n_for_drop, t_recovery), quoted = report['chosen'], report['quoted'][:, 0]
+            self.stdout.write(
+                f"{good}: покупателей {len(stream.times)}, штук {int(stream.quantities.sum())}; "
+                f"pmax={pmax:.2f} N={n_for_drop} T={t_recovery} с: "
+                f"выручка {report['revenue'][0]:.2f} (сейчас {report['revenue'][1]:.2f}), "
+                f"спрос {report['fill'][0]:.0%} (сейчас {report['fill'][1]:.0%}), "
+                f"цена мин/средн {quoted.min():.2f}/{quoted.mean():.2f}"
+            )
+            if options['apply']:
+                simulator.apply_parameters(good, pmax, n_for_drop, t_recovery)
+
+        if options['trace']:
+            with open(options['trace'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    good: {
+                        'chosen': report['chosen'], 'current': report['current'],
+                        'times': report['times'].tolist(),
+                        'chosen_prices': report['quoted'][:, 0].tolist(),
+                        'current_prices': report['quoted'][:, 1].tolist(),
+                    }
+                    for good, report in reports.items()
+                }, f, ensure_ascii=False)
+
+        combinations = sum(report['combinations'] for report in reports.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Перебрано {combinations} комбинаций по {len(reports)} товарам за {time.monotonic() - started:.1f} с'
+            + ('; параметры записаны' if options['apply'] and reports else '')
+        ))
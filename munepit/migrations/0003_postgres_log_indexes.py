@@ -0,0 +1,42 @@
+# munepit/migrations/0003_postgres_log_indexes.py
+"""
+Индексы PostgreSQL для журнала: GIN по details и BRIN по timestamp.
+
+На SQLite миграция ничего не делает - таких типов индексов там нет,
+поэтому индексы не описаны в Meta модели, а создаются напрямую.
+"""
+from django.db import migrations
+
+
+INDEXES = [
+    # jsonb_path_ops: компактный индекс под details @> '{"resource_key": ...}'
+    ('munepit_log_details_gin', 'USING gin (details jsonb_path_ops)'),
+    # Журнал пишется по времени, BRIN занимает страницы вместо мегабайт B-tree
+    ('munepit_log_timestamp_brin', 'USING brin (timestamp)'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('munepit', 'LogEntry')._meta.db_table)
+    for name, method in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} {method}')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0002_constructedbuilding_convict_credit_dynamicprice_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes, hints={'model_name': 'logentry'}),
+    ]
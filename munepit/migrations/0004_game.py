@@ -0,0 +1,147 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:55
+# Поле game добавляется без default: вызываемый default при перестройке
+# таблицы SQLite выполнился бы на каждой строке. Он назначается после заполнения.
+
+import django.db.models.deletion
+import django.utils.timezone
+import munepit.models
+from django.db import migrations, models, router
+
+
+def assign_existing_rows(apps, schema_editor):
+    """Все записи, сделанные до появления игр, относятся к одной завершенной игре."""
+    db = schema_editor.connection.alias
+    Game = apps.get_model('munepit', 'Game')
+    LogEntry = apps.get_model('munepit', 'LogEntry')
+    # Журнал может жить в отдельной базе (munepit/routers.py): его строки
+    # до разделения остаются без игры и переносятся командой split_log
+    scoped = [
+        model for model in (
+            LogEntry,
+            apps.get_model('munepit', 'ConstructedBuilding'),
+            apps.get_model('munepit', 'Convict'),
+            apps.get_model('munepit', 'Credit'),
+            apps.get_model('munepit', 'Privateer'),
+        )
+        if router.allow_migrate_model(db, model)
+    ]
+    if not router.allow_migrate_model(db, Game) or not any(model.objects.using(db).exists() for model in scoped):
+        return
+    first = None
+    if LogEntry in scoped:
+        first = LogEntry.objects.using(db).order_by('timestamp').values_list('timestamp', flat=True).first()
+    game = Game.objects.using(db).create(
+        name='Игры до разделения',
+        started_at=first or django.utils.timezone.now(),
+        ended_at=django.utils.timezone.now(),
+    )
+    for model in scoped:
+        model.objects.using(db).update(game=game)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0003_postgres_log_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Game',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начало')),
+                ('ended_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Окончание')),
+                ('archived_at', models.DateTimeField(blank=True, null=True, verbose_name='Архивирована')),
+                ('archive_location', models.CharField(blank=True, max_length=255, verbose_name='Архив')),
+            ],
+            options={
+                'verbose_name': 'Игра',
+                'verbose_name_plural': 'Игры',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='convict',
+            name='player_id',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Номер игрока'),
+        ),
+        migrations.AlterField(
+            model_name='credit',
+            name='player_id',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Игрок-должник'),
+        ),
+        migrations.AlterField(
+            model_name='privateer',
+            name='player_id',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Номер игрока'),
+        ),
+        migrations.AddField(
+            model_name='constructedbuilding',
+            name='game',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AddField(
+            model_name='convict',
+            name='game',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AddField(
+            model_name='credit',
+            name='game',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AddField(
+            model_name='logentry',
+            name='game',
+            field=models.ForeignKey(blank=True, null=True, db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AddField(
+            model_name='privateer',
+            name='game',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.RunPython(assign_existing_rows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='constructedbuilding',
+            name='game',
+            field=models.ForeignKey(blank=True, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AlterField(
+            model_name='convict',
+            name='game',
+            field=models.ForeignKey(blank=True, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AlterField(
+            model_name='credit',
+            name='game',
+            field=models.ForeignKey(blank=True, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AlterField(
+            model_name='logentry',
+            name='game',
+            field=models.ForeignKey(blank=True, default=munepit.models.current_game_id, null=True, db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AlterField(
+            model_name='privateer',
+            name='game',
+            field=models.ForeignKey(blank=True, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['game', 'timestamp'], name='munepit_log_game_id_9c08c7_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='convict',
+            constraint=models.UniqueConstraint(fields=('game', 'player_id'), name='munepit_convict_game_player'),
+        ),
+        migrations.AddConstraint(
+            model_name='credit',
+            constraint=models.UniqueConstraint(fields=('game', 'player_id'), name='munepit_credit_game_player'),
+        ),
+        migrations.AddConstraint(
+            model_name='privateer',
+            constraint=models.UniqueConstraint(fields=('game', 'player_id'), name='munepit_privateer_game_player'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# munepit/migrations/0005_logentry_search.py
+"""
+Полнотекстовый индекс журнала: виртуальная таблица SQLite FTS5.
+
+Текст берется из ключей details (SEARCH_KEYS), триггеры на журнале
+поддерживают индекс при вставке, изменении и удалении записей - в том
+числе при bulk_create и массовом удалении, где сигналы Django не вызываются.
+Существующие записи индексируются здесь же.
+
+На PostgreSQL вместо FTS5 - GIN-индекс по tsvector того же текста:
+выражение индекса совпадает с запросом в munepit/search.py, обновляет
+его сам PostgreSQL.
+"""
+from django.db import migrations
+
+
+SEARCH_TABLE = 'munepit_logentry_search'
+PG_INDEX = 'munepit_log_search_gin'
+
+# Ключи details с текстом, который ищут модераторы. Изменение списка -
+# новая миграция: триггеры пересоздаются и индекс строится заново
+SEARCH_KEYS = [
+    'description', 'crime', 'player_name', 'building', 'name', 'factory', 'business',
+    'resource', 'good', 'ship', 'ship_type', 'old_ship', 'new_ship',
+]
+
+
+def _body(row):
+    return " || ' ' || ".join(f"coalesce(json_extract({row}.details, '$.{key}'), '')" for key in SEARCH_KEYS)
+
+
+def _pg_vector():
+    document = " || ' ' || ".join(f"coalesce(details ->> '{key}', '')" for key in SEARCH_KEYS)
+    return f"to_tsvector('simple', {document})"
+
+
+def create_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        table = schema_editor.quote_name(apps.get_model('munepit', 'LogEntry')._meta.db_table)
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {table} USING gin (({_pg_vector()}))')
+        return
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    table = apps.get_model('munepit', 'LogEntry')._meta.db_table
+    statements = [
+        # remove_diacritics: "ё" и "е" ищутся одинаково; prefix: быстрый поиск по началу слова
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        f"body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+        f"CREATE TRIGGER {SEARCH_TABLE}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {SEARCH_TABLE} (rowid, body) VALUES (new.id, {_body('new')}); END",
+        f"CREATE TRIGGER {SEARCH_TABLE}_update AFTER UPDATE OF details ON {table} BEGIN "
+        f"UPDATE {SEARCH_TABLE} SET body = {_body('new')} WHERE rowid = new.id; END",
+        f"CREATE TRIGGER {SEARCH_TABLE}_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END",
+        f"INSERT INTO {SEARCH_TABLE} (rowid, body) SELECT id, {_body(table)} FROM {table}",
+    ]
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+        return
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('insert', 'update', 'delete'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{trigger}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0004_game'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search, hints={'model_name': 'logentry'}),
+    ]
@@ -0,0 +1,107 @@
+# munepit/migrations/0006_logentry_indexes.py
+"""
+Индексы журнала по результатам index_advisor (munepit/query_plans.py).
+
+Все горячие запросы журнала идут внутри игры, поэтому одиночные индексы
+на timestamp, table, action_type, player_id и game планировщик не выбирает,
+а каждая вставка их обновляет. Их заменяют составные индексы с game впереди.
+
+Одиночные индексы удаляются напрямую: AlterField(db_index=False) на SQLite
+пересоздает таблицу журнала целиком, а вместе с ней пропали бы триггеры
+полнотекстового поиска из миграции 0005.
+"""
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import munepit.models
+
+
+SINGLE_INDEX_FIELDS = ['timestamp', 'table', 'action_type', 'player_id', 'game']
+
+
+def drop_single_indexes(apps, schema_editor):
+    model = apps.get_model('munepit', 'LogEntry')
+    table = model._meta.db_table
+    columns = {model._meta.get_field(name).column for name in SINGLE_INDEX_FIELDS}
+    with schema_editor.connection.cursor() as cursor:
+        constraints = schema_editor.connection.introspection.get_constraints(cursor, table)
+    for name, info in constraints.items():
+        # На PostgreSQL у varchar есть еще и индекс *_like - он тоже на одну колонку
+        if info['index'] and not info['primary_key'] and not info['unique'] \
+                and len(info['columns']) == 1 and info['columns'][0] in columns:
+            schema_editor.execute(schema_editor._delete_index_sql(model, name))
+
+
+def create_single_indexes(apps, schema_editor):
+    model = apps.get_model('munepit', 'LogEntry')
+    for name in SINGLE_INDEX_FIELDS:
+        field = model._meta.get_field(name)
+        schema_editor.execute(schema_editor._create_index_sql(model, fields=[field]))
+        like_sql = schema_editor._create_like_index_sql(model, field) \
+            if schema_editor.connection.vendor == 'postgresql' else None
+        if like_sql:
+            schema_editor.execute(like_sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0005_logentry_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='logentry',
+            name='munepit_log_timesta_089b07_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='logentry',
+            name='munepit_log_player__510a43_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='logentry',
+            new_name='log_game_time_idx',
+            old_name='munepit_log_game_id_9c08c7_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_single_indexes, create_single_indexes, hints={'model_name': 'logentry'}),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='logentry',
+                    name='action_type',
+                    field=models.CharField(choices=[('deal', 'Сделка'), ('court', 'Суд'), ('release', 'Выход с каторги'), ('purchase', 'Покупка ресурса'), ('building', 'Постройка здания'), ('processing', 'Обработка ресурса'), ('profit', 'Получение прибыли'), ('demolition', 'Снос здания'), ('sale', 'Продажа товара'), ('ship_deal', 'Сделка с кораблем'), ('factory_work', 'Работа на заводе'), ('credit_issue', 'Выдача кредита'), ('credit_payment', 'Внесение платежа'), ('coal_purchase', 'Покупка угля'), ('privateer_license', 'Каперская лицензия'), ('privateer_ship', 'Смена корабля'), ('privateer_complaint', 'Жалоба'), ('privateer_payment', 'Платеж капера'), ('quest_accept', 'Принятие задания')], max_length=30, verbose_name='Тип действия'),
+                ),
+                migrations.AlterField(
+                    model_name='logentry',
+                    name='game',
+                    field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра'),
+                ),
+                migrations.AlterField(
+                    model_name='logentry',
+                    name='player_id',
+                    field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Номер игрока'),
+                ),
+                migrations.AlterField(
+                    model_name='logentry',
+                    name='table',
+                    field=models.CharField(choices=[('island', 'Остров'), ('britain', 'Великобритания')], max_length=20, verbose_name='Стол'),
+                ),
+                migrations.AlterField(
+                    model_name='logentry',
+                    name='timestamp',
+                    field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['game', 'table', 'action_type', 'timestamp'], name='log_game_action_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['game', 'player_id', 'timestamp'], name='log_game_player_time_idx'),
+        ),
+    ]
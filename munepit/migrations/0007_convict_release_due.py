@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:08
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def schedule_existing(apps, schema_editor):
+    """Срок выхода для каторжников, осужденных до появления поля (как Convict.schedule_release)."""
+    Convict = apps.get_model('munepit', 'Convict')
+    db = schema_editor.connection.alias
+    convicts = list(Convict.objects.using(db).only('id', 'sentenced_at', 'sentence_years'))
+    for convict in convicts:
+        convict.release_due_at = convict.sentenced_at + timedelta(
+            seconds=convict.sentence_years * settings.CONVICT_SECONDS_PER_YEAR
+        )
+    Convict.objects.using(db).bulk_update(convicts, ['release_due_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0006_logentry_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='convict',
+            name='release_due_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Срок выхода'),
+        ),
+        migrations.RunPython(schedule_existing, migrations.RunPython.noop, hints={'model_name': 'convict'}),
+        migrations.AddIndex(
+            model_name='convict',
+            index=models.Index(fields=['game', 'release_due_at'], name='convict_game_due_idx'),
+        ),
+    ]
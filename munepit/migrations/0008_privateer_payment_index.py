@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0007_convict_release_due'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='privateer',
+            index=models.Index(fields=['game', 'last_payment_at'], name='privateer_game_payment_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:23
+
+import django.db.models.deletion
+import django.utils.timezone
+import munepit.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0008_privateer_payment_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=50, verbose_name='Счет')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Остаток')),
+                ('paid_in', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Внесено')),
+                ('received', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Получено')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последняя проводка')),
+                ('game', models.ForeignKey(blank=True, db_constraint=False, db_index=False, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра')),
+            ],
+            options={
+                'verbose_name': 'Счет',
+                'verbose_name_plural': 'Счета',
+                'indexes': [models.Index(fields=['game', '-balance'], name='ledger_account_balance_idx')],
+                'constraints': [models.UniqueConstraint(fields=('game', 'account'), name='ledger_account_game_account')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='Время')),
+                ('table', models.CharField(choices=[('island', 'Остров'), ('britain', 'Великобритания')], max_length=20, verbose_name='Стол')),
+                ('account', models.CharField(max_length=50, verbose_name='Счет')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Сумма')),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Остаток после')),
+                ('game', models.ForeignKey(blank=True, db_constraint=False, db_index=False, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра')),
+                ('log_entry', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='munepit.logentry', verbose_name='Запись журнала')),
+            ],
+            options={
+                'verbose_name': 'Проводка',
+                'verbose_name_plural': 'Проводки',
+                'indexes': [models.Index(fields=['game', 'account', 'timestamp'], name='ledger_game_account_time_idx')],
+            },
+        ),
+    ]
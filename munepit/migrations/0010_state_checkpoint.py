@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:31
+
+import django.db.models.deletion
+import munepit.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0009_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StateCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='Время последней записи')),
+                ('last_entry_id', models.BigIntegerField(verbose_name='Последняя запись журнала')),
+                ('entries', models.IntegerField(verbose_name='Записей учтено')),
+                ('state', models.JSONField(verbose_name='Состояние')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('game', models.ForeignKey(blank=True, db_constraint=False, db_index=False, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка',
+                'verbose_name_plural': 'Контрольные точки',
+                'indexes': [models.Index(fields=['game', 'timestamp'], name='checkpoint_game_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:38
+
+import django.db.models.deletion
+import django.utils.timezone
+import munepit.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0010_state_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('good_name', models.CharField(max_length=100, verbose_name='Товар')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время')),
+                ('game', models.ForeignKey(blank=True, db_constraint=False, db_index=False, default=munepit.models.current_game_id, null=True, on_delete=django.db.models.deletion.PROTECT, to='munepit.game', verbose_name='Игра')),
+            ],
+            options={
+                'verbose_name': 'Точка истории цены',
+                'verbose_name_plural': 'История цен',
+                'indexes': [models.Index(fields=['game', 'good_name', 'timestamp'], name='price_history_good_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munepit', '0011_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Отчет')),
+                ('params', models.JSONField(default=dict, verbose_name='Параметры')),
+                ('key', models.CharField(max_length=64, verbose_name='Ключ параметров')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Строится'), ('done', 'Готов'), ('failed', 'Ошибка')], default='queued', max_length=20, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Готово, %')),
+                ('message', models.CharField(blank=True, max_length=200, verbose_name='Этап')),
+                ('result', models.CharField(blank=True, max_length=255, verbose_name='Файл результата')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_by', models.CharField(blank=True, max_length=100, verbose_name='Заказал')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создан')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начат')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Обновлен')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершен')),
+            ],
+            options={
+                'verbose_name': 'Фоновый отчет',
+                'verbose_name_plural': 'Фоновые отчеты',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'), models.Index(fields=['key', 'created_at'], name='report_job_key_idx')],
+            },
+        ),
+    ]
@@ -1,11 +1,153 @@
 # models.py
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import (
+    BooleanField, Case, Count, DateTimeField, DurationField, ExpressionWrapper, F, Q, Sum, Value, When, Window,
+)
+from django.db.models.functions import Rank
+from django.core.cache import cache
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
 
+from .fragments import bump, model_version
+from .routers import atomic_game_and_log
+
 # Create your models here.
 
+class Game(models.Model):
+    """Игра (игровой вечер): все записи журнала и состояния принадлежат одной игре"""
+    # id текущей игры читается на каждой записи и в каждом отчете, поэтому
+    # кэшируется в процессе под меткой версии Game из общего кэша
+    # (munepit/fragments.py): сохранение игры в любом воркере меняет метку,
+    # и все процессы перечитывают текущую игру при следующем обращении
+    CURRENT_CACHE_KEY = 'munepit:current_game'
+    CURRENT_CACHE_TTL = 30
+
+    name = models.CharField(max_length=100, verbose_name="Название")
+    started_at = models.DateTimeField(default=timezone.now, verbose_name="Начало")
+    ended_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание", db_index=True)
+    archived_at = models.DateTimeField(null=True, blank=True, verbose_name="Архивирована")
+    archive_location = models.CharField(max_length=255, blank=True, verbose_name="Архив")
+
+    class Meta:
+        verbose_name = "Игра"
+        verbose_name_plural = "Игры"
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.started_at.strftime('%Y-%m-%d')})"
+
+    @classmethod
+    def current_id(cls):
+        """id незавершенной игры; если игр нет - создает первую"""
+        key = f'{cls.CURRENT_CACHE_KEY}:{model_version(cls)}'
+        game_id = cache.get(key)
+        if game_id is None:
+            game = cls.objects.filter(ended_at__isnull=True).order_by('-started_at').first()
+            if game is None:
+                game = cls.objects.create(name=f"Игра {timezone.now().strftime('%d.%m.%Y')}")
+            game_id = game.pk
+            cache.set(key, game_id, cls.CURRENT_CACHE_TTL)
+        return game_id
+
+    @classmethod
+    def current(cls):
+        return cls.objects.get(pk=cls.current_id())
+
+    @classmethod
+    def forget_current(cls):
+        """Все процессы перечитают текущую игру (после изменений без сигналов и отката в тестах)"""
+        bump(cls)
+
+    @property
+    def is_finished(self):
+        return self.ended_at is not None
+
+    def finish(self):
+        """Завершение игры: новые записи пойдут в следующую игру"""
+        self.ended_at = timezone.now()
+        self.save(update_fields=['ended_at'])
+        Game.forget_current()
+
+
+def current_game_id():
+    """Значение по умолчанию для Model.game"""
+    return Game.current_id()
+
+
+class GameQuerySet(models.QuerySet):
+    """Записи, привязанные к игре; представления работают с current()"""
+
+    def current(self):
+        return self.filter(game_id=Game.current_id())
+
+    def for_game(self, game):
+        return self.filter(game=game)
+
+
+class ConvictQuerySet(GameQuerySet):
+
+    def release_due(self, now=None):
+        """Каторжники с истекшим сроком, от самых давних: диапазон индекса (game, release_due_at)"""
+        return self.filter(release_due_at__lte=now or timezone.now()).order_by('release_due_at')
+
+    def reschedule(self):
+        """Пересчет release_due_at после изменения CONVICT_SECONDS_PER_YEAR"""
+        convicts = list(self.only('id', 'sentenced_at', 'sentence_years'))
+        for convict in convicts:
+            convict.schedule_release()
+        self.model.objects.bulk_update(convicts, ['release_due_at'], batch_size=500)
+        # bulk_update не шлет сигналов
+        bump(self.model)
+        return len(convicts)
+
+
+class PrivateerQuerySet(GameQuerySet):
+
+    def _since(self, field, now):
+        return ExpressionWrapper(Value(now, output_field=DateTimeField()) - F(field), output_field=DurationField())
+
+    def standings(self, now=None):
+        """
+        Рейтинг активных каперов одним запросом: место rank - по стажу
+        лицензии, затем меньше жалоб, затем свежее платеж; since_payment
+        (выслуга) и since_license - интервалы до now; payment_due - платеж
+        просрочен (индекс (game, last_payment_at)).
+        """
+        now = now or timezone.now()
+        due_at = now - timedelta(seconds=self.model.PAYMENT_DUE_SECONDS)
+        return self.filter(is_active=True).annotate(
+            rank=Window(Rank(), order_by=[
+                F('licensed_at').asc(), F('complaints').asc(), F('last_payment_at').desc(),
+            ]),
+            since_payment=self._since('last_payment_at', now),
+            since_license=self._since('licensed_at', now),
+            payment_due=Case(
+                When(last_payment_at__lte=due_at, then=Value(True)),
+                default=Value(False), output_field=BooleanField(),
+            ),
+        ).order_by('rank', 'id')
+
+    def summary(self, now=None):
+        """Счетчики для карточек страниц одним агрегатом."""
+        now = now or timezone.now()
+        active = Q(is_active=True)
+        summary = self.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=active),
+            with_complaints=Count('id', filter=active & Q(complaints__gt=0)),
+            payment_due=Count('id', filter=active & Q(
+                last_payment_at__lte=now - timedelta(seconds=self.model.PAYMENT_DUE_SECONDS)
+            )),
+            total_tenure=Sum(self._since('last_payment_at', now), filter=active),
+        )
+        summary['total_tenure'] = summary['total_tenure'] or timedelta()
+        return summary
+
+
 class UserSession(models.Model):
     """Модель для сессий пользователей (авторизация за столом)"""
     TABLE_CHOICES = [
@@ -56,26 +198,134 @@ class LogEntry(models.Model):
         ('britain', 'Великобритания'),
     ]
     
-    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Время", db_index=True)
+    # Одиночных индексов нет: все запросы журнала идут внутри игры и
+    # обслуживаются составными индексами из Meta (munepit/query_plans.py)
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Время")
     author = models.CharField(max_length=100, verbose_name="Автор (модератор)")
-    table = models.CharField(max_length=20, choices=TABLE_CHOICES, verbose_name="Стол", db_index=True)
-    action_type = models.CharField(max_length=30, choices=ACTION_TYPES, verbose_name="Тип действия", db_index=True)
-    player_id = models.CharField(max_length=50, blank=True, null=True, verbose_name="Номер игрока", db_index=True)
+    table = models.CharField(max_length=20, choices=TABLE_CHOICES, verbose_name="Стол")
+    action_type = models.CharField(max_length=30, choices=ACTION_TYPES, verbose_name="Тип действия")
+    player_id = models.CharField(max_length=50, blank=True, null=True, verbose_name="Номер игрока")
     
     # JSON поле для хранения всех деталей операции
     details = models.JSONField(default=dict, verbose_name="Детали операции")
+
+    # Журнал может лежать в отдельной базе (munepit/routers.py), поэтому без FK-ограничения
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, db_constraint=False, db_index=False, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Запись лога"
         verbose_name_plural = "Логи действий"
         indexes = [
-            models.Index(fields=['timestamp', 'action_type']),
-            models.Index(fields=['player_id', 'timestamp']),
+            # Журнал игры по времени: transaction_list, statistics, архив
+            models.Index(fields=['game', 'timestamp'], name='log_game_time_idx'),
+            # Последние операции стола: прибыль, покупки, сносы на панелях
+            models.Index(fields=['game', 'table', 'action_type', 'timestamp'], name='log_game_action_time_idx'),
+            # Операции игрока: player_detail, player_search, остаток ресурса.
+            # Индекс по details.resource_key SQLite не выбирает: Django передает
+            # путь JSON параметром, а выражение индекса совпадает только с литералом
+            models.Index(fields=['game', 'player_id', 'timestamp'], name='log_game_player_time_idx'),
         ]
     
     def __str__(self):
         return f"{self.timestamp.strftime('%Y-%m-%d %H:%M')} | {self.author} | {self.get_action_type_display()} | Игрок {self.player_id}"
 
+    def save(self, *args, **kwargs):
+        # Денежные проводки (munepit/ledger.py) фиксируются вместе с записью.
+        # bulk_create save() не вызывает: после него - ledger.record()
+        from .ledger import record
+
+        adding = self._state.adding
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if adding:
+                record([self], using=using)
+
+
+class LedgerAccount(models.Model):
+    """
+    Денежный счет игрока или банка стола в игре. Остаток и обороты
+    обновляются каждой проводкой, поэтому читаются одной строкой.
+    """
+    account = models.CharField(max_length=50, verbose_name="Счет")
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Остаток")
+    paid_in = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Внесено")
+    received = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Получено")
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name="Последняя проводка")
+
+    # Счета живут в базе журнала, как и проводки
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, db_constraint=False, db_index=False, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Счет"
+        verbose_name_plural = "Счета"
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'account'], name='ledger_account_game_account'),
+        ]
+        indexes = [
+            # Богатейшие игроки игры - начало индекса
+            models.Index(fields=['game', '-balance'], name='ledger_account_balance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account}: {self.balance}"
+
+
+class LedgerEntry(models.Model):
+    """Проводка: изменение счета по записи журнала; сумма проводок записи равна нулю"""
+    # Проводки удаляются вместе с журналом игры (archive_game), ограничение
+    # и отдельный индекс по записи не нужны
+    log_entry = models.ForeignKey(LogEntry, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='ledger_entries', verbose_name="Запись журнала")
+    timestamp = models.DateTimeField(verbose_name="Время")
+    table = models.CharField(max_length=20, choices=LogEntry.TABLE_CHOICES, verbose_name="Стол")
+    account = models.CharField(max_length=50, verbose_name="Счет")
+    amount = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Сумма")
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Остаток после")
+
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, db_constraint=False, db_index=False, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Проводка"
+        verbose_name_plural = "Проводки"
+        indexes = [
+            # Выписка по счету: player_detail, остаток на момент времени
+            models.Index(fields=['game', 'account', 'timestamp'], name='ledger_game_account_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account} {self.amount:+} ({self.log_entry_id})"
+
+
+class StateCheckpoint(models.Model):
+    """Контрольная точка состояния игры: итог проигрывания журнала до записи (munepit/replay.py)"""
+    # Позиция в журнале - (время, id) последней учтенной записи
+    timestamp = models.DateTimeField(verbose_name="Время последней записи")
+    last_entry_id = models.BigIntegerField(verbose_name="Последняя запись журнала")
+    entries = models.IntegerField(verbose_name="Записей учтено")
+    state = models.JSONField(verbose_name="Состояние")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, db_constraint=False, db_index=False, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Контрольная точка"
+        verbose_name_plural = "Контрольные точки"
+        indexes = [
+            # Ближайшая точка не позже запрошенного времени
+            models.Index(fields=['game', 'timestamp'], name='checkpoint_game_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')} | {self.entries} записей"
+
 
 class PriceList(models.Model):
     """Таблица цен (для всех ресурсов, товаров, зданий)"""
@@ -112,7 +362,7 @@ class PriceList(models.Model):
 
 class Convict(models.Model):
     """Таблица каторжников (п. 2.9)"""
-    player_id = models.CharField(max_length=50, unique=True, verbose_name="Номер игрока", db_index=True)
+    player_id = models.CharField(max_length=50, verbose_name="Номер игрока", db_index=True)
     player_name = models.CharField(max_length=200, blank=True, verbose_name="ФИО игрока")
     crime_description = models.TextField(verbose_name="Описание преступления")
     fine_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Сумма штрафа")
@@ -121,15 +371,41 @@ class Convict(models.Model):
     
     sentenced_by = models.CharField(max_length=100, verbose_name="Приговорил")
     sentenced_at = models.DateTimeField(default=timezone.now, verbose_name="Дата приговора", db_index=True)
+    # sentenced_at + срок в игровом времени (settings.CONVICT_SECONDS_PER_YEAR),
+    # считается при сохранении: очередь на выход - диапазон индекса, а не перебор
+    release_due_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Срок выхода")
     
     notes = models.TextField(blank=True, verbose_name="Примечания")
     
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, verbose_name="Игра")
+
+    objects = ConvictQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Каторжник"
         verbose_name_plural = "Каторжники"
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'player_id'], name='munepit_convict_game_player'),
+        ]
+        indexes = [
+            models.Index(fields=['game', 'release_due_at'], name='convict_game_due_idx'),
+        ]
     
     def __str__(self):
         return f"Игрок {self.player_id} - {self.sentence_years} лет (с {self.sentenced_at.date()})"
+
+    def save(self, *args, **kwargs):
+        self.schedule_release()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'sentenced_at', 'sentence_years'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'release_due_at'}
+        super().save(*args, **kwargs)
+
+    def schedule_release(self):
+        """release_due_at по приговору; вызывать перед bulk_create, где save() не работает"""
+        self.release_due_at = self.sentenced_at + timedelta(
+            seconds=self.sentence_years * settings.CONVICT_SECONDS_PER_YEAR
+        )
     
     def time_served(self):
         """Время, проведенное на каторге"""
@@ -138,6 +414,10 @@ class Convict(models.Model):
     def time_served_seconds(self):
         return int(self.time_served().total_seconds())
 
+    def time_remaining_seconds(self, now=None):
+        """Сколько осталось до конца срока (0, если срок вышел)"""
+        return max(0, int((self.release_due_at - (now or timezone.now())).total_seconds()))
+
 
 class ConstructedBuilding(models.Model):
     """Таблица построенных зданий (Остров)"""
@@ -164,6 +444,10 @@ class ConstructedBuilding(models.Model):
     # Доход в минуту (берется из PriceList или отдельного поля)
     income_per_minute = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Доход в минуту")
     
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Построенное здание"
         verbose_name_plural = "Построенные здания"
@@ -189,7 +473,10 @@ class ConstructedBuilding(models.Model):
 
 class Credit(models.Model):
     """Таблица кредитов (Великобритания)"""
-    player_id = models.CharField(max_length=50, unique=True, verbose_name="Игрок-должник", db_index=True)
+    # Платеж просрочен через 10 минут после предыдущего
+    OVERDUE_SECONDS = 600
+
+    player_id = models.CharField(max_length=50, verbose_name="Игрок-должник", db_index=True)
     
     credit_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Сумма кредита")
     term_months = models.IntegerField(verbose_name="Срок (кол-во платежей)", validators=[MinValueValidator(2), MaxValueValidator(6)])
@@ -203,9 +490,16 @@ class Credit(models.Model):
     
     last_payment_at = models.DateTimeField(default=timezone.now, verbose_name="Последний платеж", db_index=True)
     
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Кредит"
         verbose_name_plural = "Кредиты"
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'player_id'], name='munepit_credit_game_player'),
+        ]
     
     def __str__(self):
         return f"Игрок {self.player_id}: {self.remaining_payments}/{self.term_months} платежей"
@@ -216,7 +510,7 @@ class Credit(models.Model):
     
     def is_overdue(self):
         """Просрочка более 10 минут"""
-        return self.time_since_last_payment().total_seconds() > 600  # 10 минут
+        return self.time_since_last_payment().total_seconds() > self.OVERDUE_SECONDS
     
     def make_payment(self, amount):
         """Внесение платежа"""
@@ -246,13 +540,16 @@ class Credit(models.Model):
 
 class Privateer(models.Model):
     """Таблица каперов (лицензий) - Великобритания"""
+    # Платеж капера ожидается не реже раза в 10 минут, как по кредиту
+    PAYMENT_DUE_SECONDS = 600
+
     SHIP_CHOICES = [
         ('frigate', 'Фрегат'),
         ('battleship', 'Линкор'),
         ('steam_frigate', 'Паровой фрегат'),
     ]
     
-    player_id = models.CharField(max_length=50, unique=True, verbose_name="Номер игрока", db_index=True)
+    player_id = models.CharField(max_length=50, verbose_name="Номер игрока", db_index=True)
     ship_type = models.CharField(max_length=20, choices=SHIP_CHOICES, verbose_name="Корабль")
     
     # Выслуга (таймер с последнего платежа)
@@ -265,9 +562,20 @@ class Privateer(models.Model):
     
     is_active = models.BooleanField(default=True, verbose_name="Активен")
     
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, verbose_name="Игра")
+
+    objects = PrivateerQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Капер"
         verbose_name_plural = "Каперы"
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'player_id'], name='munepit_privateer_game_player'),
+        ]
+        indexes = [
+            # Просроченные платежи игры - диапазон индекса, а не скан
+            models.Index(fields=['game', 'last_payment_at'], name='privateer_game_payment_idx'),
+        ]
     
     def __str__(self):
         return f"Игрок {self.player_id} - {self.get_ship_type_display()}"
@@ -275,16 +583,33 @@ class Privateer(models.Model):
     def tenure(self):
         """Выслуга (время с последнего платежа)"""
         return timezone.now() - self.last_payment_at
-    
+
+    @property
+    def tenure_display(self):
+        """Выслуга как ее показывает nepit.js: "2д 5ч"; из standings() - без нового now"""
+        tenure = getattr(self, 'since_payment', None) or self.tenure()
+        hours = int(tenure.total_seconds() // 3600)
+        return f'{hours // 24}д {hours % 24}ч'
+    
+    # Платеж и жалоба пишут только свое поле, не сохраняя остальные поля
+    # экземпляра из формы, а жалоба прибавляется в самом UPDATE: два
+    # модератора, записавшие одновременно, не затирают друг друга.
+    # Вызывать внутри atomic_game_and_log() вместе с записью журнала.
+
     def make_payment(self):
-        """Внесение платежа"""
+        """Внесение платежа; возвращает время платежа"""
         self.last_payment_at = timezone.now()
         self.save(update_fields=['last_payment_at'])
+        return self.last_payment_at
     
     def add_complaint(self, value):
-        """Добавление жалобы (может быть отрицательной)"""
-        self.complaints += value
-        self.save(update_fields=['complaints'])
+        """Добавление жалобы (может быть отрицательной); возвращает новое число жалоб"""
+        Privateer.objects.filter(pk=self.pk).update(complaints=F('complaints') + value)
+        # UPDATE по queryset не шлет post_save
+        bump(Privateer)
+        # Строка заблокирована UPDATE до конца транзакции: прочитанное значение - наше
+        self.refresh_from_db(fields=['complaints'])
+        return self.complaints
 
 
 class DynamicPrice(models.Model):
@@ -323,4 +648,84 @@ class DynamicPrice(models.Model):
         if seconds_since >= self.t_recovery and self.current_price < self.pmax:
             self.current_price = self.pmax
             self.sales_count = 0
-            self.save()
\ No newline at end of file
+            self.save()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Цена на момент чтения: save() пишет в историю только изменения
+        instance._saved_price = getattr(instance, 'current_price', None)
+        return instance
+
+    def save(self, *args, **kwargs):
+        changed = self.current_price != getattr(self, '_saved_price', None)
+        # История - в базе журнала: точка цены фиксируется вместе с ценой
+        with atomic_game_and_log():
+            super().save(*args, **kwargs)
+            if changed:
+                PriceHistory.objects.create(good_name=self.good_name, price=self.current_price, timestamp=self.last_update)
+        self._saved_price = self.current_price
+
+
+class PriceHistory(models.Model):
+    """История динамических цен: точка на каждое изменение DynamicPrice.current_price, только дописывается"""
+    good_name = models.CharField(max_length=100, verbose_name="Товар")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Время")
+
+    game = models.ForeignKey(Game, on_delete=models.PROTECT, null=True, blank=True, default=current_game_id, db_constraint=False, db_index=False, verbose_name="Игра")
+
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Точка истории цены"
+        verbose_name_plural = "История цен"
+        indexes = [
+            # Ряд товара за игру или отрезок времени - диапазон индекса
+            models.Index(fields=['game', 'good_name', 'timestamp'], name='price_history_good_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')} | {self.good_name}: {self.price}"
+
+
+class ReportJob(models.Model):
+    """Тяжелый отчет, который строит фоновый обработчик manage.py run_jobs (munepit/jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Строится'),
+        ('done', 'Готов'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name="Отчет")
+    params = models.JSONField(default=dict, verbose_name="Параметры")
+    # Отчет с теми же параметрами не строится заново, пока готовый не устарел
+    key = models.CharField(max_length=64, verbose_name="Ключ параметров")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="Статус")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Готово, %")
+    message = models.CharField(max_length=200, blank=True, verbose_name="Этап")
+    result = models.CharField(max_length=255, blank=True, verbose_name="Файл результата")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_by = models.CharField(max_length=100, blank=True, verbose_name="Заказал")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Создан")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начат")
+    # Обработчик обновляет при каждом шаге: зависшую задачу видно по давнему значению
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name="Обновлен")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершен")
+
+    class Meta:
+        verbose_name = "Фоновый отчет"
+        verbose_name_plural = "Фоновые отчеты"
+        indexes = [
+            # Очередь обработчика: самые старые задачи в статусе queued
+            models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'),
+            models.Index(fields=['key', 'created_at'], name='report_job_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
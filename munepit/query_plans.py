@@ -0,0 +1,116 @@
+# munepit/query_plans.py
+"""
+Планы SQL-запросов, которые выполняют представления.
+
+capture() записывает запросы по всем базам (журнал может жить в отдельной,
+отчеты читают снимок), explain() возвращает план запроса: EXPLAIN QUERY
+PLAN на SQLite, EXPLAIN на PostgreSQL. По планам analyze() находит полные
+сканы таблиц и индексы, которые не выбрал ни один план.
+
+Команда index_advisor обходит страницы столов и печатает этот отчет;
+ожидаемые планы горячих запросов журнала закреплены в тестах.
+"""
+import re
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+# SQLite: "SCAN munepit_logentry", "SCAN TABLE x" (до 3.36), "SEARCH x USING INDEX y (...)"
+# PostgreSQL: "Seq Scan on x", "Index Scan using y on x", "Bitmap Index Scan on y".
+# Виртуальная таблица FTS5 (munepit/search.py) ищет по своему индексу, это не скан
+_FULL_SCAN_RE = re.compile(r'^\s*(?:->\s*)?(?:SCAN (?:TABLE )?|Seq Scan on )"?(\w+)"?(?!.*VIRTUAL TABLE)')
+_INDEX_RE = re.compile(
+    r'USING (?:COVERING )?INDEX "?(\w+)"?'
+    r'|Index (?:Only )?Scan(?: Backward)? using "?(\w+)"?'
+    r'|Bitmap Index Scan on "?(\w+)"?'
+)
+
+
+@contextmanager
+def capture():
+    """
+    Запросы, выполненные внутри блока: список пар (alias, sql).
+    Заполняется на выходе; управление транзакциями не попадает.
+    """
+    queries = []
+    with ExitStack() as stack:
+        contexts = {
+            alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+        }
+        yield queries
+    for alias, ctx in contexts.items():
+        queries.extend(
+            (alias, q['sql']) for q in ctx.captured_queries
+            if q['sql'].lstrip().upper().startswith(('SELECT', 'WITH'))
+        )
+
+
+def explain(alias, sql):
+    """План запроса построчно (SQL уже с подставленными параметрами, как его пишет capture)."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}')
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(plan, tables):
+    """Таблицы из tables, которые план читает целиком."""
+    scans = []
+    for line in plan:
+        match = _FULL_SCAN_RE.match(line)
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+
+def used_indexes(plan):
+    """Имена индексов, которые выбрал план."""
+    return {name for line in plan for match in _INDEX_RE.finditer(line) for name in match.groups() if name}
+
+
+def table_indexes(alias, table):
+    """Неуникальные индексы таблицы: уникальные нужны ограничениям, их не предлагаем удалять."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {
+        name for name, info in constraints.items()
+        if info['index'] and not info['unique'] and not info['primary_key']
+    }
+
+
+def analyze(queries):
+    """
+    Отчет по запросам из capture():
+      queries - [(alias, sql, plan, полные сканы)] без повторов,
+      unused - {(alias, таблица): индексы, не выбранные ни одним планом}
+               для таблиц, которые встречались в запросах.
+    """
+    report = {'queries': [], 'unused': {}}
+    used = set()
+    touched = set()
+    seen = set()
+    table_names = {}
+    for alias, sql in queries:
+        if (alias, sql) in seen:
+            continue
+        seen.add((alias, sql))
+        if alias not in table_names:
+            with connections[alias].cursor() as cursor:
+                table_names[alias] = set(connections[alias].introspection.table_names(cursor))
+        plan = explain(alias, sql)
+        used |= used_indexes(plan)
+        touched |= {
+            (alias, table) for table in table_names[alias]
+            if re.search(rf'\b{table}\b', sql)
+        }
+        report['queries'].append((alias, sql, plan, full_scans(plan, table_names[alias])))
+    for alias, table in sorted(touched):
+        unused = table_indexes(alias, table) - used
+        if unused:
+            report['unused'][(alias, table)] = sorted(unused)
+    return report
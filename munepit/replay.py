@@ -0,0 +1,231 @@
+# munepit/replay.py
+"""
+Состояние игры на момент времени по журналу.
+
+Таблицы игры хранят только текущее состояние, а в спорах нужно знать, чем
+игрок владел и сколько был должен в 21:40. apply() переносит запись журнала
+на состояние - словарь, который сохраняется в JSON как есть:
+
+    {'players': {player_id: {раздел: ...}}}
+
+У игрока только непустые разделы: cash, paid_in, received (по проводкам
+munepit/ledger.py), buildings, resources, goods, ships ({имя: количество}),
+credit, convict, privateer. Суммы - строки Decimal, время - ISO 8601.
+
+state_at() начинает с ближайшей контрольной точки (StateCheckpoint) не позже
+запрошенного времени и проигрывает журнал после нее в порядке (время, id).
+По дороге через каждые settings.REPLAY_CHECKPOINT_EVERY записей пишется
+новая точка, и следующий запрос проигрывает не больше этого числа записей.
+Точки не пишутся ближе settings.REPLAY_CHECKPOINT_LAG секунд к текущему
+времени: запись из еще не зафиксированной транзакции окажется раньше точки
+и в нее не попадет.
+
+Журнал только дописывается, поэтому точки не устаревают. После загрузки
+журнала задним числом (generate_game_data) точки игры сбрасывает forget().
+"""
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_time
+
+from .ledger import is_bank, postings
+from .models import LogEntry, StateCheckpoint
+
+LOG_FIELDS = ('id', 'timestamp', 'table', 'action_type', 'player_id', 'details')
+
+
+def empty_state():
+    return {'players': {}}
+
+
+def _count(counts, key, delta):
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def _add(section, key, amount):
+    section[key] = str(Decimal(section.get(key, '0')) + amount)
+
+
+def apply(state, entry):
+    """Переносит запись журнала на состояние (state изменяется на месте)."""
+    players = state['players']
+    details = entry.details or {}
+    action = entry.action_type
+    at = entry.timestamp.isoformat()
+    touched = set()
+
+    def player(player_id):
+        touched.add(str(player_id))
+        return players.setdefault(str(player_id), {})
+
+    def section(player_id, name):
+        return player(player_id).setdefault(name, {})
+
+    for account, amount in postings(entry):
+        if not is_bank(account):
+            cash = player(account)
+            _add(cash, 'cash', amount)
+            _add(cash, 'paid_in' if amount < 0 else 'received', abs(amount))
+
+    player_id = entry.player_id
+    if action == 'purchase' and player_id:
+        # Остаток ресурса - как _get_player_resource_balance в views.py
+        key = details.get('resource_key') or details.get('resource')
+        if 'stock_delta' in details:
+            _count(section(player_id, 'resources'), key, int(details.get('stock_delta') or 0))
+        else:
+            _count(section(player_id, 'resources'), key, int(details.get('quantity') or 0))
+    elif action == 'sale' and player_id:
+        _count(section(player_id, 'goods'), details.get('good'), int(details.get('quantity') or 0))
+    elif action == 'ship_deal' and player_id:
+        _count(section(player_id, 'ships'), details.get('ship'), -1 if details.get('deal_type') == 'продажа' else 1)
+    elif action == 'building' and player_id:
+        _count(section(player_id, 'buildings'), details.get('building'), 1)
+    elif action == 'demolition':
+        # Здание теряет владелец, а не тот, кто сносил
+        owner = details.get('owner') or player_id
+        if owner:
+            _count(section(owner, 'buildings'), details.get('building'), -1)
+    elif action == 'court' and player_id:
+        player(player_id)['convict'] = {
+            'crime': details.get('crime'), 'fine': details.get('fine'),
+            'sentence': details.get('sentence'), 'since': at,
+        }
+    elif action == 'release' and player_id:
+        player(player_id).pop('convict', None)
+    elif action == 'credit_issue' and player_id:
+        player(player_id)['credit'] = {
+            'amount': str(details.get('amount')), 'monthly': str(details.get('monthly')),
+            'term': details.get('term'), 'remaining': details.get('term'), 'paid': '0', 'issued_at': at,
+        }
+    elif action == 'credit_payment' and player_id:
+        credit = player(player_id).get('credit')
+        if details.get('closed'):
+            player(player_id).pop('credit', None)
+        elif credit is not None:
+            _add(credit, 'paid', Decimal(str(details.get('amount') or 0)))
+            credit['remaining'] = details.get('remaining', credit['remaining'])
+            credit['last_payment_at'] = at
+    elif action == 'privateer_license' and player_id:
+        if details.get('action') == 'issue':
+            privateer = section(player_id, 'privateer')
+            privateer.update(
+                active=True, ship=details.get('ship_type') or privateer.get('ship'),
+                since=privateer.get('since', at), last_payment_at=privateer.get('last_payment_at', at),
+            )
+        elif 'privateer' in player(player_id):
+            player(player_id)['privateer']['active'] = False
+    elif action.startswith('privateer_') or action == 'quest_accept':
+        privateer = player(player_id).get('privateer') if player_id else None
+        if privateer is not None:
+            if action == 'privateer_ship':
+                privateer['ship'] = details.get('new_ship')
+            elif action == 'privateer_complaint':
+                privateer['complaints'] = details.get('new_total', privateer.get('complaints', 0))
+            elif action == 'privateer_payment':
+                privateer['last_payment_at'] = at
+            elif action == 'quest_accept':
+                privateer['quests'] = privateer.get('quests', 0) + 1
+
+    # Пустые разделы и игроки без состояния в точку не попадают
+    for player_id in touched:
+        data = players[player_id]
+        for name in [name for name, value in data.items() if value in ({}, None)]:
+            del data[name]
+        if not data:
+            del players[player_id]
+    return state
+
+
+def _checkpoint_before(game_id, at):
+    return StateCheckpoint.objects.using(router.db_for_read(StateCheckpoint)).filter(
+        game_id=game_id, timestamp__lte=at,
+    ).order_by('-timestamp', '-last_entry_id').first()
+
+
+def state_at(game_id, at, save=True):
+    """
+    Состояние игры после всех записей журнала не позже at:
+    {'state', 'checkpoint' (с которой начато, или None), 'replayed' - записей
+    после нее, 'entries' - всего учтено, 'saved' - новых контрольных точек}.
+
+    save=False - без записи точек (отчеты: они читают снимок, а точки
+    пишутся в рабочую базу).
+    """
+    checkpoint = _checkpoint_before(game_id, at)
+    log = LogEntry.objects.using(router.db_for_read(LogEntry)).filter(game_id=game_id, timestamp__lte=at)
+    if checkpoint:
+        state, entries = checkpoint.state, checkpoint.entries
+        log = log.filter(
+            Q(timestamp__gt=checkpoint.timestamp)
+            | Q(timestamp=checkpoint.timestamp, id__gt=checkpoint.last_entry_id)
+        )
+    else:
+        state, entries = empty_state(), 0
+
+    every = settings.REPLAY_CHECKPOINT_EVERY
+    settled = timezone.now() - timedelta(seconds=settings.REPLAY_CHECKPOINT_LAG)
+    pending = []
+    replayed = 0
+    for entry in log.order_by('timestamp', 'id').only(*LOG_FIELDS).iterator(chunk_size=2000):
+        apply(state, entry)
+        replayed += 1
+        if save and replayed % every == 0 and entry.timestamp <= settled:
+            # Копия: state дальше меняется, а точки пишутся после чтения журнала
+            pending.append(StateCheckpoint(
+                game_id=game_id, timestamp=entry.timestamp, last_entry_id=entry.id,
+                entries=entries + replayed, state=json.loads(json.dumps(state)),
+            ))
+    if pending:
+        StateCheckpoint.objects.using(router.db_for_write(StateCheckpoint)).bulk_create(pending)
+    return {
+        'state': state, 'checkpoint': checkpoint, 'replayed': replayed,
+        'entries': entries + replayed, 'saved': len(pending),
+    }
+
+
+def write_checkpoints(game_id):
+    """Контрольные точки по всему журналу игры, который уже не изменится."""
+    settled = timezone.now() - timedelta(seconds=settings.REPLAY_CHECKPOINT_LAG)
+    return state_at(game_id, settled)
+
+
+def forget(game_id):
+    """Сбрасывает точки игры - после записи в журнал задним числом."""
+    return StateCheckpoint.objects.using(router.db_for_write(StateCheckpoint)).filter(game_id=game_id).delete()[0]
+
+
+def player_state(state, player_id):
+    """Разделы игрока; у кредита - остаток долга по оставшимся платежам."""
+    data = json.loads(json.dumps(state['players'].get(str(player_id), {})))
+    credit = data.get('credit')
+    if credit:
+        credit['owed'] = str(Decimal(credit['monthly']) * int(credit['remaining'] or 0))
+    return data
+
+
+def parse_at(value, now=None):
+    """
+    Момент времени из 'ГГГГ-ММ-ДД ЧЧ:ММ[:СС]' (или с 'T') либо 'ЧЧ:ММ[:СС]' -
+    сегодня. Время без зоны - в зоне сайта. ValueError, если не разобрать.
+    """
+    value = (value or '').strip()
+    moment = parse_datetime(value)
+    if moment is None:
+        time_of_day = parse_time(value)
+        if time_of_day is None:
+            raise ValueError(f'Не удалось разобрать время: {value!r}')
+        today = timezone.localdate(now or timezone.now())
+        moment = datetime.combine(today, time_of_day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
@@ -0,0 +1,133 @@
+# munepit/routers.py
+"""
+Разделение журнала и состояния игры по двум базам.
+
+LogEntry (с проводками и контрольными точками), история цен, UserSession
+и django_session пишутся почти на каждом запросе и только добавляются;
+цены, кредиты, здания и каперы в основном читаются.
+В SQLite у каждой базы одна блокировка записи, поэтому журнал вынесен
+в отдельную базу 'log' (settings.SPLIT_LOG_DATABASE), и всплеск записей
+в журнал не задерживает чтение прайс-листа и кредитов.
+
+Отчеты читают не рабочие базы, а их снимки (munepit/snapshots.py):
+внутри reporting() чтения моделей игры уходят в settings.REPORT_SNAPSHOTS.
+"""
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+LOG_DATABASE = 'log'
+
+# (app_label, model_name); None - все модели приложения
+LOG_MODELS = {
+    ('munepit', 'logentry'),
+    ('munepit', 'ledgerentry'),
+    ('munepit', 'ledgeraccount'),
+    ('munepit', 'statecheckpoint'),
+    ('munepit', 'pricehistory'),
+    ('munepit', 'usersession'),
+    ('sessions', None),
+}
+
+# Модели, которые и в отчетах читаются из рабочей базы: сессии нужны
+# свежими для входа, по Game определяется текущая игра, а фоновые отчеты
+# сами строятся по снимку и пишут в рабочую базу свой ход
+LIVE_MODELS = {
+    ('munepit', 'game'),
+    ('munepit', 'usersession'),
+    ('munepit', 'reportjob'),
+}
+
+_reporting = ContextVar('munepit_reporting', default=False)
+
+
+def _is_log_model(app_label, model_name):
+    return (app_label, model_name) in LOG_MODELS or (app_label, None) in LOG_MODELS
+
+
+def log_models():
+    """Модели из LOG_MODELS, по имени таблицы."""
+    from django.apps import apps
+
+    return sorted(
+        (model for model in apps.get_models() if _is_log_model(model._meta.app_label, model._meta.model_name)),
+        key=lambda model: model._meta.db_table,
+    )
+
+
+def log_database_enabled():
+    return LOG_DATABASE in settings.DATABASES
+
+
+@contextmanager
+def reporting():
+    """Чтения моделей игры внутри блока идут в снимки для отчетов."""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+class LogRouter:
+    """Журнал и сессии - в базу 'log', остальное - в 'default'."""
+
+    def _route(self, model):
+        if log_database_enabled() and _is_log_model(model._meta.app_label, model._meta.model_name):
+            return LOG_DATABASE
+        return None
+
+    def db_for_read(self, model, **hints):
+        db = self._route(model)
+        if _reporting.get() and model._meta.app_label == 'munepit' \
+                and ('munepit', model._meta.model_name) not in LIVE_MODELS:
+            from .snapshots import snapshot_ready
+
+            source = db or DEFAULT_DB_ALIAS
+            if snapshot_ready(source):
+                return settings.REPORT_SNAPSHOTS[source]
+        return db
+
+    def db_for_write(self, model, **hints):
+        # Явная база: иначе save() объекта, прочитанного из снимка, ушел бы в снимок
+        return self._route(model) or DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # LogEntry.game ссылается на Game из другой базы (без FK-ограничения)
+        if obj1._meta.app_label == obj2._meta.app_label == 'munepit':
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPORT_SNAPSHOTS.values():
+            return False
+        if not log_database_enabled():
+            return None
+        if model_name is None:
+            # RunPython/RunSQL без подсказок относятся к состоянию игры
+            return db != LOG_DATABASE
+        return (db == LOG_DATABASE) == _is_log_model(app_label, model_name)
+
+
+@contextmanager
+def atomic_game_and_log():
+    """
+    Транзакция на базе состояния и на базе журнала.
+
+    Исключение внутри блока откатывает обе. Двухфазной фиксации нет:
+    журнал фиксируется первым, поэтому при сбое между двумя COMMIT
+    остается запись журнала без изменения состояния, а не наоборот -
+    операция не пропадает из истории бесследно.
+
+    Оборачивать только запись (ветку POST), а не все представление:
+    транзакции SQLite открываются как IMMEDIATE и сразу берут блокировку
+    записи обеих баз - показ формы ждал бы касс.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(transaction.atomic(using='default'))
+        if log_database_enabled():
+            # Вложенная транзакция выходит (и фиксируется) первой
+            stack.enter_context(transaction.atomic(using=LOG_DATABASE))
+        yield
@@ -0,0 +1,93 @@
+# munepit/search.py
+"""
+Полнотекстовый поиск по журналу операций.
+
+На SQLite запрос идет в FTS5-таблицу munepit_logentry_search (миграция
+0005): она хранит текст ключей details - названия зданий, описания
+преступлений и заданий, товары, корабли - и обновляется триггерами.
+Результаты упорядочены по релевантности (bm25).
+
+На PostgreSQL тот же текст ищется через tsvector по GIN-индексу
+munepit_log_search_gin (та же миграция), порядок - по ts_rank.
+"""
+import re
+
+from django.db import connections
+
+SEARCH_TABLE = 'munepit_logentry_search'
+
+# Те же ключи, что индексирует миграция 0005
+SEARCH_KEYS = [
+    'description', 'crime', 'player_name', 'building', 'name', 'factory', 'business',
+    'resource', 'good', 'ship', 'ship_type', 'old_ship', 'new_ship',
+]
+
+# Текст записи на PostgreSQL - то же выражение, что в индексе миграции
+# 0005 (иначе планировщик индекс не возьмет)
+PG_DOCUMENT = " || ' ' || ".join(f"coalesce(details ->> '{key}', '')" for key in SEARCH_KEYS)
+PG_VECTOR = f"to_tsvector('simple', {PG_DOCUMENT})"
+
+# Фрагмент текста вокруг найденного: столько слов
+SNIPPET_WORDS = 12
+
+
+def fts_query(text):
+    """
+    Строка из поля поиска -> выражение MATCH.
+
+    Каждое слово ищется по началу ("кон" найдет "Контрабанда"), все слова
+    обязательны. Кавычки вокруг слов не дают пользовательскому вводу
+    превратиться в синтаксис FTS5 (OR, NEAR, скобки).
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def pg_tsquery(text):
+    """
+    Строка из поля поиска -> запрос to_tsquery: те же правила, что у
+    fts_query (слова по началу, все обязательны, синтаксис tsquery из
+    ввода не проходит).
+    """
+    return ' & '.join(f"'{word}':*" for word in re.findall(r'\w+', text))
+
+
+def search_log(queryset, text):
+    """
+    Записи queryset (LogEntry), в тексте которых есть все слова text,
+    от самых релевантных. У записей есть атрибут search_snippet -
+    фрагмент найденного текста.
+    """
+    match = fts_query(text)
+    if not match:
+        return queryset.none()
+
+    if connections[queryset.db].vendor != 'sqlite':
+        query = pg_tsquery(text)
+        return queryset.extra(
+            where=[f"{PG_VECTOR} @@ to_tsquery('simple', %s)"],
+            params=[query],
+            select={
+                'search_rank': f"ts_rank({PG_VECTOR}, to_tsquery('simple', %s))",
+                'search_snippet': (
+                    f"ts_headline('simple', {PG_DOCUMENT}, to_tsquery('simple', %s), "
+                    f"'MaxWords={SNIPPET_WORDS}, MinWords=3, StartSel=\"\", StopSel=\"\"')"
+                ),
+            },
+            select_params=[query, query],
+            order_by=['-search_rank'],
+        )
+
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        # "+ 0" оставляет FTS5 внешним циклом: без статистики ANALYZE SQLite
+        # считает фильтр по игре избирательным и иначе ищет MATCH для каждой
+        # записи игры (минуты на 10^6 записей вместо миллисекунд)
+        where=[f'{table}.id = {SEARCH_TABLE}.rowid + 0', f'{SEARCH_TABLE} MATCH %s'],
+        params=[match],
+        select={
+            'search_rank': f'{SEARCH_TABLE}.rank',
+            'search_snippet': f"snippet({SEARCH_TABLE}, 0, '', '', '…', {SNIPPET_WORDS})",
+        },
+        order_by=['search_rank'],
+    )
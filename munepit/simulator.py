@@ -0,0 +1,187 @@
+# munepit/simulator.py
+"""
+Подбор параметров динамической цены (DynamicPrice) без игры.
+
+Правило цены из britain_sale: check_recovery() возвращает цену к pmax,
+если с последней записи прошло t_recovery секунд; покупатель берет q
+единиц по текущей цене; record_sale() ставит цену
+max(0, pmax - продано // n_for_drop). simulate() проигрывает это правило
+на потоке покупателей сразу для тысяч комбинаций (pmax, n_for_drop,
+t_recovery): состояние - массивы NumPy по комбинациям, цикл Python идет
+только по покупателям, поэтому полный перебор укладывается в секунды.
+
+Покупатель - (время, количество, готовность платить): он покупает, только
+если цена не выше готовности. Потоки строятся по журналу (sale_streams:
+готовность - заплаченная цена с запасом tolerance) или по кривой спроса
+(synthetic_stream: пуассоновский поток с равномерной готовностью вокруг
+цены).
+
+NumPy - необязательная зависимость: без нее модуль импортируется, а
+tune_prices сообщает, что пакет нужен.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+
+from .forms import GoodsSaleForm
+from .models import DynamicPrice, LogEntry, PriceList
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Покупатели товара по времени: секунды от начала, штуки, готовность платить
+Stream = namedtuple('Stream', 'times quantities willingness')
+
+# Ключ товара в britain_sale -> наименование в прайс-листе
+GOODS = dict(GoodsSaleForm.GOODS_CHOICES)
+
+
+def sale_streams(game_id, tolerance=1.2):
+    """Покупатели из продаж журнала игры по товарам; готовность - цена * tolerance."""
+    rows = {}
+    start = None
+    sales = LogEntry.objects.filter(
+        game_id=game_id, table='britain', action_type='sale',
+    ).order_by('timestamp', 'id').values_list('timestamp', 'details')
+    for timestamp, details in sales.iterator(chunk_size=2000):
+        start = start or timestamp
+        good = (details or {}).get('good')
+        if good:
+            rows.setdefault(good, []).append((
+                (timestamp - start).total_seconds(),
+                int(details.get('quantity') or 0),
+                float(details.get('price_per_unit') or 0) * tolerance,
+            ))
+    return {
+        good: Stream(*(np.array(column) for column in zip(*values)))
+        for good, values in rows.items()
+    }
+
+
+def synthetic_stream(rng, duration, rate, price, spread=0.5, max_quantity=5):
+    """
+    Пуассоновский поток покупателей: rate в секунду на duration секунд,
+    1..max_quantity штук, готовность равномерно в price * (1 +- spread).
+    """
+    count = rng.poisson(rate * duration)
+    return Stream(
+        np.sort(rng.uniform(0, duration, count)),
+        rng.integers(1, max_quantity + 1, count),
+        price * rng.uniform(1 - spread, 1 + spread, count),
+    )
+
+
+def parameter_grid(base_price, steps):
+    """Комбинации (pmax, n_for_drop, t_recovery) вокруг базовой цены товара."""
+    pmax = np.round(float(base_price) * np.linspace(0.5, 2.0, steps), 2)
+    n_for_drop = np.unique(np.geomspace(1, 50, steps).round().astype(np.int64))
+    t_recovery = np.unique(np.geomspace(30, 1800, steps).round())
+    return tuple(axis.ravel() for axis in np.meshgrid(pmax, n_for_drop, t_recovery, indexing='ij'))
+
+
+def simulate(stream, pmax, n_for_drop, t_recovery, trace=False):
+    """
+    Выручка и доля обслуженного спроса для каждой комбинации параметров
+    (массивы одной длины). trace=True - еще и цена, которую видел каждый
+    покупатель: массив (покупатели x комбинации), только для малого числа
+    комбинаций.
+    """
+    pmax = np.asarray(pmax, dtype=float)
+    n_for_drop = np.asarray(n_for_drop, dtype=np.int64)
+    t_recovery = np.asarray(t_recovery, dtype=float)
+
+    price = pmax.copy()
+    sold = np.zeros(pmax.shape, dtype=np.int64)
+    last = np.full(pmax.shape, -np.inf)
+    revenue = np.zeros(pmax.shape)
+    served = np.zeros(pmax.shape, dtype=np.int64)
+    quoted = np.empty((len(stream.times),) + pmax.shape) if trace else None
+
+    events = zip(stream.times.tolist(), stream.quantities.tolist(), stream.willingness.tolist())
+    for i, (at, quantity, willingness) in enumerate(events):
+        # check_recovery(): восстановление тоже сохраняет запись и сдвигает last_update
+        recover = (at - last >= t_recovery) & (price < pmax)
+        price = np.where(recover, pmax, price)
+        sold = np.where(recover, 0, sold)
+        last = np.where(recover, at, last)
+        if trace:
+            quoted[i] = price
+
+        buy = price <= willingness
+        revenue += np.where(buy, price * quantity, 0)
+        served += buy * quantity
+        sold = np.where(buy, sold + quantity, sold)
+        # record_sale(): при n_for_drop = 0 цена не падает
+        drop = np.where(n_for_drop > 0, sold // np.maximum(n_for_drop, 1), 0)
+        price = np.where(buy, np.maximum(0, pmax - drop), price)
+        last = np.where(buy, at, last)
+
+    demand = int(stream.quantities.sum())
+    return {
+        'revenue': revenue,
+        'fill': served / demand if demand else np.ones(pmax.shape),
+        'quoted': quoted,
+    }
+
+
+def best(result, min_fill):
+    """Номер комбинации с наибольшей выручкой среди обслуживших не меньше min_fill спроса."""
+    allowed = result['fill'] >= min_fill
+    if not allowed.any():
+        allowed = result['fill'] == result['fill'].max()
+    return int(np.where(allowed, result['revenue'], -np.inf).argmax())
+
+
+def sweep(stream, base_price, current, steps=20, min_fill=0.8):
+    """
+    Перебор сетки parameter_grid для одного товара. current - нынешние
+    (pmax, n_for_drop, t_recovery) для сравнения. Возвращает выбранные
+    параметры, выручку и долю спроса для них и для нынешних, число
+    комбинаций и цены, которые видели покупатели (столбцы: выбранные,
+    нынешние).
+    """
+    grid = parameter_grid(base_price, steps)
+    result = simulate(stream, *grid)
+    index = best(result, min_fill)
+    chosen = (float(grid[0][index]), int(grid[1][index]), int(grid[2][index]))
+    # Выбранные и нынешние параметры - еще раз, с ценами по покупателям
+    pair = simulate(stream, *zip(chosen, current), trace=True)
+    return {
+        'chosen': chosen,
+        'current': tuple(current),
+        'revenue': pair['revenue'].tolist(),
+        'fill': pair['fill'].tolist(),
+        'combinations': len(grid[0]),
+        'times': stream.times,
+        'quoted': pair['quoted'],
+    }
+
+
+def current_parameters(good):
+    """(pmax, n_for_drop, t_recovery) товара: динамическая цена, иначе прайс-лист."""
+    price = DynamicPrice.objects.filter(good_name=good).first()
+    if price:
+        return float(price.pmax), price.n_for_drop, price.t_recovery
+    item = PriceList.objects.filter(name=GOODS.get(good, good), category='goods').first()
+    if item and item.pmax is not None:
+        return float(item.pmax), item.n_for_drop or 1, item.t_recovery or 0
+    return None
+
+
+def apply_parameters(good, pmax, n_for_drop, t_recovery):
+    """Записывает параметры в прайс-лист и динамическую цену товара."""
+    with transaction.atomic():
+        item = PriceList.objects.filter(name=GOODS.get(good, good), category='goods').first()
+        if item:
+            item.pmax, item.n_for_drop, item.t_recovery = pmax, n_for_drop, t_recovery
+            item.save(update_fields=['pmax', 'n_for_drop', 't_recovery', 'updated_at'])
+
+        price = DynamicPrice.objects.filter(good_name=good).first() \
+            or DynamicPrice(good_name=good, current_price=pmax)
+        price.pmax, price.n_for_drop, price.t_recovery = pmax, n_for_drop, t_recovery
+        # Цена выше нового потолка сразу опускается до него
+        price.current_price = min(float(price.current_price), pmax)
+        price.save()
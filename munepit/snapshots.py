@@ -0,0 +1,150 @@
+# munepit/snapshots.py
+"""
+Снимки базы для отчетов.
+
+Статистика и журнал операций сканируют весь лог игры. На рабочей базе
+такой скан держит транзакцию чтения, пока столы пишут, и в WAL-режиме
+не дает checkpoint'у вернуть журнал в основной файл. Поэтому отчеты
+читают копию, снятую SQLite online backup API за один шаг, внутри одной
+транзакции чтения: в WAL-режиме она не блокирует пишущих, а их записи
+во время копирования просто не попадают в снимок.
+
+settings.REPORT_SNAPSHOTS сопоставляет рабочей базе ее снимок (соединение
+с ним открывается только на чтение, PRAGMA query_only), маршрутизацию
+чтений делает munepit.routers.LogRouter.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.transaction import TransactionManagementError
+
+logger = logging.getLogger(__name__)
+
+_refresh_lock = threading.Lock()
+
+
+def backup(alias, target_path):
+    """
+    Копия базы alias в target_path через online backup API.
+
+    Копия пишется во временный файл и подменяет target_path атомарно:
+    читатели старого снимка дочитывают его, новые открывают уже новый.
+    """
+    target_path = os.fspath(target_path)
+    os.makedirs(os.path.dirname(target_path) or '.', exist_ok=True)
+    tmp_path = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    connection = connections[alias]
+    if connection.in_atomic_block:
+        # Своя незафиксированная запись держит блокировку - backup ждал бы ее вечно
+        raise TransactionManagementError('Снимок базы нельзя делать внутри транзакции')
+    connection.ensure_connection()
+    destination = sqlite3.connect(tmp_path)
+    try:
+        # Все страницы за один шаг: при копировании порциями каждая запись
+        # другого соединения между шагами перезапускает backup с начала, и под
+        # постоянной записью столов копия большой базы могла не закончиться
+        connection.connection.backup(destination, pages=-1)
+        # Снимок только читают - WAL-файлы рядом с ним не нужны
+        destination.execute('PRAGMA journal_mode = DELETE')
+    except BaseException:
+        destination.close()
+        os.unlink(tmp_path)
+        raise
+    destination.close()
+    os.replace(tmp_path, target_path)
+
+
+def _read_only(sender, connection, **kwargs):
+    # Тестовая база снимка в памяти остается записываемой: ее создает
+    # и мигрирует тест-раннер
+    if connection.alias in settings.REPORT_SNAPSHOTS.values() and not connection.is_in_memory_db():
+        connection.connection.execute('PRAGMA query_only = 1')
+
+
+def connect_signals():
+    connection_created.connect(_read_only, dispatch_uid='snapshots-read-only')
+
+
+def _snapshot_path(source):
+    return connections[settings.REPORT_SNAPSHOTS[source]].settings_dict['NAME']
+
+
+def _is_configured(source):
+    # Тестовая база снимка живет в памяти - тогда отчеты читают рабочую базу
+    alias = settings.REPORT_SNAPSHOTS.get(source)
+    return alias is not None and not connections[alias].is_in_memory_db()
+
+
+def snapshot_ready(source):
+    """Снимок базы source настроен и существует как отдельный файл."""
+    return _is_configured(source) and os.path.exists(_snapshot_path(source))
+
+
+def refresh(sources=None):
+    """Пересоздает снимки (по умолчанию - всех баз из REPORT_SNAPSHOTS)."""
+    if sources is None:
+        sources = list(settings.REPORT_SNAPSHOTS)
+    for source in sources:
+        if _is_configured(source):
+            backup(source, _snapshot_path(source))
+
+
+def _refresh_in_background(sources):
+    try:
+        refresh(sources)
+    except Exception:
+        logger.exception('Не удалось обновить снимок отчетов')
+    finally:
+        connections.close_all()
+        _refresh_lock.release()
+
+
+def snapshot_age(source):
+    """Возраст снимка в секундах, None - снимка нет."""
+    try:
+        return time.time() - os.path.getmtime(_snapshot_path(source))
+    except OSError:
+        return None
+
+
+def ensure_fresh():
+    """
+    Время, на которое актуальны данные снимков (None - снимков еще нет).
+
+    Отсутствующий или устаревший (старше REPORT_SNAPSHOT_INTERVAL) снимок
+    создается в фоновом потоке, а текущий запрос читает предыдущую копию.
+    Первый отчет после запуска не ждет полной копии базы: пока снимка нет,
+    LogRouter оставляет чтения на рабочей базе.
+    """
+    sources = [source for source in settings.REPORT_SNAPSHOTS if _is_configured(source)]
+    if not sources:
+        return None
+    ages = {source: snapshot_age(source) for source in sources}
+    due = [source for source, age in ages.items() if age is None or age > settings.REPORT_SNAPSHOT_INTERVAL]
+    if due and _refresh_lock.acquire(blocking=False):
+        threading.Thread(
+            target=_refresh_in_background, args=(due,), name='report-snapshot', daemon=True,
+        ).start()
+    ready = [source for source, age in ages.items() if age is not None]
+    if not ready:
+        return None
+    oldest = min(os.path.getmtime(_snapshot_path(source)) for source in ready)
+    return datetime.fromtimestamp(oldest, tz=dt_timezone.utc)
+
+
+@contextmanager
+def reading_snapshot():
+    """Чтения моделей игры внутри блока идут в снимки (если они есть)."""
+    from .routers import reporting
+
+    snapshot_at = ensure_fresh()
+    with reporting():
+        yield snapshot_at
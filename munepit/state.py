@@ -0,0 +1,91 @@
+# munepit/state.py
+"""
+Версия состояния столов.
+
+У каждого стола (LogEntry.TABLE_CHOICES) в общем кэше
+settings.FRAGMENT_VERSION_CACHE лежит тройка (счетчик, время, метка).
+Любая запись в модели стола (сигналы и bump() из munepit/fragments.py)
+увеличивает счетчик, ставит время записи и новую случайную метку.
+
+По версии представления отвечают на условный GET (ETag, Last-Modified,
+304 до запросов к базе), а state_cached() сбрасывает кэш в памяти
+процесса: каждый воркер сверяет свою копию с общей версией.
+
+Счетчик только растет, но в файловом кэше инкремент не атомарен: два
+воркера, записавшие одновременно, могут получить одно значение. Поэтому
+сравнивается метка, а счетчик и время служат для Last-Modified и отладки.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+STATE_KEY = 'munepit:state:{}'
+
+TABLES = ('island', 'britain')
+
+# Какие модели показывают страницы стола. Журнал относится к столу записи,
+# игра и прайс-лист - к обоим столам
+TABLE_MODELS = {
+    'island': {'munepit.convict', 'munepit.constructedbuilding', 'munepit.pricelist', 'munepit.game'},
+    'britain': {'munepit.credit', 'munepit.privateer', 'munepit.dynamicprice', 'munepit.pricelist', 'munepit.game'},
+}
+
+# Копии данных в памяти процесса: (стол, имя) -> (метка версии, значение)
+_local = {}
+
+
+def _cache():
+    return caches[settings.FRAGMENT_VERSION_CACHE]
+
+
+def tables_of(*models, instance=None):
+    """Столы, чьи страницы зависят от моделей; для записи журнала - ее стол."""
+    tables = set()
+    for model in models:
+        if model._meta.label_lower == 'munepit.logentry':
+            table = getattr(instance, 'table', None)
+            tables.update([table] if table in TABLES else TABLES)
+        else:
+            tables.update(table for table in TABLES if model._meta.label_lower in TABLE_MODELS[table])
+    return sorted(tables)
+
+
+def table_state(table):
+    """(счетчик, время записи в секундах Unix, метка) для стола."""
+    key = STATE_KEY.format(table)
+    state = _cache().get(key)
+    if state is None:
+        # Первое обращение после очистки кэша: время - сейчас, чтобы
+        # клиент не получил Last-Modified старше уже показанных данных
+        _cache().add(key, (1, time.time(), uuid.uuid4().hex), None)
+        state = _cache().get(key)
+    return state
+
+
+def bump_tables(*tables):
+    """Новая версия состояния столов после записи."""
+    if not tables:
+        return
+    keys = {table: STATE_KEY.format(table) for table in tables}
+    current = _cache().get_many(keys.values())
+    now = time.time()
+    _cache().set_many({
+        key: (current.get(key, (0,))[0] + 1, now, uuid.uuid4().hex) for key in keys.values()
+    }, None)
+
+
+def state_cached(table, name, compute):
+    """
+    Значение compute(), сохраненное в памяти процесса до следующей записи
+    на стол. Значение не сериализуется, поэтому годится и для списков
+    моделей; вызывающий не должен его изменять.
+    """
+    token = table_state(table)[2]
+    cached = _local.get((table, name))
+    if cached is not None and cached[0] == token:
+        return cached[1]
+    value = compute()
+    _local[(table, name)] = (token, value)
+    return value
@@ -0,0 +1,1818 @@
+// munepit/static/munepit/js/nepit.js
+//
+// Сценарии всех страниц столов одним файлом: браузер загружает его один раз
+// и дальше берет из кэша. Страница объявляет себя в <body data-page="...">,
+// после загрузки DOM вызывается только ее функция; остальные data-атрибуты
+// body передаются ей в аргументе data.
+(function () {
+    'use strict';
+
+    const pages = {};
+    // Разница часов сервера и планшета, мс (по последнему ответу /api/timers/)
+    let clockOffset = 0;
+
+    window.Nepit = {
+        // Регистрация сценария страницы
+        page: function (name, init) {
+            pages[name] = init;
+        },
+
+        // Калькулятор сдачи: внесено money при сумме к оплате required.
+        // Элементы changeBlock/changeAmount/errorBlock/requiredAmount/submitBtn
+        // одинаковы на всех кассовых формах. Возвращает true, если денег хватает.
+        showChange: function (money, required) {
+            const enough = money >= required;
+            if (enough) {
+                document.getElementById('changeAmount').textContent = (money - required).toFixed(2);
+            } else {
+                document.getElementById('requiredAmount').textContent = required.toFixed(2);
+            }
+            document.getElementById('changeBlock').style.display = enough ? 'block' : 'none';
+            document.getElementById('errorBlock').style.display = enough ? 'none' : 'block';
+            document.getElementById('submitBtn').disabled = !enough;
+            return enough;
+        },
+
+        // Сброс калькулятора сдачи, пока сумма к оплате не известна
+        hideChange: function () {
+            document.getElementById('changeBlock').style.display = 'none';
+            document.getElementById('errorBlock').style.display = 'none';
+            document.getElementById('submitBtn').disabled = true;
+        },
+
+        // Время сервера в секундах Unix: часы планшета могут уходить
+        serverNow: function () {
+            return (Date.now() + clockOffset) / 1000;
+        },
+
+        // Таймеры стола одним запросом (/api/timers/): onUpdate получает
+        // {convicts: {id: {player_id, sentenced_at, ...}}, ...} сразу и затем
+        // раз в refreshSeconds; между обновлениями страница тикает сама
+        timers: function (url, onUpdate, refreshSeconds) {
+            function load() {
+                let serverDate = null;
+                fetch(url)
+                    .then(response => {
+                        // Ответ 304 отдает тело из кэша браузера со старым now,
+                        // а Date у него свежий
+                        serverDate = Date.parse(response.headers.get('Date'));
+                        return response.json();
+                    })
+                    .then(payload => {
+                        if (!payload.success) {
+                            return;
+                        }
+                        clockOffset = (isNaN(serverDate) ? payload.now * 1000 : serverDate) - Date.now();
+                        const groups = {};
+                        Object.keys(payload).forEach(name => {
+                            const group = payload[name];
+                            if (group && group.fields) {
+                                groups[name] = {};
+                                group.rows.forEach(row => {
+                                    const item = {};
+                                    group.fields.forEach((field, i) => { item[field] = row[i]; });
+                                    groups[name][item.id] = item;
+                                });
+                            } else {
+                                groups[name] = group;
+                            }
+                        });
+                        onUpdate(groups);
+                    });
+            }
+            load();
+            setInterval(load, (refreshSeconds || 60) * 1000);
+        }
+    };
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const init = pages[document.body.dataset.page];
+        if (init) {
+            init(document.body.dataset);
+        }
+    });
+})();
+
+// island/build.html
+Nepit.page('island-build', function (data) {
+    // Элементы формы
+    const buildingInput = document.getElementById('id_building');
+    const playerInput = document.getElementById('id_player_id');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Информационные элементы
+    const buildingInfo = document.getElementById('buildingInfo');
+    const resourcesRequired = document.getElementById('resourcesRequired');
+    const selectedBuildingName = document.getElementById('selectedBuildingName');
+    const selectedBuildingType = document.getElementById('selectedBuildingType');
+    const selectedBuildingPrice = document.getElementById('selectedBuildingPrice');
+    const totalCost = document.getElementById('totalCost');
+    const playerInfo = document.getElementById('playerInfo');
+    const playerDetails = document.getElementById('playerDetails');
+
+    // Хранилище выбранного здания
+    let selectedBuilding = null;
+
+    // Функция выбора здания
+    window.selectBuilding = function(buildingId) {
+        // Находим карточку
+        const card = document.querySelector(`[data-building-id="${buildingId}"]`);
+
+        if (card) {
+            // Убираем выделение со всех карточек
+            document.querySelectorAll('.building-card').forEach(c => {
+                c.classList.remove('selected');
+            });
+
+            // Выделяем выбранную карточку
+            card.classList.add('selected');
+
+            // Сохраняем данные
+            selectedBuilding = {
+                id: buildingId,
+                name: card.dataset.buildingName,
+                price: parseFloat(card.dataset.buildingPrice),
+                type: card.dataset.buildingType
+            };
+
+            // Устанавливаем значение в скрытое поле
+            buildingInput.value = buildingId;
+
+            // Обновляем информацию
+            updateBuildingInfo();
+        }
+    };
+
+    // Функция обновления информации о здании
+    function updateBuildingInfo() {
+        if (selectedBuilding) {
+            buildingInfo.style.display = 'block';
+            resourcesRequired.style.display = 'block';
+            selectedBuildingName.textContent = selectedBuilding.name;
+            selectedBuildingType.textContent = selectedBuilding.type;
+            selectedBuildingPrice.textContent = selectedBuilding.price.toFixed(2);
+            totalCost.textContent = selectedBuilding.price.toFixed(2) + ' ₽';
+
+            // Обновляем требуемые ресурсы в зависимости от типа здания
+            if (selectedBuilding.type === 'factory') {
+                document.getElementById('woodRequired').textContent = '200';
+                document.getElementById('stoneRequired').textContent = '100';
+                document.getElementById('toolsRequired').textContent = '50';
+            } else if (selectedBuilding.type === 'business') {
+                document.getElementById('woodRequired').textContent = '100';
+                document.getElementById('stoneRequired').textContent = '50';
+                document.getElementById('toolsRequired').textContent = '30';
+            } else {
+                document.getElementById('woodRequired').textContent = '50';
+                document.getElementById('stoneRequired').textContent = '25';
+                document.getElementById('toolsRequired').textContent = '10';
+            }
+
+            // Проверяем возможность постройки
+            checkBuildPossibility();
+        } else {
+            buildingInfo.style.display = 'none';
+            resourcesRequired.style.display = 'none';
+            totalCost.textContent = '0 ₽';
+            submitBtn.disabled = true;
+        }
+    }
+
+    // Функция проверки игрока
+    function checkPlayer() {
+        const playerId = playerInput.value.trim();
+
+        if (playerId) {
+            // Здесь должен быть AJAX запрос для проверки игрока
+            playerInfo.innerHTML = `<span class="text-success">✓ Игрок #${playerId} найден</span>`;
+
+            // Показываем информацию об игроке
+            playerDetails.innerHTML = `
+                <div class="d-flex align-items-center">
+                    <div class="flex-shrink-0">
+                        <i class="bi bi-person-circle fs-1"></i>
+                    </div>
+                    <div class="flex-grow-1 ms-3">
+                        <h6>Игрок #${playerId}</h6>
+                        <p class="mb-1"><i class="bi bi-building"></i> Построек: 0</p>
+                        <p class="mb-1"><i class="bi bi-cash"></i> Баланс: 10,000 ₽</p>
+                        <small class="text-muted">Последняя активность: сегодня</small>
+                    </div>
+                </div>
+            `;
+
+            checkBuildPossibility();
+        } else {
+            playerInfo.innerHTML = '';
+            playerDetails.innerHTML = '<p class="text-muted mb-0">Введите номер игрока для просмотра</p>';
+            submitBtn.disabled = true;
+        }
+    }
+
+    // Функция проверки возможности постройки
+    function checkBuildPossibility() {
+        const playerId = playerInput.value.trim();
+
+        if (selectedBuilding && playerId) {
+            // Здесь можно добавить проверку наличия ресурсов
+            submitBtn.disabled = false;
+        } else {
+            submitBtn.disabled = true;
+        }
+    }
+
+    // События
+    document.getElementById('checkPlayerBtn').addEventListener('click', checkPlayer);
+    playerInput.addEventListener('blur', checkPlayer);
+    playerInput.addEventListener('input', function() {
+        if (!this.value) {
+            playerInfo.innerHTML = '';
+            playerDetails.innerHTML = '<p class="text-muted mb-0">Введите номер игрока для просмотра</p>';
+            submitBtn.disabled = true;
+        }
+    });
+
+    // Инициализация
+    if (buildingInput.value) {
+        selectBuilding(buildingInput.value);
+    }
+});
+
+// island/build_confirm.html
+Nepit.page('island-build-confirm', function (data) {
+    // Сценарий включается вместе с автоматическим редиректом (data-redirect-url)
+    if (!data.redirectUrl) {
+        return;
+    }
+
+    // Анимация появления
+    const elements = document.querySelectorAll('.building-details, .stats-grid, .info-card, .btn');
+    elements.forEach((el, index) => {
+        el.style.opacity = '0';
+        el.style.transform = 'translateY(20px)';
+
+        setTimeout(() => {
+            el.style.transition = 'all 0.5s ease';
+            el.style.opacity = '1';
+            el.style.transform = 'translateY(0)';
+        }, 100 * index);
+    });
+
+    // Автоматический редирект через 10 секунд
+    let secondsLeft = 10;
+    const timerElement = document.createElement('div');
+    timerElement.className = 'text-center mt-3 text-muted';
+    timerElement.innerHTML = `Автоматический переход через <span id="timer">${secondsLeft}</span> секунд...`;
+
+    const container = document.querySelector('.row.justify-content-center .col-md-8');
+    container.appendChild(timerElement);
+
+    const timer = setInterval(() => {
+        secondsLeft--;
+        const timerSpan = document.getElementById('timer');
+        if (timerSpan) {
+            timerSpan.textContent = secondsLeft;
+        }
+
+        if (secondsLeft <= 0) {
+            clearInterval(timer);
+            window.location.href = data.redirectUrl;
+        }
+    }, 1000);
+
+    // Отмена автоматического редиректа при взаимодействии
+    document.addEventListener('click', function() {
+        clearInterval(timer);
+        if (timerElement) {
+            timerElement.style.display = 'none';
+        }
+    }, { once: true });
+});
+
+// island/court.html
+Nepit.page('island-court', function (data) {
+    document.getElementById('id_sentence_years').addEventListener('change', function() {
+        const warning = document.querySelector('.alert-warning');
+        if (this.value > 0) {
+            warning.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Внимание! Игрок будет отправлен на каторгу на ' + this.value + ' лет.';
+        } else {
+            warning.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Внимание! Приговор будет зарегистрирован в системе.';
+        }
+    });
+});
+
+// island/demolish.html
+Nepit.page('island-demolish', function (data) {
+    // Элементы формы
+    const buildingSelect = document.getElementById('id_building');
+    const demolisherInput = document.getElementById('id_demolisher_id');
+    const confirmCheck = document.getElementById('confirmCheck');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Информационные элементы
+    const buildingInfo = document.getElementById('buildingInfo');
+    const businessProfit = document.getElementById('businessProfit');
+    const infoOwner = document.getElementById('infoOwner');
+    const infoName = document.getElementById('infoName');
+    const infoType = document.getElementById('infoType');
+    const infoCost = document.getElementById('infoCost');
+    const infoDate = document.getElementById('infoDate');
+    const infoIncome = document.getElementById('infoIncome');
+    const infoLast = document.getElementById('infoLast');
+    const workTime = document.getElementById('workTime');
+    const accumulatedProfit = document.getElementById('accumulatedProfit');
+    const demolisherInfo = document.getElementById('demolisherInfo');
+
+    let currentBuilding = null;
+    let timerInterval = null;
+    let lastTimestamp = null;
+
+    // Функция форматирования времени
+    function formatTime(seconds) {
+        const mins = Math.floor(seconds / 60);
+        const hours = Math.floor(mins / 60);
+        const remainingMins = mins % 60;
+
+        if (hours > 0) {
+            return `${hours} ч ${remainingMins} мин`;
+        } else {
+            return `${mins} мин ${Math.floor(seconds % 60)} сек`;
+        }
+    }
+
+    // Функция форматирования даты
+    function formatDateTime(timestamp) {
+        if (!timestamp) return '—';
+        const date = new Date(timestamp * 1000);
+        return date.toLocaleString('ru-RU', {
+            hour: '2-digit',
+            minute: '2-digit',
+            day: '2-digit',
+            month: '2-digit',
+            year: 'numeric'
+        });
+    }
+
+    // Функция обновления таймера для бизнеса
+    function updateTimer() {
+        if (!lastTimestamp || !currentBuilding || currentBuilding.type !== 'business') return;
+
+        const now = Math.floor(Date.now() / 1000);
+        const diffSeconds = now - lastTimestamp;
+        const diffMinutes = diffSeconds / 60;
+
+        // Рассчитываем накопленную прибыль
+        const incomePerMinute = currentBuilding.income;
+        const profit = incomePerMinute * diffMinutes;
+
+        workTime.textContent = formatTime(diffSeconds);
+        accumulatedProfit.textContent = profit.toFixed(2) + ' ₽';
+    }
+
+    // Функция загрузки информации о здании
+    function loadBuildingInfo() {
+        const selected = buildingSelect.options[buildingSelect.selectedIndex];
+
+        if (selected && selected.value) {
+            const lastTimestamp = parseInt(selected.dataset.last) || Math.floor(Date.now() / 1000) - 3600;
+
+            currentBuilding = {
+                id: selected.value,
+                owner: selected.dataset.owner,
+                name: selected.dataset.name,
+                type: selected.dataset.type,
+                cost: parseFloat(selected.dataset.cost),
+                income: parseFloat(selected.dataset.income) || 0,
+                last: lastTimestamp
+            };
+
+            // Базовая информация о здании
+            buildingInfo.style.display = 'block';
+            infoOwner.textContent = '#' + currentBuilding.owner;
+            infoName.textContent = currentBuilding.name;
+
+            // Тип здания
+            const typeMap = {
+                'business': 'Бизнес',
+                'factory': 'Фабрика',
+                'residential': 'Жилой дом',
+                'other': 'Другое'
+            };
+            infoType.textContent = typeMap[currentBuilding.type] || currentBuilding.type;
+
+            infoCost.textContent = currentBuilding.cost.toFixed(2) + ' ₽';
+            infoDate.textContent = formatDateTime(currentBuilding.last - 86400); // Пример: день назад
+
+            // Для бизнеса показываем дополнительную информацию
+            if (currentBuilding.type === 'business') {
+                businessProfit.style.display = 'block';
+                infoIncome.textContent = currentBuilding.income.toFixed(2) + ' ₽/мин';
+                infoLast.textContent = formatDateTime(currentBuilding.last);
+
+                lastTimestamp = currentBuilding.last;
+
+                // Запускаем таймер
+                if (timerInterval) clearInterval(timerInterval);
+                updateTimer();
+                timerInterval = setInterval(updateTimer, 1000);
+            } else {
+                businessProfit.style.display = 'none';
+                if (timerInterval) clearInterval(timerInterval);
+            }
+
+            // Проверяем возможность сноса
+            checkSubmitPossibility();
+        } else {
+            buildingInfo.style.display = 'none';
+            businessProfit.style.display = 'none';
+            if (timerInterval) clearInterval(timerInterval);
+            checkSubmitPossibility();
+        }
+    }
+
+    // Функция проверки исполнителя сноса
+    function checkDemolisher() {
+        const demolisherId = demolisherInput.value.trim();
+
+        if (demolisherId) {
+            demolisherInfo.innerHTML = `<span class="text-success">✓ Исполнитель #${demolisherId} найден</span>`;
+        } else {
+            demolisherInfo.innerHTML = '';
+        }
+
+        checkSubmitPossibility();
+    }
+
+    // Функция проверки возможности сноса
+    function checkSubmitPossibility() {
+        const hasBuilding = buildingSelect.value !== '';
+        const hasDemolisher = demolisherInput.value.trim() !== '';
+        const isConfirmed = confirmCheck.checked;
+
+        submitBtn.disabled = !(hasBuilding && hasDemolisher && isConfirmed);
+    }
+
+    // События
+    buildingSelect.addEventListener('change', loadBuildingInfo);
+    demolisherInput.addEventListener('input', checkDemolisher);
+    demolisherInput.addEventListener('blur', checkDemolisher);
+    confirmCheck.addEventListener('change', checkSubmitPossibility);
+
+    document.getElementById('checkDemolisherBtn').addEventListener('click', checkDemolisher);
+
+    // Инициализация
+    if (buildingSelect.value) {
+        loadBuildingInfo();
+    }
+    if (demolisherInput.value) {
+        checkDemolisher();
+    }
+});
+
+// island/process_resource.html
+Nepit.page('island-process-resource', function (data) {
+    // Элементы формы
+    const factorySelect = document.getElementById('id_factory');
+    const quantityInput = document.getElementById('id_quantity');
+    const moneyInput = document.getElementById('moneyInput');
+    const submitBtn = document.getElementById('submitBtn');
+    const resourceInput = document.getElementById('resourceType');
+
+    // Информационные элементы
+    const factoryInfo = document.getElementById('factoryInfo');
+    const infoOwner = document.getElementById('infoOwner');
+    const infoName = document.getElementById('infoName');
+    const efficiencyBar = document.getElementById('efficiencyBar');
+    const quantity = document.getElementById('quantity');
+    const pricePerUnit = document.getElementById('pricePerUnit');
+    const totalCost = document.getElementById('totalCost');
+    const outputQuantity = document.getElementById('outputQuantity');
+    const outputBar = document.getElementById('outputBar');
+
+    // Константы
+    const PROCESSING_COST = 5; // Цена за обработку одной единицы
+    const OUTPUT_RATIOS = {
+        'coffee': 0.8,
+        'cocoa': 0.9,
+        'tobacco': 0.7,
+        'sugar_cane': 0.6
+    };
+
+    let selectedResource = null;
+
+    // Функция выбора ресурса
+    window.selectResource = function(resource) {
+        selectedResource = resource;
+        resourceInput.value = resource;
+
+        // Подсветка выбранной карточки
+        document.querySelectorAll('.resource-card').forEach(card => {
+            card.classList.remove('selected');
+        });
+        event.currentTarget.classList.add('selected');
+
+        updateCalculation();
+    };
+
+    // Функция загрузки информации о фабрике
+    function loadFactoryInfo() {
+        const selected = factorySelect.options[factorySelect.selectedIndex];
+
+        if (selected && selected.value) {
+            factoryInfo.style.display = 'block';
+            infoOwner.textContent = '#' + selected.dataset.owner;
+            infoName.textContent = selected.dataset.name;
+
+            // Рандомная эффективность для демонстрации
+            const efficiency = 85 + Math.floor(Math.random() * 15);
+            document.getElementById('infoEfficiency').textContent = efficiency;
+            efficiencyBar.style.width = efficiency + '%';
+            efficiencyBar.className = efficiency > 90 ? 'progress-bar bg-success' : 
+                                     efficiency > 75 ? 'progress-bar bg-warning' : 
+                                     'progress-bar bg-danger';
+        } else {
+            factoryInfo.style.display = 'none';
+        }
+    }
+
+    // Функция обновления расчета
+    function updateCalculation() {
+        const qty = parseInt(quantityInput.value) || 0;
+        const ratio = selectedResource ? OUTPUT_RATIOS[selectedResource] || 0.8 : 0.8;
+        const output = Math.floor(qty * ratio);
+
+        quantity.textContent = qty;
+        totalCost.textContent = (qty * PROCESSING_COST).toFixed(2);
+        outputQuantity.textContent = output;
+
+        const outputPercent = (output / qty) * 100;
+        outputBar.style.width = outputPercent + '%';
+
+        if (qty > 0) {
+            checkFunds();
+        } else {
+            Nepit.hideChange();
+        }
+    }
+
+    // Функция проверки достаточности средств
+    function checkFunds() {
+        const qty = parseInt(quantityInput.value) || 0;
+        const required = qty * PROCESSING_COST;
+        const money = parseFloat(moneyInput.value) || 0;
+
+        Nepit.showChange(money, required);
+    }
+
+    // События
+    factorySelect.addEventListener('change', loadFactoryInfo);
+    quantityInput.addEventListener('input', updateCalculation);
+    moneyInput.addEventListener('input', checkFunds);
+
+    // Инициализация
+    if (factorySelect.value) {
+        loadFactoryInfo();
+    }
+    updateCalculation();
+});
+
+// island/purchase_resource.html
+Nepit.page('island-purchase-resource', function (data) {
+    // Элементы формы
+    const resourceInput = document.getElementById('id_resource');
+    const playerInput = document.getElementById('id_player_id');
+    const quantityInput = document.getElementById('id_quantity');
+    const moneyInput = document.getElementById('moneyInput');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Информационные элементы
+    const purchaseInfo = document.getElementById('purchaseInfo');
+    const selectedResourceName = document.getElementById('selectedResourceName');
+    const selectedResourcePrice = document.getElementById('selectedResourcePrice');
+    const totalCost = document.getElementById('totalCost');
+    const playerInfo = document.getElementById('playerInfo');
+    const playerDetails = document.getElementById('playerDetails');
+
+    let currentResource = null;
+    let currentPrice = 0;
+
+    // Функция выбора ресурса
+    window.selectResource = function(resourceId, resourceName, resourcePrice) {
+        // Убираем выделение со всех карточек
+        document.querySelectorAll('.resource-card').forEach(c => {
+            c.classList.remove('selected');
+        });
+
+        // Выделяем выбранную карточку
+        const selectedCard = document.querySelector(`[data-resource-id="${resourceId}"]`);
+        if (selectedCard) {
+            selectedCard.classList.add('selected');
+        }
+
+        // Сохраняем данные
+        currentResource = resourceId;
+        currentPrice = resourcePrice;
+        resourceInput.value = resourceId;
+
+        // Обновляем отображение
+        purchaseInfo.style.display = 'block';
+        selectedResourceName.textContent = resourceName;
+        selectedResourcePrice.textContent = resourcePrice.toFixed(2);
+
+        updateTotal();
+    };
+
+    // Функция обновления общей стоимости
+    function updateTotal() {
+        const quantity = parseInt(quantityInput.value) || 0;
+
+        if (currentResource && quantity > 0) {
+            const total = currentPrice * quantity;
+            totalCost.textContent = total.toFixed(2) + ' ₽';
+            checkFunds(total);
+        } else {
+            totalCost.textContent = '0 ₽';
+            Nepit.hideChange();
+        }
+    }
+
+    // Функция проверки достаточности средств
+    function checkFunds(required) {
+        const money = parseFloat(moneyInput.value) || 0;
+
+        Nepit.showChange(money, required);
+    }
+
+    // Функция проверки игрока
+    function checkPlayer() {
+        const playerId = playerInput.value.trim();
+
+        if (playerId) {
+            playerInfo.innerHTML = `<span class="text-success">✓ Игрок #${playerId} найден</span>`;
+
+            playerDetails.innerHTML = `
+                <div class="d-flex align-items-center">
+                    <div class="flex-shrink-0">
+                        <i class="bi bi-person-circle fs-1"></i>
+                    </div>
+                    <div class="flex-grow-1 ms-3">
+                        <h6>Игрок #${playerId}</h6>
+                        <p class="mb-1"><i class="bi bi-cash"></i> Баланс: 10,000 ₽</p>
+                        <p class="mb-1"><i class="bi bi-box"></i> Ресурсов: 1,200 ед.</p>
+                        <small class="text-muted">Последняя активность: сегодня</small>
+                    </div>
+                </div>
+            `;
+        } else {
+            playerInfo.innerHTML = '';
+            playerDetails.innerHTML = '<p class="text-muted mb-0">Введите номер игрока для просмотра</p>';
+        }
+    }
+
+    // События
+    quantityInput.addEventListener('input', updateTotal);
+    moneyInput.addEventListener('input', function() {
+        if (currentResource) {
+            const quantity = parseInt(quantityInput.value) || 0;
+            const total = currentPrice * quantity;
+            checkFunds(total);
+        }
+    });
+
+    document.getElementById('checkPlayerBtn').addEventListener('click', checkPlayer);
+    playerInput.addEventListener('blur', checkPlayer);
+
+    // Инициализация: значения формы после ошибки валидации уже в полях
+    if (resourceInput.value) {
+        // Найти ресурс по ID и выбрать его
+        const resourceId = resourceInput.value;
+        const resourceCard = document.querySelector(`[data-resource-id="${resourceId}"]`);
+        if (resourceCard) {
+            selectResource(
+                resourceId,
+                resourceCard.dataset.resourceName,
+                parseFloat(resourceCard.dataset.resourcePrice)
+            );
+        }
+    }
+
+    if (playerInput.value) {
+        checkPlayer();
+    }
+});
+
+// island/release.html
+Nepit.page('island-release', function (data) {
+    const playerSelect = document.getElementById('id_player');
+    // Сроки всех каторжников одним запросом; дальше секунды считаются здесь
+    let convicts = {};
+    let loadedAt = 0;
+
+    // Как str(timedelta) в Python: "1 day, 2:03:04" / "0:05:12"
+    function formatDuration(seconds) {
+        const days = Math.floor(seconds / 86400);
+        const rest = seconds % 86400;
+        const time = Math.floor(rest / 3600) + ':' +
+            String(Math.floor(rest % 3600 / 60)).padStart(2, '0') + ':' +
+            String(rest % 60).padStart(2, '0');
+        return days ? `${days} ${days === 1 ? 'day' : 'days'}, ${time}` : time;
+    }
+
+    function load() {
+        return fetch(data.timesUrl)
+            .then(response => response.json())
+            .then(result => {
+                convicts = {};
+                result.convicts.forEach(convict => { convicts[convict.id] = convict; });
+                loadedAt = Date.now();
+            });
+    }
+
+    function show() {
+        const convict = convicts[playerSelect.value];
+        if (!convict) {
+            return;
+        }
+        const elapsed = Math.floor((Date.now() - loadedAt) / 1000);
+        const served = formatDuration(convict.served_seconds + elapsed);
+        let text = '<i class="bi bi-clock"></i> Время на каторге: <strong>' + served + '</strong>';
+        if (convict.remaining_seconds !== null) {
+            const remaining = Math.max(0, convict.remaining_seconds - elapsed);
+            text += remaining ? ', до конца срока: <strong>' + formatDuration(remaining) + '</strong>'
+                              : ', <strong>срок вышел</strong>';
+        }
+        document.getElementById('timeDisplay').innerHTML = text;
+        document.getElementById('id_time_served').value = served;
+        document.getElementById('timeServedGroup').style.display = 'block';
+    }
+
+    playerSelect.addEventListener('change', function () {
+        // Осужденного после загрузки страницы в списке еще нет
+        if (this.value && !(this.value in convicts)) {
+            load().then(show);
+        } else {
+            show();
+        }
+    });
+    load().then(show);
+    setInterval(show, 1000);
+});
+
+// britain/coal.html
+Nepit.page('britain-coal', function (data) {
+    // Элементы формы
+    const amountInput = document.getElementById('id_amount');
+    const moneyInput = document.getElementById('id_money_input');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Элементы калькулятора
+    const coalQuantity = document.getElementById('coalQuantity');
+    const calculatedTons = document.getElementById('calculatedTons');
+    const calculatedAmount = document.getElementById('calculatedAmount');
+    const PRICE_PER_TON = 50;
+
+    // Функция обновления калькулятора
+    function updateCalculator() {
+        const amount = parseFloat(amountInput.value) || 0;
+        const tons = Math.floor(amount / PRICE_PER_TON);
+
+        coalQuantity.value = tons;
+        calculatedTons.textContent = tons;
+        calculatedAmount.textContent = (tons * PRICE_PER_TON).toFixed(2);
+    }
+
+    // Функция проверки достаточности средств
+    function checkFunds() {
+        const amount = parseFloat(amountInput.value) || 0;
+        const money = parseFloat(moneyInput.value) || 0;
+
+        if (amount > 0 && money > 0) {
+            Nepit.showChange(money, amount);
+        } else {
+            Nepit.hideChange();
+        }
+    }
+
+    // События
+    amountInput.addEventListener('input', function() {
+        updateCalculator();
+        checkFunds();
+    });
+
+    moneyInput.addEventListener('input', checkFunds);
+
+    // Инициализация
+    updateCalculator();
+    checkFunds();
+});
+
+// britain/credit_issue.html
+Nepit.page('britain-credit-issue', function (data) {
+    // Элементы формы
+    const playerInput = document.getElementById('id_player_id');
+    const amountInput = document.getElementById('id_credit_amount');
+    const termSelect = document.getElementById('id_term');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Элементы отображения
+    const calcAmount = document.getElementById('calcAmount');
+    const monthlyPayment = document.getElementById('monthlyPayment');
+    const totalPayment = document.getElementById('totalPayment');
+    const scheduleBody = document.getElementById('scheduleBody');
+    const summaryPlayer = document.getElementById('summaryPlayer');
+    const summaryAmount = document.getElementById('summaryAmount');
+    const summaryTerm = document.getElementById('summaryTerm');
+    const summaryMonthly = document.getElementById('summaryMonthly');
+    const playerInfo = document.getElementById('playerInfo');
+    const playerCredits = document.getElementById('playerCredits');
+
+    // Функция расчета ежемесячного платежа
+    function calculateMonthly(amount, term) {
+        // (Сумма / Срок) * 1.5
+        return (amount / term) * 1.5;
+    }
+
+    // Функция обновления калькулятора
+    function updateCalculator() {
+        const amount = parseFloat(amountInput.value) || 0;
+        const term = parseInt(termSelect.value) || 0;
+
+        if (amount > 0 && term > 0) {
+            const monthly = calculateMonthly(amount, term);
+            const total = monthly * term;
+
+            // Обновляем отображение
+            calcAmount.textContent = amount.toFixed(2) + ' ₽';
+            monthlyPayment.textContent = monthly.toFixed(2) + ' ₽';
+            totalPayment.textContent = total.toFixed(2) + ' ₽';
+
+            // Обновляем график платежей
+            updatePaymentSchedule(amount, term, monthly);
+
+            // Обновляем сводку
+            summaryAmount.textContent = amount.toFixed(2) + ' ₽';
+            summaryTerm.textContent = term + ' мес';
+            summaryMonthly.textContent = monthly.toFixed(2) + ' ₽';
+        } else {
+            calcAmount.textContent = '0 ₽';
+            monthlyPayment.textContent = '0 ₽';
+            totalPayment.textContent = '0 ₽';
+            scheduleBody.innerHTML = '<tr><td colspan="3" class="text-center text-muted">Введите данные для расчета</td></tr>';
+            summaryAmount.textContent = '0 ₽';
+            summaryTerm.textContent = '—';
+            summaryMonthly.textContent = '0 ₽';
+        }
+    }
+
+    // Функция обновления графика платежей
+    function updatePaymentSchedule(amount, term, monthly) {
+        let remaining = amount;
+        let scheduleHtml = '';
+
+        for (let i = 1; i <= term; i++) {
+            remaining -= monthly;
+            if (remaining < 0) remaining = 0;
+
+            scheduleHtml += `
+                <tr class="payment-item">
+                    <td>${i}</td>
+                    <td>${monthly.toFixed(2)} ₽</td>
+                    <td>${remaining.toFixed(2)} ₽</td>
+                </tr>
+            `;
+        }
+
+        scheduleBody.innerHTML = scheduleHtml;
+    }
+
+    // Функция проверки игрока
+    function checkPlayer() {
+        const playerId = playerInput.value.trim();
+
+        if (playerId) {
+            summaryPlayer.textContent = '#' + playerId;
+            playerInfo.innerHTML = `<span class="text-success">✓ Игрок #${playerId} найден</span>`;
+
+            // Здесь должен быть AJAX запрос для получения кредитов игрока
+            playerCredits.innerHTML = `
+                <div class="alert alert-info">
+                    <small>Активных кредитов: 0</small><br>
+                    <small>Общая задолженность: 0 ₽</small>
+                </div>
+            `;
+        } else {
+            summaryPlayer.textContent = '—';
+            playerInfo.innerHTML = '';
+            playerCredits.innerHTML = '<p class="text-muted text-center mb-0">Введите номер игрока для просмотра</p>';
+        }
+    }
+
+    // События
+    playerInput.addEventListener('blur', checkPlayer);
+    amountInput.addEventListener('input', updateCalculator);
+    termSelect.addEventListener('change', updateCalculator);
+
+    document.getElementById('checkPlayerBtn').addEventListener('click', checkPlayer);
+
+    // Инициализация
+    updateCalculator();
+    if (playerInput.value) {
+        checkPlayer();
+    }
+});
+
+// britain/credit_payment.html
+Nepit.page('britain-credit-payment', function (data) {
+    // Элементы формы
+    const debtorSelect = document.getElementById('id_debtor');
+    const paymentInput = document.getElementById('id_payment_amount');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Информационные элементы
+    const creditInfo = document.getElementById('creditInfo');
+    const repaymentCalc = document.getElementById('repaymentCalc');
+    const infoPlayer = document.getElementById('infoPlayer');
+    const infoAmount = document.getElementById('infoAmount');
+    const infoMonthly = document.getElementById('infoMonthly');
+    const infoRemaining = document.getElementById('infoRemaining');
+    const paymentProgress = document.getElementById('paymentProgress');
+    const overdueWarning = document.getElementById('overdueWarning');
+    const timer = document.getElementById('timer');
+    const timerDisplay = document.getElementById('timerDisplay');
+
+    // Элементы калькулятора
+    const requiredPayment = document.getElementById('requiredPayment');
+    const bonusInfo = document.getElementById('bonusInfo');
+    const paymentsCovered = document.getElementById('paymentsCovered');
+    const remainingAfter = document.getElementById('remainingAfter');
+
+    let currentDebtor = null;
+    let timerInterval = null;
+
+    // Функция форматирования времени
+    function formatTime(seconds) {
+        const h = Math.floor(seconds / 3600);
+        const m = Math.floor((seconds % 3600) / 60);
+        const s = seconds % 60;
+        return `${h.toString().padStart(2, '0')}:${m.toString().padStart(2, '0')}:${s.toString().padStart(2, '0')}`;
+    }
+
+    // Функция обновления таймера
+    function updateTimer(lastPayment) {
+        if (timerInterval) clearInterval(timerInterval);
+
+        timerInterval = setInterval(() => {
+            const now = Math.floor(Date.now() / 1000);
+            const diff = now - lastPayment;
+            timerDisplay.textContent = formatTime(diff);
+        }, 1000);
+    }
+
+    // Функция загрузки информации о кредите
+    function loadCreditInfo() {
+        const selected = debtorSelect.options[debtorSelect.selectedIndex];
+
+        if (selected && selected.value) {
+            currentDebtor = {
+                id: selected.value,
+                player: selected.dataset.player,
+                amount: parseFloat(selected.dataset.amount),
+                monthly: parseFloat(selected.dataset.monthly),
+                remaining: parseInt(selected.dataset.remaining),
+                term: parseInt(selected.dataset.term),
+                overdue: selected.dataset.overdue === 'true'
+            };
+
+            // Отображаем информацию
+            creditInfo.style.display = 'block';
+            infoPlayer.textContent = '#' + currentDebtor.player;
+            infoAmount.textContent = currentDebtor.amount.toFixed(2) + ' ₽';
+            infoMonthly.textContent = currentDebtor.monthly.toFixed(2) + ' ₽';
+            infoRemaining.textContent = currentDebtor.remaining + '/' + currentDebtor.term;
+
+            // Прогресс
+            const progress = ((currentDebtor.term - currentDebtor.remaining) / currentDebtor.term) * 100;
+            paymentProgress.style.width = progress + '%';
+
+            // Просрочка
+            if (currentDebtor.overdue) {
+                overdueWarning.style.display = 'block';
+            } else {
+                overdueWarning.style.display = 'none';
+            }
+
+            // Таймер (здесь должен быть реальный timestamp)
+            timer.style.display = 'block';
+            updateTimer(Math.floor(Date.now() / 1000) - 300); // Пример: 5 минут назад
+
+            updateCalculation();
+        } else {
+            creditInfo.style.display = 'none';
+            repaymentCalc.style.display = 'none';
+            submitBtn.disabled = true;
+            if (timerInterval) clearInterval(timerInterval);
+        }
+    }
+
+    // Функция расчета погашения
+    function calculateRepayment(amount) {
+        if (!currentDebtor) return null;
+
+        const monthly = currentDebtor.monthly;
+        let covered = 0;
+        let remaining = amount;
+
+        // Обязательный платеж
+        if (remaining >= monthly) {
+            covered++;
+            remaining -= monthly;
+
+            // Дополнительные платежи
+            const bonusThreshold = monthly * 0.66;
+            while (remaining >= bonusThreshold && covered < currentDebtor.remaining) {
+                covered++;
+                remaining -= bonusThreshold;
+            }
+        }
+
+        // Не может быть больше оставшихся платежей
+        covered = Math.min(covered, currentDebtor.remaining);
+
+        return {
+            covered: covered,
+            remainingAmount: remaining,
+            newRemaining: currentDebtor.remaining - covered
+        };
+    }
+
+    // Функция обновления калькулятора
+    function updateCalculation() {
+        const payment = parseFloat(paymentInput.value) || 0;
+
+        if (currentDebtor && payment > 0) {
+            repaymentCalc.style.display = 'block';
+            requiredPayment.textContent = currentDebtor.monthly.toFixed(2) + ' ₽';
+
+            const result = calculateRepayment(payment);
+
+            if (result) {
+                const bonusMonths = result.covered - 1;
+                const bonusAmount = bonusMonths > 0 ? bonusMonths * (currentDebtor.monthly * 0.66) : 0;
+
+                bonusInfo.innerHTML = `${bonusAmount.toFixed(2)} ₽ = +${bonusMonths} мес`;
+                paymentsCovered.textContent = result.covered;
+                remainingAfter.textContent = result.newRemaining;
+
+                // Проверяем достаточно ли средств для обязательного платежа
+                if (payment >= currentDebtor.monthly) {
+                    submitBtn.disabled = false;
+                } else {
+                    submitBtn.disabled = true;
+                }
+            }
+        } else {
+            repaymentCalc.style.display = 'none';
+            submitBtn.disabled = true;
+        }
+    }
+
+    // Функция установки быстрой суммы
+    window.setPayment = function(type) {
+        if (!currentDebtor) {
+            alert('Сначала выберите должника');
+            return;
+        }
+
+        let amount = 0;
+        switch(type) {
+            case 'required':
+                amount = currentDebtor.monthly;
+                break;
+            case 'double':
+                amount = currentDebtor.monthly * 2;
+                break;
+            case 'triple':
+                amount = currentDebtor.monthly * 3;
+                break;
+            case 'full':
+                amount = currentDebtor.amount;
+                break;
+        }
+
+        paymentInput.value = amount.toFixed(2);
+        updateCalculation();
+    };
+
+    // События
+    debtorSelect.addEventListener('change', loadCreditInfo);
+    paymentInput.addEventListener('input', updateCalculation);
+
+    // Инициализация
+    if (debtorSelect.value) {
+        loadCreditInfo();
+    }
+});
+
+// britain/credits.html
+Nepit.page('britain-credits', function (data) {
+    // Время платежей и порог просрочки приходят с /api/timers/: таблица
+    // видит платежи, принятые после загрузки страницы
+    let timers = {credits: {}, credit_overdue_seconds: 600};
+
+    // Обновление таймеров
+    function updateTimers() {
+        const now = Math.floor(Nepit.serverNow());
+        const paymentTimes = document.querySelectorAll('.last-payment-time');
+
+        paymentTimes.forEach(el => {
+            const credit = timers.credits[el.closest('tr').dataset.creditId];
+            const timestamp = credit ? credit.last_payment_at : parseInt(el.dataset.timestamp);
+            const diff = now - timestamp;
+
+            if (diff > timers.credit_overdue_seconds) {
+                el.closest('tr').classList.add('overdue-row');
+                const minutes = Math.floor(diff / 60);
+                el.innerHTML = el.innerHTML.split('<')[0] + ` <span class="timer-danger">(${minutes} мин просрочки)</span>`;
+            }
+        });
+    }
+
+    // Фильтрация
+    document.getElementById('searchInput').addEventListener('keyup', filterTable);
+    document.getElementById('statusFilter').addEventListener('change', filterTable);
+
+    function filterTable() {
+        const searchTerm = document.getElementById('searchInput').value.toLowerCase();
+        const statusFilter = document.getElementById('statusFilter').value;
+
+        const rows = document.querySelectorAll('#creditsTable tbody tr');
+
+        rows.forEach(row => {
+            const player = row.dataset.player.toLowerCase();
+            const status = row.dataset.status;
+
+            let show = true;
+
+            if (searchTerm && !player.includes(searchTerm)) {
+                show = false;
+            }
+
+            if (statusFilter === 'overdue' && status !== 'overdue') {
+                show = false;
+            } else if (statusFilter === 'normal' && status !== 'normal') {
+                show = false;
+            }
+
+            row.style.display = show ? '' : 'none';
+        });
+    }
+
+    // Вызываются из onclick в разметке
+    window.resetFilters = function() {
+        document.getElementById('searchInput').value = '';
+        document.getElementById('statusFilter').value = '';
+        filterTable();
+    };
+
+    window.showCreditDetails = function(creditId) {
+        document.getElementById('creditDetails').innerHTML = 'Загрузка...';
+        $('#creditModal').modal('show');
+
+        // Здесь должен быть AJAX запрос
+        setTimeout(() => {
+            document.getElementById('creditDetails').innerHTML = `
+                <div class="list-group">
+                    <div class="list-group-item">
+                        <strong>График платежей:</strong>
+                    </div>
+                    <div class="list-group-item">
+                        <div class="d-flex justify-content-between">
+                            <span>Платеж #1</span>
+                            <span class="text-success">Оплачен</span>
+                        </div>
+                    </div>
+                    <div class="list-group-item">
+                        <div class="d-flex justify-content-between">
+                            <span>Платеж #2</span>
+                            <span class="text-warning">Ожидается</span>
+                        </div>
+                    </div>
+                </div>
+            `;
+        }, 500);
+    };
+
+    // Обновление каждые 10 секунд
+    setInterval(updateTimers, 10000);
+    updateTimers();
+    Nepit.timers(data.timersUrl, function (payload) {
+        timers = payload;
+        updateTimers();
+    });
+});
+
+// britain/dashboard.html
+Nepit.page('britain-dashboard', function (data) {
+    const canvas = document.getElementById('priceHistoryChart');
+    if (!canvas || !window.Chart) {
+        return;
+    }
+    const width = canvas.parentElement.clientWidth || 600;
+    // Точек на товар не больше, чем пикселей по ширине: больше на графике не различить
+    fetch(data.priceHistoryUrl + '?points=' + Math.min(1000, Math.max(50, Math.round(width / 2))))
+        .then(response => response.json())
+        .then(payload => {
+            if (!payload.success) {
+                return;
+            }
+            // Цена держится до следующего изменения - ступенчатая линия
+            const datasets = Object.keys(payload.series).map(good => ({
+                label: good,
+                data: payload.series[good].map(point => ({x: point[0] * 1000, y: point[1]})),
+                stepped: true,
+                pointRadius: 0,
+                borderWidth: 1.5,
+            }));
+            new Chart(canvas, {
+                type: 'line',
+                data: {datasets: datasets},
+                options: {
+                    animation: false,
+                    parsing: false,
+                    scales: {
+                        x: {
+                            type: 'linear',
+                            ticks: {callback: value => new Date(value).toLocaleTimeString('ru-RU', {hour: '2-digit', minute: '2-digit'})},
+                        },
+                        y: {beginAtZero: true},
+                    },
+                },
+            });
+        });
+});
+
+// britain/factory_work.html
+Nepit.page('britain-factory-work', function (data) {
+    // Элементы формы
+    const quantityInput = document.getElementById('id_quantity');
+    const moneyInput = document.getElementById('id_money_input');
+    const submitBtn = document.getElementById('submitBtn');
+    const totalPriceSpan = document.getElementById('totalPrice');
+    const urgentCheck = document.getElementById('urgentOrder');
+    const qualityCheck = document.getElementById('qualityControl');
+    const efficiencyBar = document.getElementById('efficiencyBar');
+
+    // Быстрый выбор количества
+    const quickSelect = document.getElementById('quickQuantity');
+    if (quickSelect) {
+        quickSelect.addEventListener('change', function() {
+            if (this.value) {
+                quantityInput.value = this.value;
+                updateTotal();
+            }
+        });
+    }
+
+    // Цена за шестерню (data-price-per-gear страницы)
+    const PRICE_PER_GEAR = parseFloat(data.pricePerGear) || 2;
+
+    // Функция расчета итоговой суммы
+    function calculateTotal() {
+        const quantity = parseInt(quantityInput.value) || 0;
+        let price = PRICE_PER_GEAR;
+
+        // Применяем наценки
+        if (urgentCheck.checked) {
+            price *= 1.5; // +50%
+        }
+        if (qualityCheck.checked) {
+            price *= 1.25; // +25%
+        }
+
+        // Оптовая скидка
+        if (quantity >= 100) {
+            price *= 0.9; // -10%
+        }
+
+        return quantity * price;
+    }
+
+    // Функция обновления производительности
+    function updateEfficiency() {
+        const quantity = parseInt(quantityInput.value) || 0;
+        let efficiency = 100;
+
+        if (quantity >= 100) {
+            efficiency = 110; // Оптовая надбавка к производительности
+        }
+        if (urgentCheck.checked) {
+            efficiency *= 1.2; // Срочность ускоряет производство
+        }
+        if (qualityCheck.checked) {
+            efficiency *= 0.9; // Контроль качества замедляет
+        }
+
+        efficiencyBar.style.width = Math.min(efficiency, 150) + '%';
+    }
+
+    // Обновление итоговой суммы
+    function updateTotal() {
+        const quantity = parseInt(quantityInput.value) || 0;
+
+        if (quantity > 0) {
+            const total = calculateTotal();
+            totalPriceSpan.textContent = total.toFixed(2);
+            updateEfficiency();
+
+            // Проверка достаточности средств
+            const money = parseFloat(moneyInput.value) || 0;
+
+            Nepit.showChange(money, total);
+        } else {
+            totalPriceSpan.textContent = '0';
+            Nepit.hideChange();
+        }
+    }
+
+    // События
+    quantityInput.addEventListener('input', updateTotal);
+    moneyInput.addEventListener('input', updateTotal);
+    urgentCheck.addEventListener('change', updateTotal);
+    qualityCheck.addEventListener('change', updateTotal);
+
+    // Анимация производственной линии
+    let progress = 75;
+    setInterval(() => {
+        progress = (progress + 1) % 100;
+        document.getElementById('productionProgress').style.width = progress + '%';
+
+        // Обновляем счетчик произведенных шестерен (рандомно для демонстрации)
+        const totalGears = parseInt(document.getElementById('totalGears').textContent) || 0;
+        if (Math.random() > 0.7) {
+            document.getElementById('totalGears').textContent = totalGears + 1;
+        }
+    }, 500);
+
+    // Инициализация
+    updateTotal();
+
+    // Подсказки для быстрого ввода
+    const playerInput = document.getElementById('id_player_id');
+    const recentPlayers = ['1001', '1234', '5678', '9012']; // Пример недавних игроков
+
+    playerInput.addEventListener('focus', function() {
+        if (!this.value) {
+            // Показываем подсказку с недавними игроками
+            console.log('Недавние игроки:', recentPlayers.join(', '));
+        }
+    });
+});
+
+// britain/privateers.html
+Nepit.page('britain-privateers', function (data) {
+    // Фильтрация таблицы
+    document.getElementById('searchInput').addEventListener('keyup', filterTable);
+    document.getElementById('shipFilter').addEventListener('change', filterTable);
+    document.getElementById('statusFilter').addEventListener('change', filterTable);
+
+    function filterTable() {
+        const searchTerm = document.getElementById('searchInput').value.toLowerCase();
+        const shipFilter = document.getElementById('shipFilter').value;
+        const statusFilter = document.getElementById('statusFilter').value;
+
+        const rows = document.querySelectorAll('#privateersTable tbody tr');
+
+        rows.forEach(row => {
+            const player = row.dataset.player.toLowerCase();
+            const ship = row.dataset.ship;
+            const status = row.dataset.status;
+            const complaints = parseInt(row.dataset.complaints);
+
+            let show = true;
+
+            if (searchTerm && !player.includes(searchTerm)) {
+                show = false;
+            }
+
+            if (shipFilter && ship !== shipFilter) {
+                show = false;
+            }
+
+            if (statusFilter === 'active' && status !== 'active') {
+                show = false;
+            } else if (statusFilter === 'inactive' && status !== 'inactive') {
+                show = false;
+            } else if (statusFilter === 'complaints' && complaints === 0) {
+                show = false;
+            }
+
+            row.style.display = show ? '' : 'none';
+        });
+    }
+
+    // Вызываются из onclick в разметке
+    window.resetFilters = function() {
+        document.getElementById('searchInput').value = '';
+        document.getElementById('shipFilter').value = '';
+        document.getElementById('statusFilter').value = '';
+        filterTable();
+    };
+
+    window.showComplaintHistory = function(privateerId) {
+        document.getElementById('complaintHistory').innerHTML = 'Загрузка...';
+        $('#complaintModal').modal('show');
+
+        // Здесь должен быть AJAX запрос
+        setTimeout(() => {
+            document.getElementById('complaintHistory').innerHTML = `
+                <div class="list-group">
+                    <div class="list-group-item">
+                        <div class="d-flex justify-content-between">
+                            <span>Жалоба #1</span>
+                            <small class="text-muted">10.03.2024</small>
+                        </div>
+                        <p class="mb-0">Нарушение торговых правил</p>
+                    </div>
+                    <div class="list-group-item">
+                        <div class="d-flex justify-content-between">
+                            <span>Жалоба #2</span>
+                            <small class="text-muted">05.03.2024</small>
+                        </div>
+                        <p class="mb-0">Агрессивное поведение</p>
+                    </div>
+                </div>
+            `;
+        }, 500);
+    };
+
+    // Выслуга (время с последнего платежа) и просрочка тикают по /api/timers/
+    let privateers = {};
+    let dueSeconds = 600;
+
+    function updateTenure() {
+        const now = Nepit.serverNow();
+        document.querySelectorAll('.privateer-tenure').forEach(el => {
+            const row = el.closest('tr');
+            const privateer = privateers[row.dataset.privateerId];
+            if (privateer) {
+                const since = now - privateer.last_payment_at;
+                const hours = Math.floor(since / 3600);
+                el.textContent = `${Math.floor(hours / 24)}д ${hours % 24}ч`;
+                row.classList.toggle('overdue-privateer', since >= dueSeconds);
+                row.querySelector('.privateer-due').classList.toggle('d-none', since < dueSeconds);
+            }
+        });
+    }
+
+    Nepit.timers(data.timersUrl, function (payload) {
+        privateers = payload.privateers;
+        dueSeconds = payload.privateer_due_seconds;
+        updateTenure();
+    });
+    setInterval(updateTenure, 60000);
+});
+
+// britain/quest.html
+Nepit.page('britain-quest', function (data) {
+    // Рекомендуемые суммы
+    const rewardInput = document.getElementById('id_reward');
+    const suggestionBtns = document.querySelectorAll('.suggestion-btn');
+
+    suggestionBtns.forEach(btn => {
+        btn.addEventListener('click', function() {
+            rewardInput.value = this.dataset.amount;
+        });
+    });
+});
+
+// britain/sale.html
+Nepit.page('britain-sale', function (data) {
+    console.log('Страница загружена');
+
+    // Элементы формы
+    const goodSelect = document.getElementById('id_good');
+    const quantityInput = document.getElementById('id_quantity');
+    const moneyInput = document.getElementById('id_money_input');
+    const submitBtn = document.getElementById('submitBtn');
+    const currentPriceSpan = document.getElementById('currentPrice');
+    const totalPriceSpan = document.getElementById('totalPrice');
+
+    // Проверяем, есть ли элементы
+    console.log('Select элемент:', goodSelect);
+    if (goodSelect) {
+        console.log('Количество опций:', goodSelect.options.length);
+        for (let i = 0; i < goodSelect.options.length; i++) {
+            console.log(`Опция ${i}:`, goodSelect.options[i].text, goodSelect.options[i].value);
+        }
+    }
+
+    // Цены по умолчанию
+    const basePrices = {
+        'textile': 20,
+        'rum': 15,
+        'tools': 25,
+        'weapons': 30
+    };
+
+    let currentPrices = {...basePrices};
+
+    // Функция расчета цены с учетом количества
+    function calculatePrice(basePrice, quantity) {
+        // За каждые 5 единиц цена падает на 1
+        const priceDrop = Math.floor(quantity / 5);
+        return Math.max(basePrice - priceDrop, 1); // Минимум 1
+    }
+
+    // Обновление итоговой суммы
+    function updateTotal() {
+        const good = goodSelect.value;
+        const quantity = parseInt(quantityInput.value) || 0;
+
+        console.log('Выбран товар:', good, 'Количество:', quantity);
+
+        if (good && quantity > 0) {
+            const basePrice = currentPrices[good] || basePrices[good] || 0;
+            const finalPrice = calculatePrice(basePrice, quantity);
+            const total = finalPrice * quantity;
+
+            currentPriceSpan.textContent = finalPrice;
+            totalPriceSpan.textContent = total.toFixed(2);
+
+            // Проверка достаточности средств
+            const money = parseFloat(moneyInput.value) || 0;
+
+            Nepit.showChange(money, total);
+        } else {
+            currentPriceSpan.textContent = '0';
+            totalPriceSpan.textContent = '0';
+            Nepit.hideChange();
+            console.log('Не выбраны товар или количество');
+        }
+    }
+
+    // События
+    if (goodSelect) {
+        goodSelect.addEventListener('change', function() {
+            console.log('Изменился выбор товара:', this.value);
+            updateTotal();
+        });
+    }
+
+    if (quantityInput) {
+        quantityInput.addEventListener('input', function() {
+            console.log('Изменилось количество:', this.value);
+            updateTotal();
+        });
+    }
+
+    if (moneyInput) {
+        moneyInput.addEventListener('input', function() {
+            console.log('Изменилась сумма:', this.value);
+            updateTotal();
+        });
+    }
+
+    // Инициализация
+    updateTotal();
+});
+
+// britain/ship_deal.html
+Nepit.page('britain-ship-deal', function (data) {
+    // Элементы формы
+    const shipInput = document.getElementById('id_ship');
+    const dealTypeRadios = document.querySelectorAll('input[name="deal_type"]');
+    const moneyInput = document.getElementById('id_money_input');
+    const submitBtn = document.getElementById('submitBtn');
+    const shipPriceSpan = document.getElementById('shipPrice');
+    const totalPriceSpan = document.getElementById('totalPrice');
+    const changeBlock = document.getElementById('changeBlock');
+    const errorBlock = document.getElementById('errorBlock');
+    const moneyInputBlock = document.getElementById('moneyInputBlock');
+    const sellInfo = document.getElementById('sellInfo');
+
+    // Цены кораблей
+    const shipPrices = {
+        'schooner': 500,
+        'brig': 1000,
+        'frigate': 2000,
+        'battleship': 5000,
+        'steam_frigate': 8000
+    };
+
+    // Выбор корабля
+    window.selectShip = function(ship) {
+        // Убираем выделение со всех карточек
+        document.querySelectorAll('.ship-card').forEach(card => {
+            card.classList.remove('selected');
+        });
+
+        // Выделяем выбранную карточку
+        document.querySelector(`[data-ship="${ship}"]`).classList.add('selected');
+
+        // Устанавливаем значение в скрытое поле
+        shipInput.value = ship;
+
+        // Обновляем цену
+        updatePrice();
+    };
+
+    // Выбор типа сделки
+    window.selectDealType = function(type) {
+        // Находим соответствующий радио-элемент и отмечаем его
+        const radio = document.querySelector(`input[name="deal_type"][value="${type}"]`);
+        if (radio) {
+            radio.checked = true;
+        }
+
+        // Обновляем внешний вид кнопок
+        document.querySelectorAll('.deal-type-btn').forEach((btn, index) => {
+            if ((type === 'buy' && index === 0) || (type === 'sell' && index === 1)) {
+                btn.classList.add('active');
+            } else {
+                btn.classList.remove('active');
+            }
+        });
+
+        // Обновляем интерфейс в зависимости от типа сделки
+        updateDealTypeUI();
+        updatePrice();
+    };
+
+    // Обновление интерфейса в зависимости от типа сделки
+    function updateDealTypeUI() {
+        const isBuy = document.querySelector('input[name="deal_type"]:checked')?.value === 'buy';
+
+        if (isBuy) {
+            moneyInputBlock.style.display = 'block';
+            moneyInput.required = true;
+            sellInfo.style.display = 'none';
+            checkFunds();
+        } else {
+            moneyInputBlock.style.display = 'none';
+            moneyInput.required = false;
+            sellInfo.style.display = 'block';
+            changeBlock.style.display = 'none';
+            errorBlock.style.display = 'none';
+            submitBtn.disabled = false;
+        }
+    }
+
+    // Обновление цены
+    function updatePrice() {
+        const ship = shipInput.value;
+        const isBuy = document.querySelector('input[name="deal_type"]:checked')?.value === 'buy';
+
+        if (ship && shipPrices[ship]) {
+            const basePrice = shipPrices[ship];
+            const finalPrice = isBuy ? basePrice : basePrice * 0.5;
+
+            shipPriceSpan.textContent = basePrice;
+            totalPriceSpan.textContent = finalPrice.toFixed(2);
+
+            if (!isBuy) {
+                // Для продажи сразу активируем кнопку
+                submitBtn.disabled = false;
+            }
+        } else {
+            shipPriceSpan.textContent = '0';
+            totalPriceSpan.textContent = '0';
+        }
+    }
+
+    // Проверка достаточности средств (для покупки)
+    function checkFunds() {
+        const ship = shipInput.value;
+        const money = parseFloat(moneyInput.value) || 0;
+
+        if (ship && shipPrices[ship]) {
+            const total = shipPrices[ship];
+
+            Nepit.showChange(money, total);
+        }
+    }
+
+    // События
+    if (moneyInput) {
+        moneyInput.addEventListener('input', function() {
+            if (document.querySelector('input[name="deal_type"]:checked')?.value === 'buy') {
+                checkFunds();
+            }
+        });
+    }
+
+    // Инициализация
+    if (shipInput.value) {
+        selectShip(shipInput.value);
+    }
+
+    // Проверяем выбран ли тип сделки
+    const selectedDealType = document.querySelector('input[name="deal_type"]:checked');
+    if (selectedDealType) {
+        selectDealType(selectedDealType.value);
+    } else {
+        // По умолчанию выбираем покупку
+        selectDealType('buy');
+    }
+});
+
+// login.html
+Nepit.page('login', function (data) {
+    const form = document.getElementById('loginForm');
+    const usernameInput = document.getElementById('id_username');
+    const radioButtons = document.querySelectorAll('input[name="table"]');
+    const submitBtn = document.getElementById('submitBtn');
+
+    // Функция проверки валидности формы
+    function checkFormValidity() {
+        const usernameValid = usernameInput.value.trim() !== '';
+        const tableSelected = Array.from(radioButtons).some(radio => radio.checked);
+
+        submitBtn.disabled = !(usernameValid && tableSelected);
+    }
+
+    // Добавляем обработчики событий
+    usernameInput.addEventListener('input', checkFormValidity);
+
+    radioButtons.forEach(radio => {
+        radio.addEventListener('change', checkFormValidity);
+    });
+
+    // Первоначальная проверка
+    checkFormValidity();
+
+    // Для отладки - выводим в консоль
+    console.log('Страница загружена');
+    console.log('Радиокнопки:', radioButtons.length);
+});
+
+// munepit/report_jobs.html
+Nepit.page('report-jobs', function (data) {
+    // Незавершенные отчеты опрашиваются, пока обработчик их не достроит
+    function poll() {
+        const rows = document.querySelectorAll('tr[data-status="queued"], tr[data-status="running"]');
+        rows.forEach(row => {
+            fetch(row.dataset.jobUrl)
+                .then(response => response.json())
+                .then(job => {
+                    if (!job.success) {
+                        return;
+                    }
+                    row.dataset.status = job.status;
+                    const bar = row.querySelector('.progress-bar');
+                    bar.style.width = job.progress + '%';
+                    bar.textContent = job.progress + '%';
+                    bar.classList.toggle('bg-success', job.status === 'done');
+                    bar.classList.toggle('bg-danger', job.status === 'failed');
+                    const detail = job.error || job.message;
+                    row.querySelector('.job-status').textContent = job.status_display + (detail ? ': ' + detail : '');
+                    if (job.download_url) {
+                        row.querySelector('.job-download').innerHTML =
+                            `<a href="${job.download_url}" class="btn btn-sm btn-outline-success"><i class="bi bi-download"></i> CSV</a>`;
+                    }
+                });
+        });
+        if (rows.length) {
+            setTimeout(poll, 2000);
+        }
+    }
+    poll();
+});
+
+// munepit/statistics.html
+Nepit.page('statistics', function (data) {
+    if (!window.Chart) {
+        return;
+    }
+    const canvas = document.getElementById('countsChart');
+    // Корзин не больше, чем по столбцу на 4 пикселя ширины графика
+    const points = Math.min(1000, Math.max(20, Math.round((canvas.parentElement.clientWidth || 600) / 4)));
+    fetch(data.seriesUrl + '&points=' + points)
+        .then(response => response.json())
+        .then(payload => {
+            if (!payload.success) {
+                return;
+            }
+            // Подпись корзины: время для минут и часов, дата для дней
+            const format = payload.unit === 'day'
+                ? {day: '2-digit', month: '2-digit'}
+                : {day: '2-digit', month: '2-digit', hour: '2-digit', minute: '2-digit'};
+            const label = value => new Date(value).toLocaleString('ru-RU', format);
+            const toPoints = series => series.map(point => ({x: point[0] * 1000, y: point[1]}));
+            const options = {
+                animation: false,
+                parsing: false,
+                scales: {x: {type: 'linear', ticks: {callback: label}}, y: {beginAtZero: true}},
+                plugins: {tooltip: {callbacks: {title: items => label(items[0].parsed.x)}}},
+            };
+            new Chart(canvas, {
+                type: 'bar',
+                data: {datasets: [{label: 'Операций', data: toPoints(payload.counts)}]},
+                options: options,
+            });
+            new Chart(document.getElementById('sumsChart'), {
+                type: 'line',
+                data: {datasets: [{label: 'Сумма, ₽', data: toPoints(payload.sums)}]},
+                options: options,
+            });
+        });
+});
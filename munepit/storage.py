@@ -0,0 +1,22 @@
+# munepit/storage.py
+"""
+Хранилище статики с хешем содержимого в именах файлов.
+
+build_static (collectstatic + сжатие) записывает в STATIC_ROOT копии
+с хешем в имени и манифест staticfiles.json. Имя меняется вместе с
+содержимым, поэтому планшеты столов кэшируют стили и сценарии навсегда
+и скачивают их заново только после обновления.
+"""
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class FingerprintedStaticStorage(ManifestStaticFilesStorage):
+    """
+    Пока build_static не запускался (разработка, тесты), манифеста нет:
+    {% static %} отдает исходные имена вместо ошибки ValueError.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -1,3 +1,1632 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from contextlib import ExitStack
+import sqlite3
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.sessions.models import Session
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, router
+from django.templatetags.static import static
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    LogEntry, PriceList, Convict, ConstructedBuilding,
+    Credit, Privateer, Game, UserSession, LedgerAccount, LedgerEntry, StateCheckpoint,
+    DynamicPrice, PriceHistory, ReportJob,
+)
+from . import downsample, jobs, lanes, ledger, replay, simulator, snapshots
+from .checks import check_log_split
+from .management.commands.generate_game_data import DEFAULT_START
+from .fragments import bump
+from .query_plans import analyze, capture
+from .routers import LOG_DATABASE, atomic_game_and_log, log_database_enabled, log_models, reporting
+from .search import search_log
+from .views import _details_match
+
+
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def seed_game(players=200, events=3000, seed=1):
+    """Наполняет базу правдоподобной игрой поверх каталога init_prices."""
+    call_command('init_prices', stdout=io.StringIO())
+    call_command(
+        'generate_game_data', players=players, events=events, seed=seed, stdout=io.StringIO()
+    )
+    return [str(1000 + i) for i in range(players)]
+
+
+# Бюджеты - для сессий в подписанной cookie: движок из NEPIT_SESSION_BACKEND
+# добавил бы свои запросы к django_session
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class QueryBudgetTestCase(TestCase):
+    """
+    Верхние границы числа SQL-запросов на каждый URL из nepit/urls.py.
+
+    База наполнена тысячами записей лога и сотнями зданий/кредитов/каперов,
+    поэтому любой запрос "на строку" (N+1) сразу выходит за бюджет.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        # id текущей игры в кэше мог остаться от отката предыдущего класса
+        Game.forget_current()
+        cls.player_ids = seed_game()
+        cls.player_id = cls.player_ids[0]
+        # Игра сгенерирована в прошлом (DEFAULT_START): давно не менявшиеся цены
+        # восстанавливались бы на первом запросе - запись вне бюджета страницы
+        DynamicPrice.objects.update(last_update=timezone.now())
+        cls.business = ConstructedBuilding.objects.filter(building_type='business').first()
+        cls.factory = ConstructedBuilding.objects.filter(building_type='factory').first()
+        cls.credit = Credit.objects.first()
+        cls.privateer = Privateer.objects.first()
+        cls.convict = Convict.objects.first()
+        cls.log_entry = LogEntry.objects.first()
+        cls.building_price = PriceList.objects.filter(category='building').first()
+
+    def login(self, table):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': table})
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        """Как assertNumQueries, но проверяет верхнюю границу (по всем базам)."""
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+            ]
+            response = func(*args, **kwargs)
+        # Атомарные блоки внутри TestCase становятся точками сохранения - их не считаем
+        queries = [
+            q['sql'] for ctx in contexts for q in ctx.captured_queries
+            if not q['sql'].startswith(TRANSACTION_CONTROL)
+        ]
+        self.assertLessEqual(
+            len(queries), budget,
+            '%d queries executed, budget %d:\n%s' % (
+                len(queries), budget,
+                '\n'.join('%d. %s' % (i, sql) for i, sql in enumerate(queries, 1)),
+            ),
+        )
+        return response
+
+    def assertGetBudget(self, budget, name, kwargs=None, params=None, status=200):
+        response = self.assertQueryBudget(
+            budget, self.client.get, reverse(name, kwargs=kwargs), params or {}
+        )
+        self.assertEqual(response.status_code, status, name)
+        return response
+
+    def assertPostBudget(self, budget, name, data, status=302):
+        response = self.assertQueryBudget(budget, self.client.post, reverse(name), data)
+        self.assertEqual(response.status_code, status, name)
+        return response
+
+
+class ReportQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.login('island')
+
+    def test_login_page(self):
+        self.client.logout()
+        self.assertGetBudget(0, 'login')
+
+    def test_logout(self):
+        self.assertGetBudget(1, 'logout', status=302)
+
+    def test_transaction_list(self):
+        # +1 запрос - список игр для выбора
+        self.assertGetBudget(3, 'transaction_list')
+        self.assertGetBudget(3, 'transaction_list', params={
+            'table': 'island', 'action_type': 'purchase', 'player_id': self.player_id, 'page': 2,
+        })
+
+    def test_transaction_detail(self):
+        self.assertGetBudget(1, 'transaction_detail', kwargs={'pk': self.log_entry.pk})
+
+    def test_statistics(self):
+        # +1 запрос - самые богатые игроки по счетам проводок;
+        # ряды графиков страница берет с api_statistics_series
+        self.assertGetBudget(9, 'statistics')
+        self.assertGetBudget(9, 'statistics_table', kwargs={'table': 'britain'}, params={'days': 7})
+
+    def test_statistics_series(self):
+        # Сессия и один GROUP BY по корзинам
+        response = self.assertGetBudget(2, 'api_statistics_series', params={'days': 365, 'points': 50})
+        self.assertLessEqual(len(response.json()['counts']), 50)
+        self.assertGetBudget(2, 'api_statistics_series', params={'table': 'britain', 'days': 1})
+
+    def test_report_jobs(self):
+        # Сессия и последние задачи; опрос хода - сессия и задача
+        self.assertGetBudget(2, 'report_jobs', params={'kind': 'player_export', 'player_id': self.player_id})
+        job, _ = jobs.submit('game_summary', {'game': Game.current_id()})
+        self.assertGetBudget(2, 'api_report_job', kwargs={'pk': job.pk})
+
+    def test_player_search(self):
+        self.assertGetBudget(0, 'player_search')
+        self.assertGetBudget(7, 'player_search', params={'q': self.player_id})
+
+    def test_player_detail(self):
+        # +1 запрос - счет игрока
+        self.assertGetBudget(9, 'player_detail', kwargs={'player_id': self.player_id})
+
+    def test_game_state(self):
+        self.assertGetBudget(0, 'game_state', params={'player_id': self.player_id})
+        # Контрольная точка и журнал после нее; новые точки не пишутся
+        at = timezone.localtime().strftime('%Y-%m-%dT%H:%M:%S')
+        self.assertGetBudget(2, 'game_state', params={'at': at})
+        response = self.assertGetBudget(2, 'game_state', params={'at': at, 'player_id': self.player_id})
+        self.assertEqual(response.context['players'][0]['id'], self.player_id)
+
+
+class IslandQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.login('island')
+
+    def test_dashboard(self):
+        self.assertGetBudget(3, 'island_dashboard')
+
+    def test_deal(self):
+        self.assertGetBudget(1, 'island_deal')
+        self.assertPostBudget(2, 'island_deal', {
+            'player_a': '1', 'player_b': '2', 'description': 'Обмен',
+        })
+        self.assertGetBudget(1, 'island_deal_confirm')
+        self.assertPostBudget(1, 'island_deal_confirm', {})
+
+    def test_court(self):
+        # Запись с деньгами: +2 запроса - upsert счетов и вставка проводок
+        self.assertGetBudget(1, 'island_court')
+        self.assertPostBudget(6, 'island_court', {
+            'player_id': 'new-convict', 'crime_description': 'Кража',
+            'fine_amount': '10.00', 'sentence_years': 2,
+        })
+        self.assertGetBudget(1, 'island_court_confirm')
+        self.assertPostBudget(1, 'island_court_confirm', {})
+
+    def test_release(self):
+        # +1 запрос - очередь на выход (срок вышел)
+        self.assertGetBudget(3, 'island_release')
+        self.assertGetBudget(4, 'island_release', params={'player': self.convict.pk})
+        self.assertPostBudget(5, 'island_release', {
+            'player': self.convict.pk, 'early_release': 'False',
+        })
+
+    def test_purchase(self):
+        LogEntry.objects.create(
+            author='seed', table='island', action_type='purchase', player_id='buyer',
+            details={'resource_key': 'coffee', 'quantity': 5, 'stock_delta': 5},
+        )
+        self.assertGetBudget(5, 'island_purchase_resource')
+        self.assertPostBudget(6, 'island_purchase_resource', {
+            'resource': 'coffee', 'player_id': 'buyer', 'quantity': 2,
+        })
+        self.assertGetBudget(1, 'island_purchase_confirm')
+        self.assertPostBudget(5, 'island_purchase_confirm', {'money_input': '100'})
+
+    def test_build(self):
+        self.assertGetBudget(3, 'island_build')
+        self.assertPostBudget(6, 'island_build', {
+            'building': self.building_price.pk, 'player_id': self.player_id,
+        })
+        self.assertGetBudget(1, 'island_build_confirm')
+        self.assertPostBudget(1, 'island_build_confirm', {})
+
+    def test_process(self):
+        self.assertGetBudget(3, 'island_process_resource')
+        self.assertPostBudget(4, 'island_process_resource', {
+            'factory': self.factory.pk, 'quantity': 3,
+        })
+        self.assertGetBudget(1, 'island_process_confirm')
+        self.assertPostBudget(4, 'island_process_confirm', {'money_input': '100'})
+
+    def test_profit(self):
+        self.assertGetBudget(5, 'island_profit')
+        self.assertPostBudget(10, 'island_profit', {'business': self.business.pk})
+
+    def test_demolish(self):
+        self.assertGetBudget(6, 'island_demolish')
+        self.assertPostBudget(6, 'island_demolish', {
+            'building': self.business.pk, 'demolisher_id': self.player_id,
+        })
+        self.assertGetBudget(1, 'island_demolish_confirm')
+        self.assertPostBudget(1, 'island_demolish_confirm', {})
+
+    def test_api(self):
+        self.assertGetBudget(2, 'api_building_profit', params={'building_id': self.business.pk})
+        self.assertGetBudget(2, 'api_convict_time', params={'convict_id': self.convict.pk})
+        self.assertGetBudget(2, 'api_convict_times')
+        # Все таймеры стола одним ответом: каторжники и прибыль бизнесов
+        timers = self.assertGetBudget(3, 'api_timers', params={'table': 'island'}).json()
+        self.assertEqual(len(timers['convicts']['rows']), Convict.objects.current().count())
+        business = dict(zip(timers['buildings']['fields'], timers['buildings']['rows'][0]))
+        self.assertEqual(business['last_profit_collected'], int(
+            ConstructedBuilding.objects.get(pk=business['id']).last_profit_collected.timestamp()
+        ))
+
+
+class BritainQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.login('britain')
+
+    def test_dashboard(self):
+        self.assertGetBudget(4, 'britain_dashboard')
+
+    def test_sale(self):
+        # Запись с деньгами: +2 запроса - upsert счетов и вставка проводок
+        self.assertGetBudget(1, 'britain_sale')
+        self.assertPostBudget(6, 'britain_sale', {
+            'good': 'rum', 'player_id': self.player_id, 'quantity': 1, 'money_input': '500',
+        })
+
+    def test_ship_deal(self):
+        self.assertGetBudget(1, 'britain_ship_deal')
+        self.assertPostBudget(5, 'britain_ship_deal', {
+            'ship': 'brig', 'deal_type': 'buy', 'player_id': self.player_id, 'money_input': '5000',
+        })
+
+    def test_factory_work(self):
+        self.assertGetBudget(1, 'britain_factory_work')
+        self.assertPostBudget(5, 'britain_factory_work', {
+            'player_id': self.player_id, 'quantity': 2, 'money_input': '10',
+        })
+
+    def test_credits(self):
+        self.assertGetBudget(2, 'britain_credits')
+        self.assertGetBudget(1, 'britain_credit_issue')
+        self.assertPostBudget(5, 'britain_credit_issue', {
+            'player_id': 'new-debtor', 'credit_amount': '300', 'term': 3,
+        })
+        self.assertGetBudget(1, 'britain_credit_confirm')
+        self.assertPostBudget(1, 'britain_credit_confirm', {})
+
+    def test_credit_payment(self):
+        self.assertGetBudget(2, 'britain_credit_payment')
+        self.assertPostBudget(6, 'britain_credit_payment', {
+            'debtor': self.credit.pk, 'payment_amount': '150',
+        })
+
+    def test_coal(self):
+        self.assertGetBudget(1, 'britain_coal')
+        self.assertPostBudget(4, 'britain_coal', {
+            'player_id': self.player_id, 'amount': '20', 'money_input': '20',
+        })
+
+    def test_privateers(self):
+        # Сессия, карточки одним агрегатом, рейтинг одним запросом
+        self.assertGetBudget(3, 'britain_privateers')
+        self.assertGetBudget(1, 'britain_privateer_license')
+        self.assertPostBudget(6, 'britain_privateer_license', {
+            'action': 'issue', 'player_id': 'new-privateer', 'ship_type': 'frigate',
+        })
+        self.assertGetBudget(2, 'britain_privateer_change_ship')
+        self.assertPostBudget(4, 'britain_privateer_change_ship', {
+            'privateer': self.privateer.pk, 'new_ship': 'battleship',
+        })
+        self.assertGetBudget(2, 'britain_privateer_complaint')
+        self.assertPostBudget(5, 'britain_privateer_complaint', {
+            'privateer': self.privateer.pk, 'complaint_value': 1,
+        })
+        # Пачка поправок: UPDATE на капера, одно чтение итогов и одна вставка журнала
+        other = Privateer.objects.current().filter(is_active=True).exclude(pk=self.privateer.pk).first()
+        response = self.assertQueryBudget(
+            6, self.client.post, reverse('api_privateer_complaints'),
+            json.dumps({'adjustments': [
+                {'privateer_id': self.privateer.pk, 'value': 2},
+                {'privateer_id': other.pk, 'value': -1},
+                {'privateer_id': self.privateer.pk, 'value': 3},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['complaints'][str(self.privateer.pk)], self.privateer.complaints + 6)
+        self.assertGetBudget(2, 'britain_privateer_payment')
+        self.assertPostBudget(7, 'britain_privateer_payment', {'privateer': self.privateer.pk})
+
+    def test_quest(self):
+        self.assertGetBudget(2, 'britain_quest')
+        self.assertPostBudget(5, 'britain_quest', {
+            'privateer': self.privateer.pk, 'reward': '200', 'description': 'Конвой',
+        })
+
+    def test_api(self):
+        self.assertGetBudget(2, 'api_dynamic_price', params={'good': 'rum'})
+        # Сессия, версия стола и один запрос истории на все товары
+        history = self.assertGetBudget(3, 'api_price_history', params={'points': 20}).json()
+        self.assertTrue(history['series'])
+        self.assertTrue(all(len(points) <= 20 for points in history['series'].values()))
+        self.assertGetBudget(1, 'api_price_history', params={'points': 'many'}, status=400)
+        # Стол по умолчанию - стол сессии
+        timers = self.assertGetBudget(3, 'api_timers').json()
+        self.assertEqual(timers['table'], 'britain')
+        self.assertEqual(len(timers['credits']['rows']), Credit.objects.current().count())
+        self.assertEqual(len(timers['privateers']['rows']), Privateer.objects.current().filter(is_active=True).count())
+        self.assertGetBudget(1, 'api_timers', params={'table': 'atlantis'}, status=400)
+        # Метрики полос - из памяти процесса, запрос только на сессию
+        self.assertGetBudget(1, 'api_lanes')
+
+
+class FragmentCacheTests(TestCase):
+    """Панели со списками рендерятся из кэша, пока в их таблицы никто не пишет."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        seed_game(players=20, events=300)
+        cls.building_price = PriceList.objects.filter(category='building').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def count_queries(self, name):
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+            ]
+            response = self.client.get(reverse(name))
+        return response, sum(len(ctx.captured_queries) for ctx in contexts)
+
+    def test_repeat_views_render_from_cache(self):
+        for name in ('island_build', 'island_demolish', 'island_purchase_resource'):
+            response, cold = self.count_queries(name)
+            self.assertEqual(response.status_code, 200)
+            response, warm = self.count_queries(name)
+            self.assertLess(warm, cold, name)
+
+    def test_write_invalidates_panel(self):
+        self.count_queries('island_build')
+        self.client.post(reverse('island_build'), {
+            'building': self.building_price.pk, 'player_id': 'new-owner',
+        })
+        response, _ = self.count_queries('island_build')
+        self.assertContains(response, 'Игрок #new-owner')
+
+
+class StaticBundleTests(TestCase):
+    """Стили и сценарии страниц - общие файлы с хешем в имени и долгим кэшем."""
+    databases = '__all__'
+
+    def test_pages_use_bundle_instead_of_inline_code(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'britain'})
+        response = self.client.get(reverse('britain_sale'))
+        self.assertContains(response, 'data-page="britain-sale"')
+        self.assertContains(response, static('munepit/js/nepit.js'))
+        self.assertNotContains(response, '<style>')
+        self.assertNotContains(response, '<script>')
+
+    def test_build_static_serves_precompressed_bundle(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command('build_static', stdout=io.StringIO())
+            url = static('munepit/js/nepit.js')
+            self.assertRegex(url, r'nepit\.[0-9a-f]{12}\.js$')
+
+            response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+            compressed = b''.join(response.streaming_content)
+
+            response = self.client.get(url)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(gzip.decompress(compressed), b''.join(response.streaming_content))
+
+
+class GameScopeTests(TestCase):
+    """Новая игра начинается с пустых таблиц, завершенная уходит в архив."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        seed_game(players=20, events=300)
+        cls.old_game = Game.current()
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+
+    def tearDown(self):
+        # Игры, созданные в тесте, исчезают при откате транзакции
+        Game.forget_current()
+
+    def new_game(self):
+        call_command('new_game', name='Следующая', stdout=io.StringIO())
+        return Game.current()
+
+    def test_views_scoped_to_current_game(self):
+        self.new_game()
+        response = self.client.get(reverse('transaction_list'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+        response = self.client.get(reverse('transaction_list'), {'game': self.old_game.pk})
+        self.assertEqual(response.context['page_obj'].paginator.count, 300)
+
+        # Номер игрока снова свободен для суда в новой игре
+        convict = Convict.objects.first()
+        self.client.post(reverse('island_court'), {
+            'player_id': convict.player_id, 'crime_description': 'Контрабанда',
+            'fine_amount': '10', 'sentence_years': 1,
+        })
+        self.assertEqual(Convict.objects.filter(player_id=convict.player_id).count(), 2)
+
+    def test_other_worker_switches_game(self):
+        first = Game.current_id()
+        # Другой воркер завершил игру и начал новую: его запись в базу
+        # этот процесс не видит, а кэш id у каждого процесса свой
+        Game.objects.filter(pk=first).update(ended_at=timezone.now())
+        Game.objects.bulk_create([Game(name='Следующая')])
+        self.assertEqual(Game.current_id(), first)
+        # post_save того воркера меняет метку версии Game в общем кэше
+        bump(Game)
+        self.assertNotEqual(Game.current_id(), first)
+        self.assertEqual(Game.current().name, 'Следующая')
+
+    def test_archive_requires_finished_game(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_game', self.old_game.pk, '--no-vacuum', stdout=io.StringIO())
+
+    def test_archive_jsonl(self):
+        self.new_game()
+        with tempfile.TemporaryDirectory() as output:
+            call_command(
+                'archive_game', self.old_game.pk, '--output', output, '--no-vacuum', stdout=io.StringIO()
+            )
+            with gzip.open(f'{output}/game-{self.old_game.pk}.jsonl.gz', 'rt', encoding='utf-8') as fh:
+                models = [json.loads(line)['model'] for line in fh]
+        self.assertEqual(models.count('munepit.logentry'), 300)
+        self.assertFalse(LogEntry.objects.for_game(self.old_game).exists())
+        self.assertFalse(ConstructedBuilding.objects.for_game(self.old_game).exists())
+        self.old_game.refresh_from_db()
+        self.assertIsNotNone(self.old_game.archived_at)
+
+    def test_archive_tables(self):
+        self.new_game()
+        call_command(
+            'archive_game', self.old_game.pk, '--format', 'tables', '--no-vacuum', stdout=io.StringIO()
+        )
+        with connections[router.db_for_write(LogEntry)].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM archive_munepit_logentry')
+            self.assertEqual(cursor.fetchone()[0], 300)
+        self.assertFalse(LogEntry.objects.for_game(self.old_game).exists())
+
+
+# "304 без запросов" - для сессий в подписанной cookie: у движка db своя
+# выборка из django_session на каждом запросе
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class StateConditionalGetTests(TestCase):
+    """Страницы и API столов отвечают 304, пока на стол никто не пишет."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        seed_game(players=20, events=300)
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'britain'})
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def revalidate(self, url, response, budget=0):
+        with CaptureQueriesContext(connections['default']) as queries:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertLessEqual(len(queries), budget)
+        return again
+
+    def test_not_modified_without_queries(self):
+        for name in ('britain_dashboard', 'britain_credits', 'britain_privateers'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertTrue(response.has_header('Last-Modified'))
+            self.assertEqual(self.revalidate(reverse(name), response).status_code, 304, name)
+
+    def test_write_changes_only_its_table(self):
+        url = reverse('britain_credits')
+        response = self.client.get(url)
+        island = self.client.get(reverse('island_dashboard'))
+
+        credit = Credit.objects.current().first()
+        credit.remaining_payments -= 1
+        credit.save()
+        self.assertEqual(self.revalidate(url, response, budget=10).status_code, 200)
+        self.assertEqual(self.revalidate(reverse('island_dashboard'), island).status_code, 304)
+
+        # Запись журнала меняет только стол, к которому относится
+        LogEntry.objects.create(author='moderator', table='island', action_type='court', details={})
+        self.assertEqual(self.revalidate(reverse('island_dashboard'), island, budget=10).status_code, 200)
+
+    def test_timers_api(self):
+        url = reverse('api_timers') + '?table=britain'
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        # Стол не указан - условного ответа нет
+        self.assertFalse(self.client.get(reverse('api_timers')).has_header('ETag'))
+
+    def test_messages_disable_not_modified(self):
+        url = reverse('britain_dashboard')
+        response = self.client.get(url)
+        with mock.patch('munepit.views.messages.get_messages', return_value=['Платеж принят']):
+            self.assertEqual(self.revalidate(url, response, budget=10).status_code, 200)
+
+    def test_state_cached(self):
+        url = reverse('island_purchase_resource')
+        self.client.get(url)
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries if 'munepit_pricelist' in q['sql']])
+
+        price = PriceList.objects.filter(category='resource').first()
+        price.base_price += 1
+        price.save()
+        response = self.client.get(url)
+        self.assertIn(price, response.context['resources'])
+        self.assertEqual(
+            next(r for r in response.context['resources'] if r.pk == price.pk).base_price, price.base_price
+        )
+
+
+class PrivateerStandingsTests(TestCase):
+    """Рейтинг каперов считается одним запросом с местом и просрочкой платежа."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        now = timezone.now()
+        self.now = now
+
+        def privateer(player_id, licensed_minutes, complaints, paid_minutes, is_active=True):
+            return Privateer.objects.create(
+                player_id=player_id, ship_type='frigate', licensed_by='moderator', complaints=complaints,
+                licensed_at=now - timedelta(minutes=licensed_minutes),
+                last_payment_at=now - timedelta(minutes=paid_minutes), is_active=is_active,
+            )
+
+        self.veteran = privateer('1001', 120, 3, 30)
+        self.clean = privateer('1002', 60, 0, 1)
+        self.rival = privateer('1003', 60, 0, 5)
+        self.noisy = privateer('1004', 60, 2, 1)
+        privateer('1005', 500, 0, 1, is_active=False)
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_ranking(self):
+        with self.assertNumQueries(1):
+            standings = list(Privateer.objects.current().standings(now=self.now))
+        self.assertEqual(
+            [(p.player_id, p.rank) for p in standings],
+            [('1001', 1), ('1002', 2), ('1003', 3), ('1004', 4)],
+        )
+        self.assertEqual([p.payment_due for p in standings], [True, False, False, False])
+        self.assertEqual(standings[0].since_payment, timedelta(minutes=30))
+        self.assertEqual(standings[0].tenure_display, '0д 0ч')
+
+    def test_summary(self):
+        summary = Privateer.objects.current().summary(now=self.now)
+        self.assertEqual(
+            {key: summary[key] for key in ('total', 'active', 'with_complaints', 'payment_due')},
+            {'total': 5, 'active': 4, 'with_complaints': 2, 'payment_due': 1},
+        )
+        self.assertEqual(summary['total_tenure'], timedelta(minutes=37))
+
+    def test_payment_due_uses_index(self):
+        due_at = self.now - timedelta(seconds=Privateer.PAYMENT_DUE_SECONDS)
+        plan = str(Privateer.objects.current().filter(last_payment_at__lte=due_at).explain())
+        self.assertIn('privateer_game_payment_idx', plan)
+
+
+class PrivateerCounterTests(TransactionTestCase):
+    """Жалобы прибавляются в UPDATE: одновременные записи не теряются."""
+    # Потокам нужны зафиксированные данные - без обертки TestCase
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        self.privateer = Privateer.objects.create(player_id='1001', ship_type='frigate', licensed_by='moderator')
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'britain'})
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_stale_instances(self):
+        # Оба модератора загрузили форму, когда жалоб было 0
+        first = Privateer.objects.get(pk=self.privateer.pk)
+        second = Privateer.objects.get(pk=self.privateer.pk)
+        self.assertEqual(first.add_complaint(2), 2)
+        self.assertEqual(second.add_complaint(3), 5)
+
+    def test_concurrent_complaints(self):
+        # Все потоки сначала читают капера (как форма), затем пишут. Запись
+        # по одному: тестовая база SQLite в памяти с общим кэшем не ждет
+        # блокировку, а сразу падает с "table is locked"
+        threads_count = 8
+        loaded = threading.Barrier(threads_count)
+        write_lock = threading.Lock()
+
+        def complain():
+            try:
+                privateer = Privateer.objects.get(pk=self.privateer.pk)
+                loaded.wait()
+                with write_lock, atomic_game_and_log():
+                    privateer.add_complaint(1)
+            finally:
+                for alias in connections:
+                    connections[alias].close()
+
+        threads = [threading.Thread(target=complain) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.privateer.refresh_from_db()
+        self.assertEqual(self.privateer.complaints, threads_count)
+
+    def test_batch(self):
+        url = reverse('api_privateer_complaints')
+        response = self.client.post(url, json.dumps({'adjustments': [
+            {'privateer_id': self.privateer.pk, 'value': 4},
+            {'privateer_id': self.privateer.pk, 'value': -1},
+        ]}), content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'complaints': {str(self.privateer.pk): 3}})
+        totals = [
+            entry.details['new_total']
+            for entry in LogEntry.objects.filter(action_type='privateer_complaint').order_by('id')
+        ]
+        self.assertEqual(totals, [4, 3])
+
+        # Неизвестный капер - не применяется ни одна поправка
+        response = self.client.post(url, json.dumps({'adjustments': [
+            {'privateer_id': self.privateer.pk, 'value': 1},
+            {'privateer_id': 0, 'value': 1},
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.privateer.refresh_from_db()
+        self.assertEqual(self.privateer.complaints, 3)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+class LedgerTests(TestCase):
+    """Проводки по журналу: остатки счетов ведутся при записи и сходятся с пересчетом."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def log(self, action_type, player_id='1001', table='island', **details):
+        return LogEntry.objects.create(
+            author='moderator', table=table, action_type=action_type, player_id=player_id, details=details,
+        )
+
+    def balances(self):
+        return dict(LedgerAccount.objects.current().values_list('account', 'balance'))
+
+    def test_postings(self):
+        entry = LogEntry(table='britain', action_type='ship_deal', player_id='7',
+                         details={'price': '5000', 'deal_type': 'продажа'})
+        self.assertEqual(ledger.postings(entry), [('7', Decimal('5000.00')), ('bank:britain', Decimal('-5000.00'))])
+        entry.details['deal_type'] = 'покупка'
+        self.assertEqual(ledger.postings(entry)[0], ('7', Decimal('-5000.00')))
+        entry = LogEntry(table='island', action_type='demolition', player_id='8',
+                         details={'owner': '9', 'accumulated_profit': 12.5})
+        self.assertEqual(ledger.postings(entry)[0], ('9', Decimal('12.50')))
+        self.assertEqual(ledger.postings(LogEntry(table='island', action_type='deal', player_id='1')), [])
+        self.assertEqual(ledger.postings(LogEntry(table='island', action_type='court', details={'fine': 10})), [])
+
+    def test_running_balance(self):
+        self.log('profit', profit=100)
+        self.log('purchase', total=30)
+        self.log('building', player_id='1002', cost=50)
+        self.log('deal')
+
+        self.assertEqual(self.balances(), {
+            '1001': Decimal('70.00'), '1002': Decimal('-50.00'), 'bank:island': Decimal('-20.00'),
+        })
+        account = LedgerAccount.objects.current().get(account='1001')
+        self.assertEqual((account.paid_in, account.received), (Decimal('30.00'), Decimal('100.00')))
+        self.assertEqual(
+            list(LedgerEntry.objects.current().filter(account='1001').order_by('id').values_list('amount', 'balance_after')),
+            [(Decimal('100.00'), Decimal('100.00')), (Decimal('-30.00'), Decimal('70.00'))],
+        )
+        self.assertEqual(sum(self.balances().values()), 0)
+
+    def test_record_batch(self):
+        self.log('profit', profit=10)
+        entries = LogEntry.objects.bulk_create([
+            LogEntry(author='moderator', table='island', action_type='profit', player_id='1001', details={'profit': 5}),
+            LogEntry(author='moderator', table='island', action_type='purchase', player_id='1001', details={'total': 8}),
+        ])
+        ledger.record(entries)
+        self.assertEqual(
+            list(LedgerEntry.objects.current().filter(account='1001').order_by('id').values_list('balance_after', flat=True)),
+            [Decimal('10.00'), Decimal('15.00'), Decimal('7.00')],
+        )
+
+    def test_rebuild_matches_incremental(self):
+        seed_game(players=20, events=400)
+        LedgerEntry.objects.all().delete()
+        LedgerAccount.objects.all().delete()
+        for entry in LogEntry.objects.current().order_by('id'):
+            ledger.record([entry])
+        incremental = self.balances()
+        running = list(LedgerEntry.objects.current().order_by('id').values_list('account', 'balance_after'))
+
+        out = io.StringIO()
+        call_command('rebuild_ledger', stdout=out)
+        self.assertEqual(self.balances(), incremental)
+        self.assertEqual(list(LedgerEntry.objects.current().order_by('id').values_list('account', 'balance_after')), running)
+        self.assertEqual(sum(incremental.values()), 0)
+        self.assertIn(str(len(running)), out.getvalue())
+
+        top = ledger.top_accounts(Game.current_id(), limit=5)
+        self.assertEqual(len(top), 5)
+        self.assertFalse(any(ledger.is_bank(account.account) for account in top))
+        self.assertEqual([a.balance for a in top], sorted((a.balance for a in top), reverse=True))
+
+
+class ReplayTests(TestCase):
+    """Состояние на момент времени по журналу совпадает с таблицами игры."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        seed_game(players=30, events=800)
+        self.game_id = Game.current_id()
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_final_state_matches_tables(self):
+        players = replay.state_at(self.game_id, timezone.now(), save=False)['state']['players']
+
+        def having(section):
+            return {pid for pid, data in players.items() if section in data}
+
+        self.assertEqual(having('convict'), set(Convict.objects.current().values_list('player_id', flat=True)))
+        self.assertEqual(having('credit'), set(Credit.objects.current().values_list('player_id', flat=True)))
+        self.assertEqual(
+            {pid for pid, data in players.items() if data.get('privateer', {}).get('active')},
+            set(Privateer.objects.current().filter(is_active=True).values_list('player_id', flat=True)),
+        )
+        buildings = {}
+        for owner, name in ConstructedBuilding.objects.current().values_list('owner_id', 'building_name'):
+            buildings.setdefault(owner, {}).setdefault(name, 0)
+            buildings[owner][name] += 1
+        self.assertEqual({pid: data['buildings'] for pid, data in players.items() if 'buildings' in data}, buildings)
+        self.assertEqual(
+            {pid: Decimal(data['cash']) for pid, data in players.items() if 'cash' in data},
+            {a.account: a.balance for a in LedgerAccount.objects.current() if not ledger.is_bank(a.account)},
+        )
+
+    @override_settings(REPLAY_CHECKPOINT_EVERY=100)
+    def test_checkpoints(self):
+        now = timezone.now()
+        first = replay.state_at(self.game_id, now)
+        self.assertEqual((first['entries'], first['saved']), (800, 8))
+        self.assertIsNone(first['checkpoint'])
+
+        at = LogEntry.objects.current().order_by('timestamp', 'id')[449].timestamp
+        result = replay.state_at(self.game_id, at)
+        self.assertEqual(result['checkpoint'].entries, 400)
+        self.assertEqual(result['replayed'], 50)
+        self.assertEqual(result['saved'], 0)
+
+        StateCheckpoint.objects.all().delete()
+        full = replay.state_at(self.game_id, at, save=False)
+        self.assertEqual(full['replayed'], 450)
+        self.assertEqual(result['state'], full['state'])
+
+    @override_settings(REPLAY_CHECKPOINT_EVERY=1)
+    def test_no_checkpoint_near_now(self):
+        StateCheckpoint.objects.all().delete()
+        LogEntry.objects.filter(game_id=self.game_id).delete()
+        LogEntry.objects.create(author='moderator', table='island', action_type='building',
+                                player_id='1001', details={'building': 'Ферма', 'cost': 100})
+        result = replay.state_at(self.game_id, timezone.now())
+        self.assertEqual(result['saved'], 0)
+        self.assertEqual(replay.player_state(result['state'], '1001'), {
+            'buildings': {'Ферма': 1}, 'cash': '-100.00', 'paid_in': '100.00',
+        })
+
+    @override_settings(REPLAY_CHECKPOINT_EVERY=100, REPLAY_CHECKPOINT_LAG=0)
+    def test_report_view_does_not_write_checkpoints(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+        at = timezone.localtime().strftime('%Y-%m-%dT%H:%M:%S')
+        for _ in range(2):
+            response = self.client.get(reverse('game_state'), {'at': at})
+            self.assertEqual(response.context['result']['entries'], 800)
+        self.assertFalse(StateCheckpoint.objects.exists())
+
+    def test_command(self):
+        player_id = next(iter(replay.state_at(self.game_id, timezone.now(), save=False)['state']['players']))
+        out = io.StringIO()
+        call_command('replay_state', '--at', timezone.localtime().strftime('%Y-%m-%d %H:%M:%S'),
+                     '--player', player_id, '--json', stdout=out, stderr=io.StringIO())
+        self.assertIn(player_id, json.loads(out.getvalue()))
+
+        out = io.StringIO()
+        call_command('replay_state', '--checkpoint', stdout=out)
+        self.assertIn('учтено записей 800', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('replay_state', '--at', 'вчера')
+
+
+class PriceHistoryTests(TestCase):
+    """История цен: точка на каждое изменение, ряды для графика прорежены."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_records_changes_only(self):
+        start = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=start):
+            price = DynamicPrice.objects.create(good_name='rum', current_price=15, pmax=15, n_for_drop=3, t_recovery=60)
+            price.record_sale(2)
+            price.record_sale(1)
+        with mock.patch('django.utils.timezone.now', return_value=start + timedelta(seconds=90)):
+            price = DynamicPrice.objects.get(pk=price.pk)
+            price.check_recovery()
+            price.check_recovery()
+
+        points = list(PriceHistory.objects.filter(good_name='rum').order_by('id').values_list('price', 'timestamp'))
+        self.assertEqual([float(value) for value, _ in points], [15, 14, 15])
+        self.assertEqual(points[-1][1], start + timedelta(seconds=90))
+
+    def test_generated_history_at_game_time(self):
+        def generate(*args):
+            call_command('generate_game_data', *args, players=20, events=400, seed=3, stdout=io.StringIO())
+            return list(PriceHistory.objects.current().order_by('id').values_list('good_name', 'price', 'timestamp'))
+
+        points = generate()
+        start = datetime.fromisoformat(DEFAULT_START)
+        self.assertTrue(points)
+        for _, _, at in points:
+            self.assertTrue(start <= at <= start + timedelta(hours=4))
+        # Последняя точка каждого товара - его текущая цена, лишних точек save() нет
+        last = {good: price for good, price, _ in points}
+        for price in DynamicPrice.objects.filter(good_name__in=last):
+            self.assertEqual(price.current_price, last[price.good_name])
+            self.assertLessEqual(price.last_update, start + timedelta(hours=4))
+        # То же зерно - те же точки, при любом времени запуска
+        self.assertEqual(generate('--clear'), points)
+
+    def test_downsample_keeps_shape(self):
+        points = [(x, 100 - x // 10) for x in range(1000)]
+        points[500] = (500, 500)
+        for method in downsample.METHODS.values():
+            sampled = method(points, 50)
+            self.assertLessEqual(len(sampled), 50)
+            self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+            self.assertIn((500, 500), sampled)
+            self.assertEqual(sampled, sorted(sampled))
+        self.assertEqual(downsample.lttb(points[:10], 50), points[:10])
+
+    def test_endpoint_filters_range(self):
+        start = timezone.now() - timedelta(hours=1)
+        PriceHistory.objects.bulk_create([
+            PriceHistory(good_name=good, price=100 - i % 7, timestamp=start + timedelta(seconds=i))
+            for good in ('rum', 'tea') for i in range(600)
+        ])
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'britain'})
+        response = self.client.get(reverse('api_price_history'), {
+            'good': 'rum', 'points': 30, 'method': 'minmax',
+            'from': (start + timedelta(seconds=100)).isoformat(),
+        })
+        series = response.json()['series']
+        self.assertEqual(list(series), ['rum'])
+        self.assertLessEqual(len(series['rum']), 30)
+        self.assertEqual(series['rum'][0][0], round((start + timedelta(seconds=100)).timestamp(), 3))
+        self.assertEqual(series['rum'][-1][0], round((start + timedelta(seconds=599)).timestamp(), 3))
+        bad = self.client.get(reverse('api_price_history'), {'method': 'avg'})
+        self.assertEqual(bad.status_code, 400)
+
+
+class StatisticsSeriesTests(TestCase):
+    """Ряды статистики: корзины по отрезку в SQL, не больше заданного числа."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_bucket_unit(self):
+        start = timezone.now()
+        self.assertEqual(downsample.bucket_unit(start, start + timedelta(hours=2), 200), ('minute', 1))
+        self.assertEqual(downsample.bucket_unit(start, start + timedelta(days=1), 200), ('hour', 1))
+        self.assertEqual(downsample.bucket_unit(start, start + timedelta(days=30), 200), ('day', 1))
+        self.assertEqual(downsample.bucket_unit(start, start + timedelta(days=365), 50), ('day', 8))
+        self.assertEqual(
+            downsample.merge_buckets([(0, 1, 5), (86400, 2, None), (3 * 86400, 3, 1)], 2, 86400),
+            [[0, 3, 5], [3 * 86400, 3, 1]],
+        )
+
+    def test_series_match_log(self):
+        now = timezone.now().replace(second=0, microsecond=0)
+        details = [{'total': 10}, {'amount': 2.5}, {'fine': 4}, {'total': 0, 'amount': 7}, {}]
+        LogEntry.objects.bulk_create([
+            LogEntry(table='island', action_type='purchase', player_id='1',
+                     details=details[i % 5], timestamp=now - timedelta(minutes=7 * i))
+            for i in range(300)
+        ])
+        response = self.client.get(reverse('api_statistics_series'), {
+            'from': (now - timedelta(hours=2)).isoformat(), 'to': now.isoformat(),
+        })
+        payload = response.json()
+        self.assertEqual(payload['unit'], 'minute')
+        self.assertEqual(sum(count for _, count in payload['counts']), 18)
+        # 18 операций: суммы только положительные, 'total': 0 не уступает 'amount'
+        self.assertAlmostEqual(sum(total for _, total in payload['sums']), 4 * 10 + 4 * 2.5 + 4 * 4)
+        self.assertEqual(payload['counts'][-1][0], int(now.timestamp()))
+
+        wide = self.client.get(reverse('api_statistics_series'), {'days': 3, 'points': 10}).json()
+        self.assertEqual((wide['unit'], wide['step']), ('day', 1))
+        self.assertEqual(sum(count for _, count in wide['counts']), 300)
+        self.assertLessEqual(len(wide['counts']), 10)
+        self.assertEqual(self.client.get(reverse('api_statistics_series'), {'table': 'mars'}).status_code, 400)
+
+
+class ReportJobTests(TestCase):
+    """Тяжелые отчеты строит run_jobs из очереди; страница получает ход и файл."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        seed_game(players=20, events=400)
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(REPORT_JOB_DIR=directory.name))
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def rows(self, job):
+        response = self.client.get(reverse('report_job_download', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+
+    def test_player_export_matches_ledger(self):
+        account = LedgerAccount.objects.current().exclude(account__startswith='bank:').order_by('-paid_in').first()
+        data = {'kind': 'player_export', 'player_id': account.account, 'days': 365}
+        self.assertRedirects(self.client.post(reverse('report_jobs'), data), reverse('report_jobs'))
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.params), ('queued', {'game': Game.current_id(), 'player_id': account.account}))
+        # Тот же отчет, пока он в очереди, второй раз не ставится
+        self.client.post(reverse('report_jobs'), data)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+        call_command('run_jobs', '--once', stdout=io.StringIO())
+        status = self.client.get(reverse('api_report_job', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['progress']), ('done', 100))
+        self.assertEqual(status['download_url'], reverse('report_job_download', args=[job.pk]))
+        self.assertContains(self.client.get(reverse('report_jobs')), status['download_url'])
+
+        rows = self.rows(job)
+        self.assertEqual(len(rows) - 1, LogEntry.objects.current().filter(player_id=account.account).count()
+                         + LogEntry.objects.current().filter(action_type='demolition', details__owner=account.account)
+                         .exclude(player_id=account.account).count())
+        self.assertEqual(Decimal(rows[-1][4]), account.balance)
+
+    def test_statistics_and_summary(self):
+        game_id = Game.current_id()
+        statistics, _ = jobs.submit('statistics', {'game': game_id, 'days': 365, 'table': ''})
+        summary, _ = jobs.submit('game_summary', {'game': game_id})
+        out = io.StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertIn('Обработано задач: 2', out.getvalue())
+
+        rows = self.rows(statistics)
+        days = rows[2:rows.index([])]
+        self.assertEqual(sum(int(count) for _, count, _ in days), LogEntry.objects.current().count())
+        rows = self.rows(summary)
+        players = {row[0] for row in rows[1:]}
+        self.assertTrue(set(LogEntry.objects.current().exclude(player_id__isnull=True)
+                            .values_list('player_id', flat=True)) <= players)
+        # Готовый отчет с теми же параметрами отдается из кэша
+        self.assertEqual(jobs.submit('game_summary', {'game': game_id}), (ReportJob.objects.get(pk=summary.pk), False))
+
+    def test_failed_and_stale_jobs(self):
+        broken = ReportJob.objects.create(kind='nonexistent', key='x')
+        with self.assertLogs('munepit.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim()).status, 'failed')
+        self.assertEqual(ReportJob.objects.get(pk=broken.pk).error, 'Неизвестный отчет: nonexistent')
+        self.assertEqual(self.client.get(reverse('report_job_download', args=[broken.pk])).status_code, 404)
+
+        stuck = ReportJob.objects.create(
+            kind='game_summary', key='y', status='running',
+            updated_at=timezone.now() - timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS + 1),
+        )
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim().pk, stuck.pk)
+        self.assertIsNone(jobs.claim())
+
+
+class RequestLaneTests(TestCase):
+    """Отчеты не начинаются, пока заняты кассы; кассы проходят всегда."""
+    databases = '__all__'
+
+    def setUp(self):
+        lanes.reset()
+        self.addCleanup(lanes.reset)
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+
+    def test_classify(self):
+        for name, lane in (('britain_sale', 'cash'), ('api_timers', 'cash'), ('statistics', 'reports'),
+                           ('api_statistics_series', 'reports'), ('api_lanes', 'other')):
+            self.assertEqual(lanes.classify(lanes.route_name(reverse(name))), lane, name)
+        self.assertEqual(lanes.classify(lanes.route_name('/no-such-page/')), 'other')
+
+    @override_settings(CASH_LANE_BUSY=1, REPORT_LANE_WAIT=0)
+    def test_reports_yield_to_cash(self):
+        self.assertTrue(lanes.admit('cash'))
+        try:
+            page = self.client.get(reverse('statistics'))
+            self.assertEqual(page.status_code, 503)
+            self.assertEqual(page['Retry-After'], '1')
+            api = self.client.get(reverse('api_statistics_series'))
+            self.assertEqual((api.status_code, api.json()['success']), (503, False))
+            # Касса проходит и при занятых кассах
+            self.assertEqual(self.client.get(reverse('island_dashboard')).status_code, 200)
+        finally:
+            lanes.release('cash', 0)
+
+        page = self.client.get(reverse('statistics'))
+        self.assertEqual(page.status_code, 200)
+        self.assertIn('lane;desc="reports"', page['Server-Timing'])
+        metrics = self.client.get(reverse('api_lanes')).json()['lanes']
+        self.assertEqual((metrics['reports']['requests'], metrics['reports']['rejected']), (1, 2))
+        self.assertEqual((metrics['cash']['in_flight'], metrics['reports']['in_flight']), (0, 0))
+        self.assertIsNotNone(metrics['reports']['p95_ms'])
+
+    @override_settings(REPORT_LANE_LIMIT=1)
+    def test_report_limit_queues(self):
+        self.assertTrue(lanes.admit('reports'))
+        self.assertFalse(lanes.admit('reports', wait=0.01))
+        # Освободившееся место будит ждущий отчет
+        timer = threading.Timer(0.05, lanes.release, args=('reports', 0.0))
+        timer.start()
+        self.assertTrue(lanes.admit('reports', wait=5))
+        timer.join()
+        lanes.release('reports', 0.0)
+        self.assertEqual(lanes.stats()['reports']['rejected'], 1)
+
+
+@skipUnless(simulator.np is not None, 'numpy не установлен')
+class PriceSimulatorTests(TestCase):
+    """Симулятор повторяет правило DynamicPrice и выбирает параметры перебором."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_matches_dynamic_price(self):
+        # Тот же поток через DynamicPrice.check_recovery()/record_sale(), как в britain_sale
+        rng = simulator.np.random.default_rng(3)
+        stream = simulator.synthetic_stream(rng, 1800, 0.04, 15, spread=0.6)
+        price = DynamicPrice.objects.create(good_name='rum', current_price=15, pmax=15, n_for_drop=3, t_recovery=120)
+        start = timezone.now()
+        quoted = []
+        for at, quantity, willingness in zip(*stream):
+            with mock.patch('django.utils.timezone.now', return_value=start + timedelta(seconds=float(at))):
+                price.check_recovery()
+                quoted.append(float(price.current_price))
+                if quoted[-1] <= willingness:
+                    price.record_sale(int(quantity))
+
+        result = simulator.simulate(stream, [15], [3], [120], trace=True)
+        self.assertGreater(len(quoted), 50)
+        self.assertEqual(result['quoted'][:, 0].tolist(), quoted)
+        self.assertLess(result['fill'][0], 1)
+
+    def test_sweep_respects_demand(self):
+        # Все покупатели готовы платить не больше 10: дороже никто не купит
+        rng = simulator.np.random.default_rng(1)
+        stream = simulator.synthetic_stream(rng, 3600, 0.05, 10, spread=0)
+        report = simulator.sweep(stream, 10, (20.0, 5, 300), steps=8, min_fill=0.9)
+        self.assertEqual(report['combinations'], 8 ** 3)
+        self.assertLessEqual(report['chosen'][0], 10)
+        self.assertGreaterEqual(report['fill'][0], 0.9)
+        self.assertEqual(report['revenue'][1], 0)
+
+    def test_command_applies_parameters(self):
+        call_command('init_prices', stdout=io.StringIO())
+        DynamicPrice.objects.create(good_name='rum', current_price=15, pmax=15, n_for_drop=5, t_recovery=300)
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile(suffix='.json') as trace:
+            call_command('tune_prices', '--synthetic', '--hours', '1', '--steps', '6', '--goods', 'rum',
+                         '--trace', trace.name, '--apply', stdout=out)
+            curves = json.load(open(trace.name, encoding='utf-8'))
+        self.assertIn('216 комбинаций', out.getvalue())
+        self.assertEqual(len(curves['rum']['times']), len(curves['rum']['chosen_prices']))
+
+        pmax, n_for_drop, t_recovery = curves['rum']['chosen']
+        item = PriceList.objects.get(name='Ром', category='goods')
+        self.assertEqual((float(item.pmax), item.n_for_drop, item.t_recovery), (pmax, n_for_drop, t_recovery))
+        price = DynamicPrice.objects.get(good_name='rum')
+        self.assertEqual((float(price.pmax), price.n_for_drop, price.t_recovery), (pmax, n_for_drop, t_recovery))
+        self.assertLessEqual(price.current_price, price.pmax)
+
+
+@override_settings(CONVICT_SECONDS_PER_YEAR=60)
+class ConvictReleaseDueTests(TestCase):
+    """Срок выхода считается при сохранении, очередь на выход - диапазон индекса."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+        now = timezone.now()
+        self.due = Convict.objects.create(
+            player_id='1001', crime_description='Кража', fine_amount=10, sentence_years=2,
+            sentenced_by='judge', sentenced_at=now - timedelta(minutes=5),
+        )
+        self.serving = Convict.objects.create(
+            player_id='1002', crime_description='Контрабанда', fine_amount=50, sentence_years=5,
+            sentenced_by='judge', sentenced_at=now - timedelta(minutes=1),
+        )
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_release_due_at(self):
+        self.assertEqual(self.due.release_due_at, self.due.sentenced_at + timedelta(minutes=2))
+        self.serving.sentence_years = 1
+        self.serving.save(update_fields=['sentence_years'])
+        self.serving.refresh_from_db()
+        self.assertEqual(self.serving.release_due_at, self.serving.sentenced_at + timedelta(minutes=1))
+
+    def test_release_due_queue(self):
+        due = Convict.objects.current().release_due()
+        self.assertEqual(list(due), [self.due])
+        self.assertIn('USING INDEX convict_game_due_idx (game_id=? AND release_due_at<?)', due.explain())
+        response = self.client.get(reverse('island_release'))
+        self.assertEqual(list(response.context['due_convicts']), [self.due])
+
+    def test_reschedule(self):
+        with override_settings(CONVICT_SECONDS_PER_YEAR=600):
+            out = io.StringIO()
+            call_command('reschedule_convicts', stdout=out)
+        self.assertIn('2 каторжников', out.getvalue())
+        self.assertEqual(Convict.objects.current().release_due().count(), 0)
+
+    def test_batched_times(self):
+        data = self.client.get(reverse('api_convict_times')).json()
+        times = {convict['player_id']: convict for convict in data['convicts']}
+        self.assertEqual(set(times), {'1001', '1002'})
+        self.assertEqual(times['1001']['remaining_seconds'], 0)
+        self.assertAlmostEqual(times['1001']['served_seconds'], 300, delta=5)
+        self.assertAlmostEqual(times['1002']['remaining_seconds'], 240, delta=5)
+
+
+class LogSearchTests(TestCase):
+    """Поиск по тексту журнала: индекс FTS5 обновляется триггерами."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        cls.game_id = Game.current_id()
+        LogEntry.objects.bulk_create([
+            LogEntry(author='a', table='island', action_type='court', player_id='1001',
+                     details={'crime': 'Контрабанда рома', 'fine': '50.00'}),
+            LogEntry(author='a', table='britain', action_type='quest_accept', player_id='1002',
+                     details={'description': 'Найти пропавший бриг', 'reward': 300}),
+            LogEntry(author='a', table='island', action_type='building', player_id='1003',
+                     details={'building': 'Таверна', 'cost': 500}),
+        ])
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def search(self, text):
+        return list(search_log(LogEntry.objects.filter(game_id=self.game_id), text))
+
+    def test_prefix_words_and_case(self):
+        self.assertEqual([entry.player_id for entry in self.search('контраб')], ['1001'])
+        self.assertEqual([entry.player_id for entry in self.search('ПРОПАВШИЙ бриг')], ['1002'])
+        self.assertEqual(self.search('бриг ром'), [])
+        # Синтаксис FTS5 в запросе - просто слова
+        self.assertEqual([entry.player_id for entry in self.search('таверна OR "')], [])
+
+    def test_index_follows_update_and_delete(self):
+        entry = LogEntry.objects.get(player_id='1003')
+        entry.details = {'building': 'Гостиница', 'cost': 500}
+        entry.save()
+        self.assertEqual(self.search('таверна'), [])
+        self.assertEqual([found.pk for found in self.search('гостиница')], [entry.pk])
+        entry.delete()
+        self.assertEqual(self.search('гостиница'), [])
+
+    def test_transaction_list_search(self):
+        response = self.client.get(reverse('transaction_list'), {'game': self.game_id, 'q': 'бриг'})
+        self.assertEqual([entry.player_id for entry in response.context['page_obj']], ['1002'])
+        self.assertContains(response, 'Найти пропавший бриг')
+
+
+@skipUnless(connections[router.db_for_read(LogEntry)].vendor == 'postgresql', 'индексы и поиск PostgreSQL')
+class PostgresLogIndexTests(TestCase):
+    """Индексы журнала на PostgreSQL (миграции 0003, 0005) и поиск по GIN."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.connection = connections[router.db_for_read(LogEntry)]
+
+    def indexes(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s',
+                [LogEntry._meta.db_table],
+            )
+            return dict(cursor.fetchall())
+
+    def test_index_ddl(self):
+        indexes = self.indexes()
+        self.assertIn('USING gin (details jsonb_path_ops)', indexes['munepit_log_details_gin'])
+        self.assertRegex(indexes['munepit_log_timestamp_brin'], r'USING brin \("?timestamp"?\)')
+        self.assertIn("USING gin (to_tsvector('simple'::regconfig", indexes['munepit_log_search_gin'])
+
+    def test_search_uses_gin_index(self):
+        Game.forget_current()
+        game_id = Game.current_id()
+        LogEntry.objects.create(author='a', table='island', action_type='court', player_id='1001',
+                                details={'crime': 'Контрабанда рома', 'fine': '50.00'})
+        found = search_log(LogEntry.objects.filter(game_id=game_id), 'КОНТРАБ ром')
+        self.assertEqual([entry.player_id for entry in found], ['1001'])
+        self.assertIn('Контрабанда', found[0].search_snippet)
+        # На трех записях планировщик выбрал бы скан: проверяется, что индекс подходит запросу
+        with self.connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('munepit_log_search_gin', search_log(LogEntry.objects.all(), 'ром').explain())
+        Game.forget_current()
+
+
+class QueryPlanTests(TestCase):
+    """
+    Планы горячих запросов журнала: каждый идет по составному индексу
+    с game впереди (миграция 0006), полных сканов журнала нет.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        cls.player_id = seed_game(players=20, events=500)[0]
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def assertPlanUses(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index} (game_id=?', plan)
+        self.assertNotIn('SCAN munepit_logentry', plan)
+
+    def test_hot_queries(self):
+        game_id = Game.current_id()
+        log = LogEntry.objects.current()
+        today = timezone.now().date()
+        self.assertPlanUses(log.filter(action_type='profit', table='island').order_by('-timestamp')[:10],
+                            'log_game_action_time_idx')
+        self.assertPlanUses(log.filter(action_type='purchase', table='island', timestamp__date=today),
+                            'log_game_action_time_idx')
+        self.assertPlanUses(log.filter(player_id=self.player_id).order_by('-timestamp'),
+                            'log_game_player_time_idx')
+        self.assertPlanUses(log.filter(_details_match(resource_key='wood'), table='island', player_id=self.player_id),
+                            'log_game_player_time_idx')
+        self.assertPlanUses(LogEntry.objects.filter(game_id=game_id).order_by('-timestamp'), 'log_game_time_idx')
+        self.assertPlanUses(LogEntry.objects.filter(game_id=game_id, timestamp__gte=timezone.now()),
+                            'log_game_time_idx')
+
+    def test_pages_do_not_scan_log(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+        with capture() as queries:
+            for name, params in [
+                ('transaction_list', {'table': 'island', 'action_type': 'purchase'}),
+                ('player_detail', {}),
+                ('island_profit', {}),
+                ('island_purchase_resource', {}),
+            ]:
+                kwargs = {'player_id': self.player_id} if name == 'player_detail' else None
+                self.client.get(reverse(name, kwargs=kwargs), params)
+        report = analyze(queries)
+        self.assertTrue(report['queries'])
+        for alias, sql, plan, full_scans in report['queries']:
+            self.assertNotIn('munepit_logentry', full_scans, sql)
+
+    def test_index_advisor_command(self):
+        out = io.StringIO()
+        call_command('index_advisor', stdout=out)
+        self.assertIn('Страниц:', out.getvalue())
+        self.assertNotIn('полный скан munepit_logentry', out.getvalue())
+        # Сессия обхода не остается в базе
+        self.assertFalse(UserSession.objects.filter(username='index_advisor').exists())
+
+
+class LogRouterTests(TestCase):
+    """Журнал в отдельной базе и согласованность операций, пишущих в обе базы."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.forget_current()
+        Game.current_id()
+        call_command('init_prices', stdout=io.StringIO())
+        cls.building_price = PriceList.objects.filter(category='building').first()
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'username': 'moderator', 'table': 'island'})
+
+    @skipUnless(log_database_enabled(), 'журнал в общей базе (NEPIT_SPLIT_LOG=0)')
+    def test_routing(self):
+        self.assertEqual(router.db_for_write(LogEntry), LOG_DATABASE)
+        self.assertEqual(router.db_for_write(UserSession), LOG_DATABASE)
+        self.assertEqual(router.db_for_write(Session), LOG_DATABASE)
+        self.assertEqual(router.db_for_write(ConstructedBuilding), 'default')
+        self.assertFalse(router.allow_migrate_model(LOG_DATABASE, Credit))
+        self.assertFalse(router.allow_migrate_model('default', LogEntry))
+
+    @skipUnless(log_database_enabled(), 'журнал в общей базе (NEPIT_SPLIT_LOG=0)')
+    def test_check_fails_until_log_moved(self):
+        self.assertEqual(check_log_split(), [])
+        # Основная база до split_log: журнал еще в ней
+        with connections['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE munepit_logentry (id integer PRIMARY KEY)')
+            cursor.execute('INSERT INTO munepit_logentry (id) VALUES (1)')
+        self.assertEqual([error.id for error in check_log_split()], ['munepit.E001'])
+
+        LogEntry.objects.create(author='moderator', table='island', action_type='court', details={})
+        self.assertEqual(check_log_split(), [])
+
+    def test_build_rolled_back_when_log_write_fails(self):
+        self.client.raise_request_exception = False
+        with mock.patch.object(LogEntry.objects, 'create', side_effect=DatabaseError('disk full')):
+            response = self.client.post(reverse('island_build'), {
+                'building': self.building_price.pk, 'player_id': '1001',
+            })
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(ConstructedBuilding.objects.exists())
+
+        self.client.post(reverse('island_build'), {'building': self.building_price.pk, 'player_id': '1001'})
+        building = ConstructedBuilding.objects.get()
+        self.assertTrue(LogEntry.objects.filter(action_type='building', player_id='1001').exists())
+        self.assertEqual(building.game_id, LogEntry.objects.get(action_type='building').game_id)
+
+    def test_form_pages_do_not_open_transaction(self):
+        # Транзакции SQLite открываются как IMMEDIATE: показ формы не должен
+        # брать блокировку записи и ждать кассы
+        for name in ('island_build', 'island_court', 'island_profit', 'island_demolish'):
+            with ExitStack() as stack:
+                contexts = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+                ]
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+            savepoints = [
+                q['sql'] for ctx in contexts for q in ctx.captured_queries if 'SAVEPOINT' in q['sql'].upper()
+            ]
+            self.assertEqual(savepoints, [], name)
+
+
+@skipUnless(log_database_enabled(), 'журнал в общей базе (NEPIT_SPLIT_LOG=0)')
+class SplitLogTests(TransactionTestCase):
+    """split_log переносит в базу журнала все модели LOG_MODELS, а не только журнал."""
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        # Основная база существующей установки: таблицы журнала еще в ней
+        with connections['default'].schema_editor() as editor:
+            for model in log_models():
+                editor.create_model(model)
+
+    def tearDown(self):
+        with connections['default'].schema_editor() as editor:
+            for model in log_models():
+                editor.delete_model(model)
+        Game.forget_current()
+
+    def test_moves_every_log_table(self):
+        game_id = Game.current_id()
+        now = timezone.now()
+        LogEntry.objects.using('default').bulk_create([LogEntry(
+            id=7, game_id=game_id, author='moderator', table='britain', action_type='sale', player_id='1001',
+            details={'good': 'Чай', 'quantity': 1, 'total': 100.0},
+        )])
+        PriceHistory.objects.using('default').bulk_create([
+            PriceHistory(game_id=game_id, good_name='Чай', price=price, timestamp=now - timedelta(minutes=minutes))
+            for price, minutes in ((100, 2), (90, 1))
+        ])
+        LedgerAccount.objects.using('default').create(game_id=game_id, account='1001', balance=-100)
+        LedgerEntry.objects.using('default').create(
+            game_id=game_id, log_entry_id=7, timestamp=now, table='britain', account='1001',
+            amount=-100, balance_after=-100,
+        )
+        StateCheckpoint.objects.using('default').create(
+            game_id=game_id, timestamp=now, last_entry_id=7, entries=1, state=replay.empty_state(),
+        )
+        stranded = check_log_split()
+        self.assertEqual([error.id for error in stranded], ['munepit.E001'])
+        for model in (LogEntry, PriceHistory, LedgerAccount, LedgerEntry, StateCheckpoint):
+            self.assertIn(model._meta.db_table, stranded[0].msg)
+
+        call_command('split_log', stdout=io.StringIO())
+
+        self.assertEqual(check_log_split(), [])
+        self.assertEqual(
+            list(PriceHistory.objects.filter(game_id=game_id).order_by('timestamp').values_list('price', flat=True)),
+            [100, 90],
+        )
+        # Счета и проводки копируются как есть: id записей журнала сохраняются
+        self.assertEqual(LedgerAccount.objects.get(game_id=game_id, account='1001').balance, -100)
+        self.assertEqual(LedgerEntry.objects.get().log_entry_id, 7)
+        self.assertEqual([account.account for account in ledger.top_accounts(game_id)], ['1001'])
+        for model in log_models():
+            self.assertFalse(model.objects.using('default').exists(), model._meta.db_table)
+
+        # Точки перенесены вместе с журналом - replay начинает с них
+        self.assertEqual(StateCheckpoint.objects.get().last_entry_id, 7)
+        self.assertIsNotNone(replay.state_at(game_id, timezone.now(), save=False)['checkpoint'])
+
+
+@skipUnless(settings.REPORT_SNAPSHOTS, 'снимки для отчетов выключены (NEPIT_REPORT_SNAPSHOT_INTERVAL=0)')
+class ReportSnapshotTests(TransactionTestCase):
+    """Отчеты читают копию базы, снятую online backup API."""
+    # backup видит только зафиксированные данные - без обертки TestCase
+    databases = '__all__'
+
+    def setUp(self):
+        Game.forget_current()
+        seed_game(players=10, events=50)
+
+    def tearDown(self):
+        Game.forget_current()
+
+    def test_backup_command(self):
+        source = router.db_for_write(LogEntry)
+        with tempfile.TemporaryDirectory() as output:
+            call_command('snapshot_db', '--output', output, '--database', source, stdout=io.StringIO())
+            copy = sqlite3.connect(f'{output}/{source}.sqlite3')
+            try:
+                count = copy.execute('SELECT COUNT(*) FROM munepit_logentry').fetchone()[0]
+            finally:
+                copy.close()
+        self.assertEqual(count, 50)
+
+    def test_backup_while_tables_write(self):
+        alias = settings.REPORT_SNAPSHOTS['default']
+        with tempfile.TemporaryDirectory() as tmp:
+            source = f'{tmp}/source.sqlite3'
+            writer = sqlite3.connect(source, isolation_level=None)
+            writer.execute('PRAGMA journal_mode=WAL')
+            writer.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, payload BLOB)')
+            # ~6 МБ - больше тысячи страниц
+            writer.execute('INSERT INTO t (payload) SELECT randomblob(2000) FROM ('
+                           'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000) '
+                           'SELECT i FROM n)')
+            steps = []
+
+            def write_between_steps(status, remaining, total):
+                # Касса пишет другим соединением, пока снимок копируется
+                steps.append(remaining)
+                if len(steps) <= 20:
+                    writer.execute('INSERT INTO t (payload) VALUES (randomblob(100))')
+
+            class WritingSource:
+                def __init__(self, connection):
+                    self.connection = connection
+
+                def backup(self, target, **kwargs):
+                    return self.connection.backup(target, progress=write_between_steps, **kwargs)
+
+            settings_dict = dict(connections[alias].settings_dict, NAME=source)
+            with mock.patch.object(connections[alias], 'settings_dict', settings_dict), \
+                    mock.patch.object(connections[alias], 'connection', None):
+                connections[alias].ensure_connection()
+                real = connections[alias].connection
+                connections[alias].connection = WritingSource(real)
+                try:
+                    snapshots.backup(alias, f'{tmp}/copy.sqlite3')
+                finally:
+                    connections[alias].connection = real
+                    connections[alias].close()
+            writer.close()
+
+            copy = sqlite3.connect(f'{tmp}/copy.sqlite3')
+            try:
+                count = copy.execute('SELECT COUNT(*) FROM t').fetchone()[0]
+            finally:
+                copy.close()
+        # Один шаг в одной транзакции чтения: запись другого соединения
+        # не перезапускает копирование и не попадает в снимок
+        self.assertEqual(steps, [0])
+        self.assertEqual(count, 3000)
+
+    def test_reports_routed_to_snapshot(self):
+        source = router.db_for_write(LogEntry)
+        snapshot = settings.REPORT_SNAPSHOTS[source]
+        # Тестовая база снимка в памяти - чтения остаются на рабочей
+        with reporting():
+            self.assertEqual(router.db_for_read(LogEntry), source)
+
+        with tempfile.TemporaryDirectory() as output:
+            settings_dict = dict(connections[snapshot].settings_dict, NAME=f'{output}/{source}.sqlite3')
+            # Соединение с базой снимка в памяти подменяется соединением с файлом
+            with mock.patch.object(connections[snapshot], 'settings_dict', settings_dict), \
+                    mock.patch.object(connections[snapshot], 'connection', None):
+                call_command('snapshot_db', '--database', source, stdout=io.StringIO())
+                self.assertEqual(router.db_for_read(LogEntry), source)
+                with reporting():
+                    self.assertEqual(router.db_for_read(LogEntry), snapshot)
+                    self.assertEqual(router.db_for_read(Game), 'default')
+                    self.assertEqual(router.db_for_read(UserSession), router.db_for_write(UserSession))
+                response = self.client.get(reverse('transaction_list'))
+                self.assertEqual(response.context['page_obj'].paginator.count, 50)
+                self.assertContains(response, 'Данные на')
+                connections[snapshot].close()
+
+    def test_first_snapshot_in_background(self):
+        source = router.db_for_write(LogEntry)
+        snapshot = settings.REPORT_SNAPSHOTS[source]
+        with tempfile.TemporaryDirectory() as output:
+            path = f'{output}/{source}.sqlite3'
+            settings_dict = dict(connections[snapshot].settings_dict, NAME=path)
+            with mock.patch.object(connections[snapshot], 'settings_dict', settings_dict), \
+                    mock.patch.object(connections[snapshot], 'connection', None):
+                # Первый отчет не ждет копии: снимок заказан фоновому потоку,
+                # а чтения пока идут в рабочую базу
+                with mock.patch.object(snapshots.threading, 'Thread') as thread:
+                    self.assertIsNone(snapshots.ensure_fresh())
+                    with snapshots.reading_snapshot():
+                        self.assertEqual(router.db_for_read(LogEntry), source)
+                self.assertFalse(os.path.exists(path))
+                thread.assert_called_once()
+                thread.return_value.start.assert_called_once()
+                sources = thread.call_args.kwargs['args'][0]
+                self.assertIn(source, sources)
+                snapshots.refresh(sources)
+                snapshots._refresh_lock.release()
+
+                self.assertIsNotNone(snapshots.ensure_fresh())
+                with snapshots.reading_snapshot():
+                    self.assertEqual(router.db_for_read(LogEntry), snapshot)
+                    self.assertEqual(LogEntry.objects.count(), 50)
+                # Снимок только на чтение - и при явном выборе базы
+                with self.assertRaises(DatabaseError):
+                    LogEntry.objects.using(snapshot).all().delete()
+                connections[snapshot].close()
@@ -1,14 +1,27 @@
 # views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.http import FileResponse, Http404, JsonResponse
+from django.views.decorators.http import condition, require_POST
 from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from decimal import Decimal
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+from pathlib import Path
+import hashlib
 import json
+import mimetypes
+import re
+import time
+from urllib.parse import urlencode
 
 
 def _infer_building_type_and_income(building_name, description=''):
@@ -41,12 +54,109 @@ def _infer_building_type_and_income(building_name, description=''):
 
 
 
+def _details_match(**values):
+    """
+    Фильтр по ключам LogEntry.details.
+
+    На PostgreSQL - details @> {...}, его обслуживает GIN-индекс;
+    SQLite не поддерживает contains для JSON, там сравниваются ключи.
+    """
+    if connection.vendor == 'postgresql':
+        return Q(details__contains=values)
+    return Q(**{f'details__{key}': value for key, value in values.items()})
+
+
+def _selected_game_id(request):
+    """Игра для отчетов: ?game=<id> из архива истории, по умолчанию - текущая."""
+    game = request.GET.get('game', '')
+    return int(game) if game.isdigit() else Game.current_id()
+
+
+def _report_view(view_func):
+    """Отчет читает снимок базы (munepit/snapshots.py), а не рабочую базу столов."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with reading_snapshot() as snapshot_at:
+            request.snapshot_at = snapshot_at
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _panel_version(*models, clock=None):
+    """
+    Ключ версии панели для {% cache %}: текущая игра и метки версий моделей
+    (munepit/fragments.py). clock - шаг в секундах для панелей, которые
+    меняются и без записи (просрочки, выслуга).
+    """
+    version = f'{Game.current_id()}-{model_version(*models)}'
+    if clock:
+        version += f'-{int(time.time() // clock)}'
+    return version
+
+
+def _cached_panel(name, models, compute):
+    """Данные панели, пересчитываемые только после записи в models."""
+    key = f'munepit:panel:{name}:{_panel_version(*models)}'
+    return cache.get_or_set(key, compute, settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def _table_state_tag(request, table, clock):
+    """
+    (ETag, Last-Modified) страницы стола по версии состояния (munepit/state.py)
+    или None, если условный ответ невозможен: нет сессии (ответит
+    session_required) или ждут показа сообщения messages.
+    """
+    if not hasattr(request, '_state_tag'):
+        table = table(request) if callable(table) else table
+        session_id = request.session.get('session_id')
+        request._state_tag = None
+        if table in TABLES and session_id and not len(messages.get_messages(request)):
+            counter, changed_at, token = table_state(table)
+            parts = [table, Game.current_id(), counter, token, session_id, request.get_full_path()]
+            if clock:
+                bucket = int(time.time() // clock)
+                parts.append(bucket)
+                changed_at = max(changed_at, bucket * clock)
+            etag = hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:20]
+            request._state_tag = (etag, datetime.fromtimestamp(int(changed_at), tz=dt_timezone.utc))
+    return request._state_tag
+
+
+def _state_conditional(table, clock=None):
+    """
+    Условный GET для страниц и API стола: ETag и Last-Modified по версии
+    состояния, на совпавший If-None-Match - 304 до сессии, ORM и шаблонов.
+    table - имя стола или функция от запроса; clock - как у _panel_version,
+    для страниц, которые меняются и без записи. Ставится над session_required.
+    """
+    def etag(request, *args, **kwargs):
+        tag = _table_state_tag(request, table, clock)
+        return tag and tag[0]
+
+    def last_modified(request, *args, **kwargs):
+        tag = _table_state_tag(request, table, clock)
+        return tag and tag[1]
+
+    def decorator(view_func):
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                # Без no-cache браузер может показать страницу из кэша, не спросив сервер
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
 def _get_player_resource_balance(player_id, resource_key):
     """Подсчет остатка ресурса у игрока по журналу операций."""
-    logs = LogEntry.objects.filter(
+    logs = LogEntry.objects.current().filter(
+        _details_match(resource_key=resource_key),
         table='island',
         player_id=player_id,
-        details__resource_key=resource_key,
     )
 
     balance = 0
@@ -65,6 +175,53 @@ def _get_player_resource_balance(player_id, resource_key):
 
     return max(0, balance)
 
+
+# Данные, которые живут в сессии между формой и экраном подтверждения.
+# Храним только перечисленные поля с явными типами: payload остается
+# маленьким и сериализуется одинаково для любого SESSION_ENGINE
+# (в т.ч. signed_cookies, где вся сессия уходит в cookie).
+PENDING_SCHEMAS = {
+    'pending_deal': {
+        'player_a': str, 'player_b': str, 'description': str,
+    },
+    'pending_convict': {
+        'id': int, 'player_id': str, 'player_name': str, 'crime': str,
+        'fine': float, 'confiscation': bool, 'sentence': int,
+    },
+    'pending_purchase': {
+        'resource': str, 'resource_key': str, 'player_id': str,
+        'quantity': int, 'price_per_unit': float, 'total': float,
+    },
+    'pending_building': {
+        'building': str, 'player_id': str, 'cost': float,
+    },
+    'pending_processing': {
+        'factory_id': int, 'factory_name': str, 'owner_id': str,
+        'quantity': int, 'cost_per_unit': float, 'total': float,
+    },
+    'pending_demolition': {
+        'id': int, 'name': str, 'type': str, 'owner': str, 'accumulated': float,
+    },
+    'pending_credit': {
+        'player_id': str, 'amount': float, 'term': int, 'monthly': float,
+    },
+}
+
+
+def _set_pending(request, key, data):
+    """Сохраняет отложенную операцию в сессию по схеме PENDING_SCHEMAS."""
+    request.session[key] = {
+        field: cast(data[field])
+        for field, cast in PENDING_SCHEMAS[key].items()
+        if data.get(field) is not None
+    }
+
+
+def _pop_pending(request, key):
+    """Удаляет отложенную операцию из сессии."""
+    request.session.pop(key, None)
+
+
 def player_search(request):
     """Поиск игрока по номеру"""
     session_id = request.session.get('session_id')
@@ -76,23 +233,23 @@ def player_search(request):
     
     if query:
         # Поиск в логах
-        transactions = LogEntry.objects.filter(
+        transactions = LogEntry.objects.current().filter(
             Q(player_id__icontains=query)
         ).order_by('-timestamp')[:100]
         
         # Информация по игроку
         player_info = {
             'id': query,
-            'transactions_count': LogEntry.objects.filter(player_id=query).count(),
+            'transactions_count': LogEntry.objects.current().filter(player_id=query).count(),
             'total_amount': 0,
-            'as_convict': Convict.objects.filter(player_id=query).first(),
-            'as_builder': ConstructedBuilding.objects.filter(owner_id=query).count(),
-            'as_debtor': Credit.objects.filter(player_id=query).first(),
-            'as_privateer': Privateer.objects.filter(player_id=query, is_active=True).first(),
+            'as_convict': Convict.objects.current().filter(player_id=query).first(),
+            'as_builder': ConstructedBuilding.objects.current().filter(owner_id=query).count(),
+            'as_debtor': Credit.objects.current().filter(player_id=query).first(),
+            'as_privateer': Privateer.objects.current().filter(player_id=query, is_active=True).first(),
         }
         
         # Подсчет общей суммы
-        for t in LogEntry.objects.filter(player_id=query):
+        for t in LogEntry.objects.current().filter(player_id=query):
             if 'total' in t.details:
                 player_info['total_amount'] += float(t.details['total'])
             elif 'amount' in t.details:
@@ -113,6 +270,7 @@ def player_search(request):
     return render(request, 'munepit/player_search.html', context)
 
 
+@_report_view
 def player_detail(request, player_id):
     """Детальная информация об игроке"""
     session_id = request.session.get('session_id')
@@ -120,7 +278,7 @@ def player_detail(request, player_id):
         return redirect('login')
     
     # Все транзакции игрока
-    transactions = LogEntry.objects.filter(
+    transactions = LogEntry.objects.current().filter(
         player_id=player_id
     ).order_by('-timestamp')
     
@@ -152,13 +310,16 @@ def player_detail(request, player_id):
             monthly_sums[month] = amount
     
     # Информация об игроке
-    convict = Convict.objects.filter(player_id=player_id).first()
-    buildings = ConstructedBuilding.objects.filter(owner_id=player_id)
-    credit = Credit.objects.filter(player_id=player_id).first()
-    privateer = Privateer.objects.filter(player_id=player_id, is_active=True).first()
+    convict = Convict.objects.current().filter(player_id=player_id).first()
+    buildings = ConstructedBuilding.objects.current().filter(owner_id=player_id)
+    credit = Credit.objects.current().filter(player_id=player_id).first()
+    privateer = Privateer.objects.current().filter(player_id=player_id, is_active=True).first()
+    # Остаток и обороты - одна строка счета (munepit/ledger.py), без разбора журнала
+    account = LedgerAccount.objects.current().filter(account=player_id).first()
     
     context = {
         'player_id': player_id,
+        'account': account,
         'page_obj': page_obj,
         'action_stats': action_stats,
         'monthly_sums': monthly_sums,
@@ -170,6 +331,34 @@ def player_detail(request, player_id):
     }
     
     return render(request, 'munepit/player_detail.html', context)
+@_report_view
+def game_state(request):
+    """Состояние игры на момент времени по журналу (munepit/replay.py), только чтение"""
+    session_id = request.session.get('session_id')
+    if not session_id:
+        return redirect('login')
+
+    # Из карточки игрока приходит только номер - форма еще не отправлена
+    form = GameStateForm(request.GET if 'at' in request.GET else None, initial={'player_id': request.GET.get('player_id', '')})
+    context = {'form': form}
+    if form.is_valid():
+        at = form.cleaned_data['at']
+        player_id = form.cleaned_data['player_id']
+        # Только чтение: точки из снимка не пишутся в рабочую базу, их
+        # сохраняют replay_state --checkpoint и write_checkpoints()
+        result = replay.state_at(_selected_game_id(request), at, save=False)
+        player_ids = [player_id] if player_id else sorted(result['state']['players'], key=lambda p: (len(p), p))
+        context.update({
+            'at': at,
+            'result': result,
+            'players': [
+                dict(replay.player_state(result['state'], pid), id=pid) for pid in player_ids
+            ],
+        })
+    return render(request, 'munepit/game_state.html', context)
+
+
+@_report_view
 def statistics(request, table=None):
     """Страница статистики"""
     session_id = request.session.get('session_id')
@@ -181,7 +370,8 @@ def statistics(request, table=None):
     start_date = timezone.now() - timedelta(days=days)
     
     # Базовый запрос
-    logs = LogEntry.objects.filter(timestamp__gte=start_date)
+    game_id = _selected_game_id(request)
+    logs = LogEntry.objects.filter(game_id=game_id, timestamp__gte=start_date)
     
     # Фильтр по столу
     if table:
@@ -198,60 +388,31 @@ def statistics(request, table=None):
         count=Count('id')
     ).order_by('-count')
     
-    # Статистика по дням
-    daily_stats = logs.extra(
-        select={'day': "date(timestamp)"}
-    ).values('day').annotate(
-        count=Count('id')
-    ).order_by('day')
-    
     # Статистика по игрокам
     players_stats = logs.exclude(
         player_id__isnull=True
     ).values('player_id').annotate(
         count=Count('id')
     ).order_by('-count')[:10]
-    
-    # Суммы по дням
-    daily_sums = []
-    for log in logs:
-        amount = 0
-        if 'total' in log.details:
-            amount = float(log.details['total'])
-        elif 'amount' in log.details:
-            amount = float(log.details['amount'])
-        elif 'fine' in log.details:
-            amount = float(log.details['fine'])
-        
-        if amount > 0:
-            daily_sums.append({
-                'date': log.timestamp.date(),
-                'amount': amount
-            })
-    
-    # Группировка сумм по дням
-    from collections import defaultdict
-    sums_by_day = defaultdict(float)
-    for item in daily_sums:
-        sums_by_day[item['date']] += item['amount']
+
+    # Самые богатые игроки - начало индекса счетов, а не сумма по журналу
+    top_accounts = ledger.top_accounts(game_id)
     
     # Статистика по столам
     island_stats = {
-        'buildings': ConstructedBuilding.objects.count(),
-        'convicts': Convict.objects.count(),
+        'buildings': ConstructedBuilding.objects.filter(game_id=game_id).count(),
+        'convicts': Convict.objects.filter(game_id=game_id).count(),
     }
     
     britain_stats = {
-        'credits': Credit.objects.count(),
-        'privateers': Privateer.objects.filter(is_active=True).count(),
+        'credits': Credit.objects.filter(game_id=game_id).count(),
+        'privateers': Privateer.objects.filter(game_id=game_id, is_active=True).count(),
     }
     
-    # Подготовка данных для графиков
-    dates = [item['day'] for item in daily_stats]
-    counts = [item['count'] for item in daily_stats]
-    
-    sum_dates = list(sums_by_day.keys())
-    sum_values = list(sums_by_day.values())
+    # Графики берут ряды с api_statistics_series за тот же период
+    series_params = {'days': days, 'game': game_id}
+    if table:
+        series_params['table'] = table
     
     context = {
         'total_count': total_count,
@@ -259,28 +420,36 @@ def statistics(request, table=None):
         'current_table': current_table,
         'actions_stats': actions_stats,
         'players_stats': players_stats,
+        'top_accounts': top_accounts,
         'island_stats': island_stats,
         'britain_stats': britain_stats,
-        'dates': json.dumps([str(d) for d in dates]),
-        'counts': json.dumps(counts),
-        'sum_dates': json.dumps([str(d) for d in sum_dates]),
-        'sum_values': json.dumps(sum_values),
+        'series_query': urlencode(series_params),
         'table_choices': LogEntry.TABLE_CHOICES,
         'action_types': LogEntry.ACTION_TYPES,
+        'game_id': game_id,
+        'games': Game.objects.filter(archived_at__isnull=True),
     }
     
     return render(request, 'munepit/statistics.html', context)
 from .models import (
     UserSession, LogEntry, PriceList, Convict, ConstructedBuilding,
-    Credit, Privateer, DynamicPrice
+    Credit, Privateer, DynamicPrice, Game, LedgerAccount, PriceHistory, ReportJob
 )
+from . import jobs, lanes, ledger, replay
+from .downsample import METHODS as DOWNSAMPLE_METHODS, UNITS, bucket_unit, merge_buckets
 from .forms import *
+from .routers import atomic_game_and_log
+from .snapshots import reading_snapshot
+from .fragments import bump, model_version
+from .state import TABLES, state_cached, table_state
+from .search import search_log
 
 # munepit/views.py
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator
 from .models import LogEntry
 
+@_report_view
 def transaction_list(request):
     """Список всех транзакций"""
     # Получаем параметры фильтрации
@@ -289,9 +458,11 @@ def transaction_list(request):
     player_id = request.GET.get('player_id', '')
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
+    search = request.GET.get('q', '').strip()
+    game_id = _selected_game_id(request)
     
     # Базовый запрос
-    transactions = LogEntry.objects.all().order_by('-timestamp')
+    transactions = LogEntry.objects.filter(game_id=game_id).order_by('-timestamp')
     
     # Применяем фильтры
     if table:
@@ -304,6 +475,9 @@ def transaction_list(request):
         transactions = transactions.filter(timestamp__date__gte=date_from)
     if date_to:
         transactions = transactions.filter(timestamp__date__lte=date_to)
+    if search:
+        # Поиск по тексту details: сначала самые релевантные записи
+        transactions = search_log(transactions, search)
     
     # Пагинация
     paginator = Paginator(transactions, 20)  # 20 транзакций на страницу
@@ -317,6 +491,9 @@ def transaction_list(request):
         'player_id': player_id,
         'date_from': date_from,
         'date_to': date_to,
+        'search': search,
+        'game_id': game_id,
+        'games': Game.objects.filter(archived_at__isnull=True),
         'action_types': LogEntry.ACTION_TYPES,
         'table_choices': LogEntry.TABLE_CHOICES,
     }
@@ -382,13 +559,14 @@ def logout_view(request):
 
 # ================ СТОЛ "ОСТРОВ" ================
 
+@_state_conditional('island')
 @session_required
 def island_dashboard(request):
     """Главная страница стола Остров"""
     context = {
         'session': request.current_session,
-        'convicts_count': Convict.objects.count(),
-        'buildings_count': ConstructedBuilding.objects.count(),
+        'convicts_count': Convict.objects.current().count(),
+        'buildings_count': ConstructedBuilding.objects.current().count(),
     }
     return render(request, 'island/dashboard.html', context)
 
@@ -408,7 +586,7 @@ def island_deal(request):
             )
             
             # Переходим на экран подтверждения
-            request.session['pending_deal'] = form.cleaned_data
+            _set_pending(request, 'pending_deal', form.cleaned_data)
             return redirect('island_deal_confirm')
     else:
         form = DealForm()
@@ -427,7 +605,7 @@ def island_deal_confirm(request):
         # Действие уже записано в лог на предыдущем шаге
         # Здесь можно добавить дополнительную логику
         messages.success(request, 'Сделка успешно зарегистрирована')
-        del request.session['pending_deal']
+        _pop_pending(request, 'pending_deal')
         return redirect('island_dashboard')
     
     return render(request, 'island/deal_confirm.html', {'deal': deal_data})
@@ -437,37 +615,38 @@ def island_deal_confirm(request):
 def island_court(request):
     """Суд (п. 2.9)"""
     if request.method == 'POST':
-        form = CourtForm(request.POST)
-        if form.is_valid():
-            convict = form.save(commit=False)
-            convict.sentenced_by = request.current_user
-            convict.save()
+        with atomic_game_and_log():
+            form = CourtForm(request.POST)
+            if form.is_valid():
+                convict = form.save(commit=False)
+                convict.sentenced_by = request.current_user
+                convict.save()
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='court',
-                player_id=convict.player_id,
-                details={
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='court',
+                    player_id=convict.player_id,
+                    details={
+                        'crime': convict.crime_description,
+                        'fine': float(convict.fine_amount),
+                        'confiscation': convict.confiscation,
+                        'sentence': convict.sentence_years
+                    }
+                )
+            
+                # Сохраняем для подтверждения
+                _set_pending(request, 'pending_convict', {
+                    'id': convict.id,
+                    'player_id': convict.player_id,
+                    'player_name': convict.player_name,
                     'crime': convict.crime_description,
                     'fine': float(convict.fine_amount),
                     'confiscation': convict.confiscation,
                     'sentence': convict.sentence_years
-                }
-            )
-            
-            # Сохраняем для подтверждения
-            request.session['pending_convict'] = {
-                'id': convict.id,
-                'player_id': convict.player_id,
-                'player_name': convict.player_name,
-                'crime': convict.crime_description,
-                'fine': float(convict.fine_amount),
-                'confiscation': convict.confiscation,
-                'sentence': convict.sentence_years
-            }
-            return redirect('island_court_confirm')
+                })
+                return redirect('island_court_confirm')
     else:
         form = CourtForm()
     
@@ -483,7 +662,7 @@ def island_court_confirm(request):
     
     if request.method == 'POST':
         messages.success(request, 'Приговор вынесен')
-        del request.session['pending_convict']
+        _pop_pending(request, 'pending_convict')
         return redirect('island_dashboard')
     
     return render(request, 'island/court_confirm.html', {'convict': convict_data})
@@ -493,46 +672,51 @@ def island_court_confirm(request):
 def island_release(request):
     """Выход с каторги (п. 2.10)"""
     if request.method == 'POST':
-        form = ConvictReleaseForm(request.POST)
-        if form.is_valid():
-            convict = form.cleaned_data['player']
-            early = form.cleaned_data['early_release'] == 'True'
+        with atomic_game_and_log():
+            form = ConvictReleaseForm(request.POST)
+            if form.is_valid():
+                convict = form.cleaned_data['player']
+                early = form.cleaned_data['early_release'] == 'True'
             
-            # Расчет времени на каторге
-            time_served = timezone.now() - convict.sentenced_at
-            seconds_served = int(time_served.total_seconds())
+                # Расчет времени на каторге
+                time_served = timezone.now() - convict.sentenced_at
+                seconds_served = int(time_served.total_seconds())
             
-            # Удаление из таблицы каторжников
-            player_id = convict.player_id
-            convict.delete()
+                # Удаление из таблицы каторжников
+                player_id = convict.player_id
+                convict.delete()
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='release',
-                player_id=player_id,
-                details={
-                    'early_release': early,
-                    'time_served_seconds': seconds_served,
-                    'time_served_formatted': str(time_served).split('.')[0]
-                }
-            )
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='release',
+                    player_id=player_id,
+                    details={
+                        'early_release': early,
+                        'time_served_seconds': seconds_served,
+                        'time_served_formatted': str(time_served).split('.')[0]
+                    }
+                )
             
-            messages.success(request, f'Игрок {player_id} освобожден с каторги')
-            return redirect('island_dashboard')
+                messages.success(request, f'Игрок {player_id} освобожден с каторги')
+                return redirect('island_dashboard')
     else:
         form = ConvictReleaseForm()
         # Автоматически заполняем время для предпросмотра
         if 'player' in request.GET:
             try:
-                convict = Convict.objects.get(id=request.GET['player'])
+                convict = Convict.objects.current().get(id=request.GET['player'])
                 time_served = timezone.now() - convict.sentenced_at
                 form.fields['time_served'].initial = str(time_served).split('.')[0]
             except Convict.DoesNotExist:
                 pass
-    
-    return render(request, 'island/release.html', {'form': form})
+
+    # Очередь на выход: срок вышел, от самых давних
+    due_convicts = Convict.objects.current().release_due().only(
+        'id', 'player_id', 'player_name', 'sentence_years', 'release_due_at'
+    )
+    return render(request, 'island/release.html', {'form': form, 'due_convicts': due_convicts})
 
 
 @session_required
@@ -554,13 +738,13 @@ def island_purchase_resource(request):
             total = form.cleaned_data['quantity'] * float(price)
             
             # Сохраняем в сессию для подтверждения
-            request.session['pending_purchase'] = {
+            _set_pending(request, 'pending_purchase', {
                 'resource': form.cleaned_data['resource'],
                 'player_id': form.cleaned_data['player_id'],
                 'quantity': form.cleaned_data['quantity'],
                 'price_per_unit': float(price),
                 'total': total
-            }
+            })
             return redirect('island_purchase_confirm')
     else:
         form = ResourcePurchaseForm()
@@ -615,7 +799,7 @@ def island_purchase_confirm(request):
             )
             
             messages.success(request, f'Покупка завершена. Сдача: {change:.2f}')
-            del request.session['pending_purchase']
+            _pop_pending(request, 'pending_purchase')
             return redirect('island_dashboard')
         else:
             messages.error(request, 'Недостаточно средств')
@@ -630,52 +814,55 @@ def island_purchase_confirm(request):
 def island_build(request):
     """Постройка здания (п. 3.2)"""
     if request.method == 'POST':
-        form = BuildingForm(request.POST)
-        if form.is_valid():
-            building = form.cleaned_data['building']
-            player_id = form.cleaned_data['player_id']
+        with atomic_game_and_log():
+            form = BuildingForm(request.POST)
+            if form.is_valid():
+                building = form.cleaned_data['building']
+                player_id = form.cleaned_data['player_id']
             
-            building_type, income_per_minute = _infer_building_type_and_income(
-                building.name,
-                building.description,
-            )
+                building_type, income_per_minute = _infer_building_type_and_income(
+                    building.name,
+                    building.description,
+                )
 
-            # Создаем запись о построенном здании
-            constructed = ConstructedBuilding.objects.create(
-                building_name=building.name,
-                building_type=building_type,
-                owner_id=player_id,
-                built_by=request.current_user,
-                cost=building.base_price,
-                income_per_minute=income_per_minute
-            )
+                # Создаем запись о построенном здании
+                constructed = ConstructedBuilding.objects.create(
+                    building_name=building.name,
+                    building_type=building_type,
+                    owner_id=player_id,
+                    built_by=request.current_user,
+                    cost=building.base_price,
+                    income_per_minute=income_per_minute
+                )
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='building',
-                player_id=player_id,
-                details={
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='building',
+                    player_id=player_id,
+                    details={
+                        'building': building.name,
+                        'cost': float(building.base_price)
+                    }
+                )
+            
+                _set_pending(request, 'pending_building', {
                     'building': building.name,
+                    'player_id': player_id,
                     'cost': float(building.base_price)
-                }
-            )
-            
-            request.session['pending_building'] = {
-                'building': building.name,
-                'player_id': player_id,
-                'cost': float(building.base_price)
-            }
-            return redirect('island_build_confirm')
+                })
+                return redirect('island_build_confirm')
     else:
         form = BuildingForm()
     
-    recent_buildings = ConstructedBuilding.objects.order_by('-built_at')[:20]
+    recent_buildings = ConstructedBuilding.objects.current().order_by('-built_at')[:20]
     
     return render(request, 'island/build.html', {
         'form': form,
         'recent_buildings': recent_buildings,
+        'panel_version': _panel_version(ConstructedBuilding),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     })
 
 
@@ -688,7 +875,7 @@ def island_build_confirm(request):
     
     if request.method == 'POST':
         messages.success(request, 'Здание построено')
-        del request.session['pending_building']
+        _pop_pending(request, 'pending_building')
         return redirect('island_dashboard')
     
     return render(request, 'island/build_confirm.html', {'build': build_data})
@@ -698,7 +885,7 @@ def island_build_confirm(request):
 def island_process_resource(request):
     """Обработка ресурса на фабрике (п. 3.3)"""
     normalized = 0
-    for building in ConstructedBuilding.objects.filter(building_type='other'):
+    for building in ConstructedBuilding.objects.current().filter(building_type='other'):
         inferred_type, inferred_income = _infer_building_type_and_income(building.building_name)
         if inferred_type == 'factory':
             building.building_type = 'factory'
@@ -727,14 +914,14 @@ def island_process_resource(request):
             
             total = quantity * float(processing_cost)
             
-            request.session['pending_processing'] = {
+            _set_pending(request, 'pending_processing', {
                 'factory_id': factory.id,
                 'factory_name': factory.building_name,
                 'owner_id': factory.owner_id,
                 'quantity': quantity,
                 'cost_per_unit': float(processing_cost),
                 'total': total
-            }
+            })
             return redirect('island_process_confirm')
     else:
         form = ResourceProcessingForm()
@@ -778,7 +965,7 @@ def island_process_confirm(request):
             )
             
             messages.success(request, f'Обработка завершена. Сдача: {change:.2f}')
-            del request.session['pending_processing']
+            _pop_pending(request, 'pending_processing')
             return redirect('island_dashboard')
         else:
             messages.error(request, 'Недостаточно средств')
@@ -798,7 +985,7 @@ def island_profit(request):
     
     # Автонормализация старых построек: раньше все создавались как 'other'
     normalized = 0
-    for building in ConstructedBuilding.objects.filter(building_type='other'):
+    for building in ConstructedBuilding.objects.current().filter(building_type='other'):
         inferred_type, inferred_income = _infer_building_type_and_income(building.building_name)
         if inferred_type != 'other':
             building.building_type = inferred_type
@@ -814,17 +1001,13 @@ def island_profit(request):
         print(f"Нормализовано построек по типам: {normalized}")
 
     # Получаем объекты для начисления прибыли (бизнесы и фабрики)
-    businesses = ConstructedBuilding.objects.filter(
+    businesses = ConstructedBuilding.objects.current().filter(
         building_type__in=['business', 'factory']
     ).order_by('-last_profit_collected')
     
-    # Для отладки - выводим в консоль
-    print(f"Найдено бизнесов: {businesses.count()}")
-    for b in businesses:
-        print(f"  - {b.building_name} (ID: {b.id}, владелец: {b.owner_id}, доход: {b.income_per_minute} ₽/мин)")
-    
-    # Статистика
-    total_businesses = businesses.count()
+    # Статистика. Шаблон выводит все объекты: len() загружает их один раз,
+    # тот же список потом перебирает шаблон
+    total_businesses = len(businesses)
     active_businesses = businesses.filter(
         last_profit_collected__gte=timezone.now() - timedelta(days=1)
     ).count()
@@ -833,14 +1016,14 @@ def island_profit(request):
     top_businesses = businesses.order_by('-income_per_minute')[:5]
     
     # Последние получения прибыли из логов
-    recent_profits = LogEntry.objects.filter(
+    recent_profits = LogEntry.objects.current().filter(
         action_type='profit',
         table='island'
     ).order_by('-timestamp')[:10]
     
     # Общая прибыль за сегодня
     today = timezone.now().date()
-    today_profits = LogEntry.objects.filter(
+    today_profits = LogEntry.objects.current().filter(
         action_type='profit',
         table='island',
         timestamp__date=today
@@ -848,49 +1031,49 @@ def island_profit(request):
     total_profit_today = sum(float(p.details.get('profit', 0)) for p in today_profits)
     
     if request.method == 'POST':
-        form = BusinessProfitForm(request.POST)
-        if form.is_valid():
-            business = form.cleaned_data['business']
+        with atomic_game_and_log():
+            form = BusinessProfitForm(request.POST)
+            if form.is_valid():
+                business = form.cleaned_data['business']
             
-            # Расчет прибыли
-            if business.building_type == 'factory':
-                minutes = (timezone.now() - business.last_profit_collected).total_seconds() / 60
-                factory_income = float(business.income_per_minute or 50)
-                profit = max(0, round(minutes * factory_income, 2))
-            else:
-                profit = business.calculate_accumulated_profit()
+                # Расчет прибыли
+                if business.building_type == 'factory':
+                    minutes = (timezone.now() - business.last_profit_collected).total_seconds() / 60
+                    factory_income = float(business.income_per_minute or 50)
+                    profit = max(0, round(minutes * factory_income, 2))
+                else:
+                    profit = business.calculate_accumulated_profit()
             
-            if profit > 0:
-                # Сброс таймера
-                business.reset_profit_timer()
+                if profit > 0:
+                    # Сброс таймера
+                    business.reset_profit_timer()
                 
-                # Запись в лог
-                LogEntry.objects.create(
-                    author=request.session.get('username', 'Unknown'),
-                    table='island',
-                    action_type='profit',
-                    player_id=business.owner_id,
-                    details={
-                        'business': business.building_name,
-                        'business_id': business.id,
-                        'building_type': business.building_type,
-                        'profit': profit,
-                        'income_per_minute': float(business.income_per_minute),
-                    }
-                )
+                    # Запись в лог
+                    LogEntry.objects.create(
+                        author=request.session.get('username', 'Unknown'),
+                        table='island',
+                        action_type='profit',
+                        player_id=business.owner_id,
+                        details={
+                            'business': business.building_name,
+                            'business_id': business.id,
+                            'building_type': business.building_type,
+                            'profit': profit,
+                            'income_per_minute': float(business.income_per_minute),
+                        }
+                    )
                 
-                source_label = 'фабрики' if business.building_type == 'factory' else 'бизнеса'
-                messages.success(
-                    request, 
-                    f'Прибыль {profit:.2f} ₽ получена от {source_label} "{business.building_name}" для игрока #{business.owner_id}'
-                )
-            else:
-                messages.warning(request, 'Прибыль еще не накоплена')
+                    source_label = 'фабрики' if business.building_type == 'factory' else 'бизнеса'
+                    messages.success(
+                        request, 
+                        f'Прибыль {profit:.2f} ₽ получена от {source_label} "{business.building_name}" для игрока #{business.owner_id}'
+                    )
+                else:
+                    messages.warning(request, 'Прибыль еще не накоплена')
             
-            return redirect('island_profit')
-        else:
-            messages.error(request, 'Пожалуйста, исправьте ошибки в форме')
-            print(f"Ошибки формы: {form.errors}")
+                return redirect('island_profit')
+            else:
+                messages.error(request, 'Пожалуйста, исправьте ошибки в форме')
     else:
         form = BusinessProfitForm()
     
@@ -910,58 +1093,68 @@ def island_profit(request):
 def island_demolish(request):
     """Снос здания (п. 3.5)"""
     if request.method == 'POST':
-        form = BuildingDemolitionForm(request.POST)
-        if form.is_valid():
-            building = form.cleaned_data['building']
-            demolisher = form.cleaned_data['demolisher_id']
+        with atomic_game_and_log():
+            form = BuildingDemolitionForm(request.POST)
+            if form.is_valid():
+                building = form.cleaned_data['building']
+                demolisher = form.cleaned_data['demolisher_id']
             
-            accumulated = 0
-            if building.building_type == 'business':
-                accumulated = building.calculate_accumulated_profit()
+                accumulated = 0
+                if building.building_type == 'business':
+                    accumulated = building.calculate_accumulated_profit()
             
-            # Сохраняем данные перед удалением
-            building_data = {
-                'id': building.id,
-                'name': building.building_name,
-                'type': building.building_type,
-                'owner': building.owner_id,
-                'accumulated': accumulated
-            }
+                # Сохраняем данные перед удалением
+                building_data = {
+                    'id': building.id,
+                    'name': building.building_name,
+                    'type': building.building_type,
+                    'owner': building.owner_id,
+                    'accumulated': accumulated
+                }
             
-            # Удаляем здание
-            building.delete()
+                # Удаляем здание
+                building.delete()
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='demolition',
-                player_id=demolisher,
-                details={
-                    'building': building_data['name'],
-                    'building_type': building_data['type'],
-                    'owner': building_data['owner'],
-                    'demolisher': demolisher,
-                    'accumulated_profit': accumulated
-                }
-            )
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='demolition',
+                    player_id=demolisher,
+                    details={
+                        'building': building_data['name'],
+                        'building_type': building_data['type'],
+                        'owner': building_data['owner'],
+                        'demolisher': demolisher,
+                        'accumulated_profit': accumulated
+                    }
+                )
             
-            request.session['pending_demolition'] = building_data
-            return redirect('island_demolish_confirm')
+                _set_pending(request, 'pending_demolition', building_data)
+                return redirect('island_demolish_confirm')
     else:
         form = BuildingDemolitionForm()
     
-    buildings = ConstructedBuilding.objects.order_by('-built_at')
+    buildings = ConstructedBuilding.objects.current().order_by('-built_at')
 
-    demolitions_qs = LogEntry.objects.filter(
+    demolitions_qs = LogEntry.objects.current().filter(
         action_type='demolition',
         table='island'
     ).order_by('-timestamp')
 
-    total_demolitions = demolitions_qs.count()
-    demolitions_today = demolitions_qs.filter(timestamp__date=timezone.now().date()).count()
-    total_business_demolitions = demolitions_qs.filter(details__building_type='business').count()
-    total_compensation = sum(float(entry.details.get('accumulated_profit', 0) or 0) for entry in demolitions_qs)
+    def demolition_stats():
+        total_compensation = sum(
+            float(entry.details.get('accumulated_profit', 0) or 0) for entry in demolitions_qs
+        )
+        return {
+            'total_demolitions': demolitions_qs.count(),
+            'demolitions_today': demolitions_qs.filter(timestamp__date=today).count(),
+            'total_business_demolitions': demolitions_qs.filter(_details_match(building_type='business')).count(),
+            'total_compensation': round(total_compensation, 2),
+        }
+
+    today = timezone.now().date()
+    stats = _cached_panel(f'demolition_stats:{today}', (LogEntry,), demolition_stats)
 
     recent_demolitions = demolitions_qs[:20]
     
@@ -969,10 +1162,10 @@ def island_demolish(request):
         'form': form,
         'buildings': buildings,
         'recent_demolitions': recent_demolitions,
-        'total_demolitions': total_demolitions,
-        'demolitions_today': demolitions_today,
-        'total_business_demolitions': total_business_demolitions,
-        'total_compensation': round(total_compensation, 2),
+        **stats,
+        'buildings_version': _panel_version(ConstructedBuilding),
+        'demolitions_version': _panel_version(LogEntry),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     })
 
 
@@ -985,7 +1178,7 @@ def island_demolish_confirm(request):
     
     if request.method == 'POST':
         messages.success(request, 'Здание снесено')
-        del request.session['pending_demolition']
+        _pop_pending(request, 'pending_demolition')
         return redirect('island_dashboard')
     
     return render(request, 'island/demolish_confirm.html', {'demolish': demolish_data})
@@ -997,31 +1190,30 @@ def island_purchase_resource(request):
     if not session_id:
         return redirect('login')
     
-    # Получаем все ресурсы из прайс-листа
-    resources = PriceList.objects.filter(category='resource')
+    # Прайс-лист меняется редко: список держится в памяти процесса до записи на стол
+    resources = state_cached('island', 'resources', lambda: list(PriceList.objects.filter(category='resource')))
     
     # Последние покупки из логов
-    recent_purchases = LogEntry.objects.filter(
+    recent_purchases = LogEntry.objects.current().filter(
         action_type='purchase',
         table='island'
     ).order_by('-timestamp')[:10]
     
     # Статистика за сегодня
     today = timezone.now().date()
-    today_sales = LogEntry.objects.filter(
-        action_type='purchase',
-        table='island',
-        timestamp__date=today
-    ).count()
-    
-    total_revenue = sum(
-        float(p.details.get('total', 0)) 
-        for p in LogEntry.objects.filter(
+
+    def purchase_stats():
+        today_purchases = LogEntry.objects.current().filter(
             action_type='purchase',
             table='island',
             timestamp__date=today
         )
-    )
+        return {
+            'today_sales': today_purchases.count(),
+            'total_revenue': sum(float(p.details.get('total', 0)) for p in today_purchases),
+        }
+
+    stats = _cached_panel(f'purchase_stats:{today}', (LogEntry,), purchase_stats)
     
     if request.method == 'POST':
         form = ResourcePurchaseForm(request.POST)
@@ -1059,14 +1251,14 @@ def island_purchase_resource(request):
                 messages.error(request, 'Продажа ресурса невозможна: у игрока недостаточно запаса.')
             else:
                 # Сохраняем в сессию для подтверждения
-                request.session['pending_purchase'] = {
+                _set_pending(request, 'pending_purchase', {
                     'resource': resource_names.get(resource, resource),
                     'resource_key': resource,
                     'player_id': player_id,
                     'quantity': quantity,
                     'price_per_unit': price_per_unit,
                     'total': total,
-                }
+                })
                 
                 return redirect('island_purchase_confirm')
         else:
@@ -1078,33 +1270,33 @@ def island_purchase_resource(request):
         'form': form,
         'resources': resources,
         'recent_purchases': recent_purchases,
-        'resources_count': resources.count(),
-        'today_sales': today_sales,
-        'total_revenue': total_revenue,
+        'resources_count': len(resources),
+        **stats,
         'session': request.session,
+        'purchases_version': _panel_version(LogEntry),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
     
     return render(request, 'island/purchase_resource.html', context)
 
 # ================ СТОЛ "ВЕЛИКОБРИТАНИЯ" ================
 
+@_state_conditional('britain')
 @session_required
 def britain_dashboard(request):
     """Главная страница стола Великобритания"""
-    # Данные для таблицы кредитов
-    credits = Credit.objects.all()
-    for credit in credits:
-        credit.overdue = credit.is_overdue()
-    
-    # Данные для таблицы каперов
-    privateers = Privateer.objects.filter(is_active=True)
-    for p in privateers:
-        p.tenure_display = str(p.tenure()).split('.')[0]
+    # Таблицы кредитов и каперов шаблон не выводит: запросы ленивые
+    # и не выполняются, пока их не прочитают
+    credits = Credit.objects.current()
+    privateers = Privateer.objects.current().filter(is_active=True)
+    privateer_summary = Privateer.objects.current().summary()
     
     context = {
         'session': request.current_session,
         'credits': credits,
         'privateers': privateers,
+        'privateers_count': privateer_summary['active'],
+        'privateers_payment_due': privateer_summary['payment_due'],
         'price_list': PriceList.objects.filter(category='goods'),
     }
     return render(request, 'britain/dashboard.html', context)
@@ -1123,48 +1315,49 @@ def britain_sale(request):
             
             # Получаем динамическую цену
             try:
-                dynamic_price, created = DynamicPrice.objects.get_or_create(
-                    good_name=good,
-                    defaults={
-                        'current_price': 100,
-                        'pmax': 100,
-                        'n_for_drop': 10,
-                        't_recovery': 300
-                    }
-                )
+                with atomic_game_and_log():
+                    dynamic_price, created = DynamicPrice.objects.get_or_create(
+                        good_name=good,
+                        defaults={
+                            'current_price': 100,
+                            'pmax': 100,
+                            'n_for_drop': 10,
+                            't_recovery': 300
+                        }
+                    )
                 
-                # Проверяем восстановление цены
-                dynamic_price.check_recovery()
+                    # Проверяем восстановление цены
+                    dynamic_price.check_recovery()
                 
-                price_per_unit = dynamic_price.current_price
-                total = quantity * float(price_per_unit)
+                    price_per_unit = dynamic_price.current_price
+                    total = quantity * float(price_per_unit)
                 
-                if money_input >= total:
-                    # Фиксируем продажу (цена упадет)
-                    dynamic_price.record_sale(quantity)
+                    if money_input >= total:
+                        # Фиксируем продажу (цена упадет)
+                        dynamic_price.record_sale(quantity)
                     
-                    change = float(money_input - total)
+                        change = float(money_input) - total
                     
-                    # Запись в лог
-                    LogEntry.objects.create(
-                        author=request.current_user,
-                        table=request.current_table,
-                        action_type='sale',
-                        player_id=player_id,
-                        details={
-                            'good': good,
-                            'quantity': quantity,
-                            'price_per_unit': float(price_per_unit),
-                            'total': total,
-                            'money_input': float(money_input),
-                            'change': change
-                        }
-                    )
+                        # Запись в лог
+                        LogEntry.objects.create(
+                            author=request.current_user,
+                            table=request.current_table,
+                            action_type='sale',
+                            player_id=player_id,
+                            details={
+                                'good': good,
+                                'quantity': quantity,
+                                'price_per_unit': float(price_per_unit),
+                                'total': total,
+                                'money_input': float(money_input),
+                                'change': change
+                            }
+                        )
                     
-                    messages.success(request, f'Продажа завершена. Сдача: {change:.2f}')
-                    return redirect('britain_dashboard')
-                else:
-                    messages.error(request, f'Недостаточно средств. Требуется: {total:.2f}')
+                        messages.success(request, f'Продажа завершена. Сдача: {change:.2f}')
+                        return redirect('britain_dashboard')
+                    else:
+                        messages.error(request, f'Недостаточно средств. Требуется: {total:.2f}')
             except Exception as e:
                 messages.error(request, f'Ошибка: {str(e)}')
     else:
@@ -1194,7 +1387,7 @@ def britain_ship_deal(request):
             if deal_type == 'buy':
                 total = float(price)
                 if money_input >= total:
-                    change = float(money_input - total)
+                    change = float(money_input) - total
                     
                     LogEntry.objects.create(
                         author=request.current_user,
@@ -1249,7 +1442,7 @@ def britain_factory_work(request):
             
             # Стоимость шестерни
             try:
-                price_item = PriceList.objects.get(category='gear')
+                price_item = PriceList.objects.get(category='gear', name='Шестерня')
                 gear_price = price_item.base_price
             except PriceList.DoesNotExist:
                 gear_price = 2  # По умолчанию
@@ -1257,7 +1450,7 @@ def britain_factory_work(request):
             total = quantity * float(gear_price)
             
             if money_input >= total:
-                change = float(money_input - total)
+                change = float(money_input) - total
                 
                 LogEntry.objects.create(
                     author=request.current_user,
@@ -1283,59 +1476,63 @@ def britain_factory_work(request):
     return render(request, 'britain/factory_work.html', {'form': form})
 
 
+@_state_conditional('britain', clock=60)
 @session_required
 def britain_credits(request):
     """Таблица кредитов (п. 2.4)"""
-    credits = Credit.objects.all()
-    for credit in credits:
-        credit.time_since = credit.time_since_last_payment()
-        credit.overdue = credit.is_overdue()
+    credits = Credit.objects.current()
     
-    return render(request, 'britain/credits.html', {'credits': credits})
+    return render(request, 'britain/credits.html', {
+        'credits': credits,
+        # Статус просрочки зависит от времени - таблица живет не дольше минуты
+        'panel_version': _panel_version(Credit, clock=60),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    })
 
 
 @session_required
 def britain_credit_issue(request):
     """Выдача кредита (п. 2.4.1)"""
     if request.method == 'POST':
-        form = CreditIssueForm(request.POST)
-        if form.is_valid():
-            player_id = form.cleaned_data['player_id']
-            amount = form.cleaned_data['credit_amount']
-            term = int(form.cleaned_data['term'])
+        with atomic_game_and_log():
+            form = CreditIssueForm(request.POST)
+            if form.is_valid():
+                player_id = form.cleaned_data['player_id']
+                amount = form.cleaned_data['credit_amount']
+                term = int(form.cleaned_data['term'])
             
-            monthly = (amount / term) * Decimal('1.5')
+                monthly = (amount / term) * Decimal('1.5')
             
-            # Создаем кредит
-            credit = Credit.objects.create(
-                player_id=player_id,
-                credit_amount=amount,
-                term_months=term,
-                monthly_payment=monthly,
-                remaining_payments=term,
-                issued_by=request.current_user
-            )
+                # Создаем кредит
+                credit = Credit.objects.create(
+                    player_id=player_id,
+                    credit_amount=amount,
+                    term_months=term,
+                    monthly_payment=monthly,
+                    remaining_payments=term,
+                    issued_by=request.current_user
+                )
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='credit_issue',
-                player_id=player_id,
-                details={
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='credit_issue',
+                    player_id=player_id,
+                    details={
+                        'amount': float(amount),
+                        'term': term,
+                        'monthly': float(monthly)
+                    }
+                )
+            
+                _set_pending(request, 'pending_credit', {
+                    'player_id': player_id,
                     'amount': float(amount),
                     'term': term,
                     'monthly': float(monthly)
-                }
-            )
-            
-            request.session['pending_credit'] = {
-                'player_id': player_id,
-                'amount': float(amount),
-                'term': term,
-                'monthly': float(monthly)
-            }
-            return redirect('britain_credit_confirm')
+                })
+                return redirect('britain_credit_confirm')
     else:
         form = CreditIssueForm()
     
@@ -1351,7 +1548,7 @@ def britain_credit_confirm(request):
     
     if request.method == 'POST':
         messages.success(request, 'Кредит выдан')
-        del request.session['pending_credit']
+        _pop_pending(request, 'pending_credit')
         return redirect('britain_credits')
     
     return render(request, 'britain/credit_confirm.html', {'credit': credit_data})
@@ -1361,35 +1558,36 @@ def britain_credit_confirm(request):
 def britain_credit_payment(request):
     """Внесение платежа по кредиту (п. 2.4.2)"""
     if request.method == 'POST':
-        form = CreditPaymentForm(request.POST)
-        if form.is_valid():
-            credit = form.cleaned_data['debtor']
-            amount = form.cleaned_data['payment_amount']
+        with atomic_game_and_log():
+            form = CreditPaymentForm(request.POST)
+            if form.is_valid():
+                credit = form.cleaned_data['debtor']
+                amount = form.cleaned_data['payment_amount']
             
-            # Вносим платеж
-            closed = credit.make_payment(amount)
+                # Вносим платеж
+                closed = credit.make_payment(amount)
             
-            if closed:
-                credit.delete()
-                messages.success(request, f'Кредит полностью погашен!')
-            else:
-                credit.save()
-                messages.success(request, f'Платеж принят. Осталось платежей: {credit.remaining_payments}')
+                if closed:
+                    credit.delete()
+                    messages.success(request, f'Кредит полностью погашен!')
+                else:
+                    credit.save()
+                    messages.success(request, f'Платеж принят. Осталось платежей: {credit.remaining_payments}')
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='credit_payment',
-                player_id=credit.player_id,
-                details={
-                    'amount': float(amount),
-                    'remaining': credit.remaining_payments if not closed else 0,
-                    'closed': closed
-                }
-            )
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='credit_payment',
+                    player_id=credit.player_id,
+                    details={
+                        'amount': float(amount),
+                        'remaining': credit.remaining_payments if not closed else 0,
+                        'closed': closed
+                    }
+                )
             
-            return redirect('britain_credits')
+                return redirect('britain_credits')
     else:
         form = CreditPaymentForm()
     
@@ -1431,56 +1629,70 @@ def britain_coal(request):
     return render(request, 'britain/coal.html', {'form': form})
 
 
+@_state_conditional('britain', clock=60)
 @session_required
 def britain_privateers(request):
-    """Таблица каперов (п. 2.6)"""
-    privateers = Privateer.objects.filter(is_active=True)
-    return render(request, 'britain/privateers.html', {'privateers': privateers})
+    """Таблица каперов (п. 2.6): рейтинг и карточки - по одному запросу на любое число лицензий"""
+    summary = Privateer.objects.current().summary()
+    return render(request, 'britain/privateers.html', {
+        # Выполняется, только если фрагмента таблицы нет в кэше
+        'privateers': Privateer.objects.current().standings(),
+        'total_privateers': summary['total'],
+        'active_privateers_count': summary['active'],
+        'privateers_with_complaints': summary['with_complaints'],
+        'privateers_payment_due': summary['payment_due'],
+        'total_tenure': summary['total_tenure'].days,
+        'panel_version': _panel_version(Privateer, clock=60),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    })
 
 
 @session_required
 def britain_privateer_license(request):
     """Выдача/разжалование капера (п. 2.6.1)"""
     if request.method == 'POST':
-        form = PrivateerLicenseForm(request.POST)
-        if form.is_valid():
-            action = form.cleaned_data['action']
-            player_id = form.cleaned_data['player_id']
-            ship_type = form.cleaned_data.get('ship_type')
+        with atomic_game_and_log():
+            form = PrivateerLicenseForm(request.POST)
+            if form.is_valid():
+                action = form.cleaned_data['action']
+                player_id = form.cleaned_data['player_id']
+                ship_type = form.cleaned_data.get('ship_type')
+            
+                if action == 'issue':
+                    # Выдача лицензии
+                    privateer, created = Privateer.objects.current().get_or_create(
+                        player_id=player_id,
+                        defaults={
+                            'ship_type': ship_type,
+                            'licensed_by': request.current_user,
+                            'is_active': True
+                        }
+                    )
+                    if not created:
+                        # Только флаг: остальные поля могли измениться после чтения
+                        privateer.is_active = True
+                        privateer.save(update_fields=['is_active'])
+                
+                    messages.success(request, f'Лицензия выдана игроку {player_id}')
+                else:
+                    # Разжалование
+                    Privateer.objects.current().filter(player_id=player_id, is_active=True).update(is_active=False)
+                    bump(Privateer)
+                    messages.success(request, f'Игрок {player_id} разжалован')
             
-            if action == 'issue':
-                # Выдача лицензии
-                privateer, created = Privateer.objects.get_or_create(
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='privateer_license',
                     player_id=player_id,
-                    defaults={
-                        'ship_type': ship_type,
-                        'licensed_by': request.current_user,
-                        'is_active': True
+                    details={
+                        'action': action,
+                        'ship_type': ship_type if action == 'issue' else None
                     }
                 )
-                if not created:
-                    privateer.is_active = True
-                    privateer.save()
-                
-                messages.success(request, f'Лицензия выдана игроку {player_id}')
-            else:
-                # Разжалование
-                Privateer.objects.filter(player_id=player_id, is_active=True).update(is_active=False)
-                messages.success(request, f'Игрок {player_id} разжалован')
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='privateer_license',
-                player_id=player_id,
-                details={
-                    'action': action,
-                    'ship_type': ship_type if action == 'issue' else None
-                }
-            )
-            
-            return redirect('britain_privateers')
+                return redirect('britain_privateers')
     else:
         form = PrivateerLicenseForm()
     
@@ -1491,29 +1703,30 @@ def britain_privateer_license(request):
 def britain_privateer_change_ship(request):
     """Смена корабля капера (п. 2.6.2)"""
     if request.method == 'POST':
-        form = PrivateerChangeShipForm(request.POST)
-        if form.is_valid():
-            privateer = form.cleaned_data['privateer']
-            new_ship = form.cleaned_data['new_ship']
+        with atomic_game_and_log():
+            form = PrivateerChangeShipForm(request.POST)
+            if form.is_valid():
+                privateer = form.cleaned_data['privateer']
+                new_ship = form.cleaned_data['new_ship']
             
-            old_ship = privateer.ship_type
-            privateer.ship_type = new_ship
-            privateer.save()
+                old_ship = privateer.ship_type
+                privateer.ship_type = new_ship
+                privateer.save()
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='privateer_ship',
-                player_id=privateer.player_id,
-                details={
-                    'old_ship': old_ship,
-                    'new_ship': new_ship
-                }
-            )
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='privateer_ship',
+                    player_id=privateer.player_id,
+                    details={
+                        'old_ship': old_ship,
+                        'new_ship': new_ship
+                    }
+                )
             
-            messages.success(request, f'Корабль изменен')
-            return redirect('britain_privateers')
+                messages.success(request, f'Корабль изменен')
+                return redirect('britain_privateers')
     else:
         form = PrivateerChangeShipForm()
     
@@ -1524,63 +1737,117 @@ def britain_privateer_change_ship(request):
 def britain_privateer_complaint(request):
     """Подача жалобы на капера (п. 2.6.3)"""
     if request.method == 'POST':
-        form = PrivateerComplaintForm(request.POST)
-        if form.is_valid():
-            privateer = form.cleaned_data['privateer']
-            value = form.cleaned_data['complaint_value']
+        with atomic_game_and_log():
+            form = PrivateerComplaintForm(request.POST)
+            if form.is_valid():
+                privateer = form.cleaned_data['privateer']
+                value = form.cleaned_data['complaint_value']
             
-            privateer.add_complaint(value)
+                _log_complaint(request, privateer, value, privateer.add_complaint(value))
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='privateer_complaint',
-                player_id=privateer.player_id,
-                details={
-                    'value': value,
-                    'new_total': privateer.complaints
-                }
-            )
-            
-            messages.success(request, f'Жалоба зарегистрирована')
-            return redirect('britain_privateers')
+                messages.success(request, f'Жалоба зарегистрирована')
+                return redirect('britain_privateers')
     else:
         form = PrivateerComplaintForm()
     
     return render(request, 'britain/privateer_complaint.html', {'form': form})
 
 
+def _log_complaint(request, privateer, value, new_total):
+    LogEntry.objects.create(
+        author=request.current_user,
+        table=request.current_table,
+        action_type='privateer_complaint',
+        player_id=privateer.player_id,
+        details={
+            'value': value,
+            'new_total': new_total
+        }
+    )
+
+
+@session_required
+@require_POST
+def api_privateer_complaints(request):
+    """
+    API: несколько жалоб одним запросом, в одной транзакции.
+    Тело - JSON {"adjustments": [{"privateer_id": 1, "value": -2}, ...]};
+    ответ - новое число жалоб каждого капера. Если хотя бы одна поправка
+    некорректна, не применяется ни одна.
+    """
+    try:
+        adjustments = [
+            (int(item['privateer_id']), int(item['value']))
+            for item in json.loads(request.body)['adjustments']
+        ]
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'success': False, 'error': 'Неверный формат поправок'}, status=400)
+
+    with atomic_game_and_log():
+        privateers = Privateer.objects.current().filter(is_active=True).in_bulk(
+            {privateer_id for privateer_id, _ in adjustments}
+        )
+        missing = sorted({privateer_id for privateer_id, _ in adjustments} - set(privateers))
+        if not adjustments or missing:
+            return JsonResponse({'success': False, 'error': 'Капер не найден', 'missing': missing}, status=400)
+
+        # Один UPDATE на капера с суммой его поправок, затем одно чтение итогов;
+        # new_total каждой записи журнала - итог минус более поздние поправки
+        sums = {}
+        for privateer_id, value in adjustments:
+            sums[privateer_id] = sums.get(privateer_id, 0) + value
+        for privateer_id, value in sums.items():
+            Privateer.objects.filter(pk=privateer_id).update(complaints=F('complaints') + value)
+        bump(Privateer)
+        totals = dict(Privateer.objects.filter(pk__in=sums).values_list('id', 'complaints'))
+
+        running = dict(totals)
+        entries = []
+        for privateer_id, value in reversed(adjustments):
+            entries.append(LogEntry(
+                author=request.current_user,
+                table=request.current_table,
+                action_type='privateer_complaint',
+                player_id=privateers[privateer_id].player_id,
+                details={'value': value, 'new_total': running[privateer_id]},
+            ))
+            running[privateer_id] -= value
+        LogEntry.objects.bulk_create(entries[::-1])
+        bump(LogEntry, instance=entries[0])
+        return JsonResponse({'success': True, 'complaints': totals})
+
+
 @session_required
 def britain_privateer_payment(request):
     """Внесение платежа капером (п. 2.6.4)"""
     if request.method == 'POST':
-        form = PrivateerPaymentForm(request.POST)
-        if form.is_valid():
-            privateer = form.cleaned_data['privateer']
+        with atomic_game_and_log():
+            form = PrivateerPaymentForm(request.POST)
+            if form.is_valid():
+                privateer = form.cleaned_data['privateer']
             
-            # Фиксированная сумма платежа
-            try:
-                price_item = PriceList.objects.get(name='Каперский платеж')
-                payment_amount = price_item.base_price
-            except PriceList.DoesNotExist:
-                payment_amount = 50  # По умолчанию
+                # Фиксированная сумма платежа
+                try:
+                    price_item = PriceList.objects.get(name='Каперский платеж')
+                    payment_amount = price_item.base_price
+                except PriceList.DoesNotExist:
+                    payment_amount = 50  # По умолчанию
             
-            privateer.make_payment()
+                privateer.make_payment()
             
-            # Запись в лог
-            LogEntry.objects.create(
-                author=request.current_user,
-                table=request.current_table,
-                action_type='privateer_payment',
-                player_id=privateer.player_id,
-                details={
-                    'amount': float(payment_amount)
-                }
-            )
+                # Запись в лог
+                LogEntry.objects.create(
+                    author=request.current_user,
+                    table=request.current_table,
+                    action_type='privateer_payment',
+                    player_id=privateer.player_id,
+                    details={
+                        'amount': float(payment_amount)
+                    }
+                )
             
-            messages.success(request, f'Платеж принят')
-            return redirect('britain_privateers')
+                messages.success(request, f'Платеж принят')
+                return redirect('britain_privateers')
     else:
         form = PrivateerPaymentForm()
     
@@ -1623,7 +1890,7 @@ def api_get_building_profit(request):
     """API для получения накопленной прибыли здания"""
     building_id = request.GET.get('building_id')
     try:
-        building = ConstructedBuilding.objects.get(id=building_id)
+        building = ConstructedBuilding.objects.current().get(id=building_id)
         profit = building.calculate_accumulated_profit()
         return JsonResponse({
             'success': True,
@@ -1640,7 +1907,7 @@ def api_get_convict_time(request):
     """API для получения времени на каторге"""
     convict_id = request.GET.get('convict_id')
     try:
-        convict = Convict.objects.get(id=convict_id)
+        convict = Convict.objects.current().get(id=convict_id)
         time_served = timezone.now() - convict.sentenced_at
         seconds = int(time_served.total_seconds())
         return JsonResponse({
@@ -1652,6 +1919,263 @@ def api_get_convict_time(request):
         return JsonResponse({'success': False, 'error': 'Каторжник не найден'})
 
 
+@session_required
+def api_get_convict_times(request):
+    """
+    API: выслуга и остаток срока всех каторжников игры одним ответом.
+    Страница выхода с каторги берет его один раз и дальше считает секунды сама.
+    """
+    now = timezone.now()
+    convicts = Convict.objects.current().order_by('release_due_at').values_list(
+        'id', 'player_id', 'sentenced_at', 'release_due_at'
+    )
+    return JsonResponse({
+        'success': True,
+        'now': now.isoformat(),
+        'convicts': [
+            {
+                'id': convict_id,
+                'player_id': player_id,
+                'served_seconds': int((now - sentenced_at).total_seconds()),
+                'remaining_seconds': max(0, int((due_at - now).total_seconds())) if due_at else None,
+            }
+            for convict_id, player_id, sentenced_at, due_at in convicts
+        ],
+    })
+
+
+def _timer_rows(queryset, fields):
+    """Строки таймеров: время - секунды Unix, деньги - числа, чтобы клиент считал сам."""
+    def plain(value):
+        if hasattr(value, 'timestamp'):
+            return int(value.timestamp())
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+    return {
+        'fields': fields,
+        'rows': [[plain(value) for value in row] for row in queryset.values_list(*fields)],
+    }
+
+
+@_state_conditional(lambda request: request.GET.get('table'))
+@session_required
+def api_get_timers(request):
+    """
+    API: опорные моменты всех таймеров стола одним ответом.
+
+    Вместо запроса на каждый объект (прибыль здания, время на каторге)
+    страница берет время приговоров, платежей и сбора прибыли, доход в
+    минуту и время сервера now, тикает сама и обновляет данные изредка.
+    Пока на стол не писали, ответ - 304, и тело с now берется из кэша
+    браузера; поэтому клиент сверяет часы по заголовку Date.
+    """
+    table = request.GET.get('table') or request.current_table
+    if table not in dict(LogEntry.TABLE_CHOICES):
+        return JsonResponse({'success': False, 'error': 'Неизвестный стол'}, status=400)
+
+    payload = {'success': True, 'table': table, 'now': round(time.time(), 3)}
+    if table == 'island':
+        payload['convicts'] = _timer_rows(
+            Convict.objects.current().order_by('release_due_at'),
+            ['id', 'player_id', 'sentenced_at', 'release_due_at'],
+        )
+        payload['buildings'] = _timer_rows(
+            ConstructedBuilding.objects.current().filter(building_type='business').order_by('id'),
+            ['id', 'owner_id', 'last_profit_collected', 'income_per_minute'],
+        )
+    else:
+        payload['credit_overdue_seconds'] = Credit.OVERDUE_SECONDS
+        payload['privateer_due_seconds'] = Privateer.PAYMENT_DUE_SECONDS
+        payload['credits'] = _timer_rows(
+            Credit.objects.current().order_by('id'),
+            ['id', 'player_id', 'last_payment_at', 'monthly_payment', 'remaining_payments'],
+        )
+        payload['privateers'] = _timer_rows(
+            Privateer.objects.current().filter(is_active=True).order_by('id'),
+            ['id', 'player_id', 'licensed_at', 'last_payment_at'],
+        )
+    return JsonResponse(payload)
+
+
+def _chart_points(request, default=200):
+    """?points= графика: не больше точек на ряд, от 3 до 1000."""
+    try:
+        return min(max(int(request.GET.get('points') or default), 3), 1000)
+    except ValueError:
+        raise ValueError('points - целое число')
+
+
+def _chart_moment(request, param):
+    """?from= или ?to= графика (формат replay.parse_at); None, если не задан."""
+    if not request.GET.get(param):
+        return None
+    try:
+        return replay.parse_at(request.GET[param])
+    except ValueError:
+        raise ValueError(f'Не удалось разобрать {param}')
+
+
+@_state_conditional('britain')
+@session_required
+def api_price_history(request):
+    """
+    API: история динамических цен для графика.
+
+    ?good=<ключ> - один товар (по умолчанию все), ?from= и ?to= - отрезок
+    времени (ISO 8601), ?points= - не больше точек на товар (3..1000,
+    по умолчанию 200), ?method=lttb|minmax - способ прореживания
+    (munepit/downsample.py). Ряд - [[unix-время, цена], ...]; первая и
+    последняя точки отрезка сохраняются всегда.
+    """
+    method = DOWNSAMPLE_METHODS.get(request.GET.get('method') or 'lttb')
+    if method is None:
+        return JsonResponse({'success': False, 'error': 'Неизвестный способ прореживания'}, status=400)
+    try:
+        points = _chart_points(request)
+        start, end = _chart_moment(request, 'from'), _chart_moment(request, 'to')
+    except ValueError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+
+    history = PriceHistory.objects.filter(game_id=_selected_game_id(request))
+    if request.GET.get('good'):
+        history = history.filter(good_name=request.GET['good'])
+    if start:
+        history = history.filter(timestamp__gte=start)
+    if end:
+        history = history.filter(timestamp__lte=end)
+
+    series = {}
+    rows = history.order_by('good_name', 'timestamp', 'id').values_list('good_name', 'timestamp', 'price')
+    for good, timestamp, price in rows.iterator(chunk_size=2000):
+        series.setdefault(good, []).append((round(timestamp.timestamp(), 3), float(price)))
+    return JsonResponse({
+        'success': True,
+        'series': {good: [list(point) for point in method(values, points)] for good, values in series.items()},
+    })
+
+# Корзины рядов статистики в SQL: начало минуты, часа или дня
+_TRUNC = {'minute': TruncMinute, 'hour': TruncHour, 'day': TruncDay}
+
+
+@_report_view
+def api_statistics_series(request):
+    """
+    API: ряды графиков статистики - число операций и сумма по времени.
+
+    Отрезок - ?from= и ?to= или последние ?days= дней (по умолчанию 30),
+    ?table= - один стол, ?game= - игра из архива. Корзина - минута, час
+    или день (downsample.bucket_unit), чтобы корзин было не больше
+    ?points=; счет и сумма по корзинам - один GROUP BY по диапазону
+    индекса журнала. Ряды: [[unix-время начала корзины, значение], ...],
+    пустые корзины пропущены.
+    """
+    if not request.session.get('session_id'):
+        return redirect('login')
+    table = request.GET.get('table')
+    if table and table not in dict(LogEntry.TABLE_CHOICES):
+        return JsonResponse({'success': False, 'error': 'Неизвестный стол'}, status=400)
+    try:
+        points = _chart_points(request)
+        end = _chart_moment(request, 'to') or timezone.now()
+        start = _chart_moment(request, 'from') or end - timedelta(days=int(request.GET.get('days') or 30))
+    except ValueError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+
+    unit, step = bucket_unit(start, end, points)
+    logs = LogEntry.objects.filter(game_id=_selected_game_id(request), timestamp__gte=start, timestamp__lte=end)
+    if table:
+        logs = logs.filter(table=table)
+    rows = logs.annotate(
+        bucket=_TRUNC[unit]('timestamp'), amount=ledger.OPERATION_AMOUNT,
+    ).values('bucket').annotate(
+        count=Count('id'), total=Sum('amount', filter=Q(amount__gt=0)),
+    ).order_by('bucket').values_list('bucket', 'count', 'total')
+    buckets = merge_buckets(
+        [(int(bucket.timestamp()), count, total) for bucket, count, total in rows],
+        step, dict(UNITS)[unit],
+    )
+    return JsonResponse({
+        'success': True,
+        'unit': unit,
+        'step': step,
+        'counts': [[at, count] for at, count, _ in buckets],
+        'sums': [[at, round(total, 2)] for at, _, total in buckets if total],
+    })
+
+@session_required
+def report_jobs(request):
+    """
+    Фоновые отчеты: заказ и последние задачи с ходом построения.
+
+    Отчет строит manage.py run_jobs (munepit/jobs.py), страница только
+    ставит задачу и опрашивает api_report_job. Параметры формы можно
+    передать в адресе (?kind=player_export&player_id=...).
+    """
+    if request.method == 'POST':
+        form = ReportJobForm(request.POST)
+        if form.is_valid():
+            job, created = jobs.submit(
+                form.cleaned_data['kind'], form.params(Game.current_id()), request.current_user,
+            )
+            if created:
+                messages.success(request, f'Отчет #{job.pk} поставлен в очередь')
+            else:
+                messages.info(request, f'Такой отчет уже есть: #{job.pk}')
+            return redirect('report_jobs')
+    else:
+        form = ReportJobForm(initial=request.GET.dict())
+
+    return render(request, 'munepit/report_jobs.html', {
+        'form': form,
+        'jobs': ReportJob.objects.order_by('-created_at')[:20],
+        'titles': {kind: title for kind, (title, _) in jobs.REPORTS.items()},
+    })
+
+
+@session_required
+def api_report_job(request, pk):
+    """API: статус и ход фонового отчета для опроса со страницы."""
+    job = ReportJob.objects.filter(pk=pk).first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Отчет не найден'}, status=404)
+    return JsonResponse({
+        'success': True,
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error,
+        'download_url': reverse('report_job_download', args=[job.pk]) if job.status == 'done' else None,
+    })
+
+
+@session_required
+def report_job_download(request, pk):
+    """Готовый файл фонового отчета."""
+    job = get_object_or_404(ReportJob, pk=pk, status='done')
+    try:
+        source = open(jobs.result_path(job), 'rb')
+    except OSError:
+        raise Http404('Файл отчета удален')
+    return FileResponse(
+        source, as_attachment=True, filename=f'{job.kind}-{job.pk}.csv', content_type='text/csv; charset=utf-8',
+    )
+
+@session_required
+def api_lanes(request):
+    """API: занятость и задержки полос запросов этого процесса (munepit/lanes.py)."""
+    return JsonResponse({
+        'success': True,
+        'limits': {
+            'report_lane_limit': settings.REPORT_LANE_LIMIT,
+            'report_lane_wait': settings.REPORT_LANE_WAIT,
+            'cash_lane_busy': settings.CASH_LANE_BUSY,
+        },
+        'lanes': lanes.stats(),
+    })
+
 @session_required
 def api_get_dynamic_price(request):
     """API для получения динамической цены товара"""
@@ -1674,4 +2198,43 @@ def api_get_dynamic_price(request):
             'sales': price.sales_count
         })
     except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)})
+
+
+# Сжатые копии, которые build_static кладет рядом с файлом, в порядке предпочтения
+_STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# nepit.3f2a9c1b7e4d.js - имя с хешем содержимого (ManifestStaticFilesStorage)
+_HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^.]+$')
+
+
+def static_asset(request, path):
+    """
+    Статика из STATIC_ROOT (после build_static).
+
+    Имена с хешем содержимого кэшируются клиентом на STATIC_MAX_AGE как
+    immutable, остальные перепроверяются на каждом запросе. Если клиент
+    принимает br/gzip и рядом лежит сжатая копия, отдается она.
+    """
+    root = Path(settings.STATIC_ROOT).resolve()
+    target = (root / path).resolve()
+    if root not in target.parents or not target.is_file():
+        raise Http404('Нет такого файла')
+
+    content_type = mimetypes.guess_type(target.name)[0] or 'application/octet-stream'
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    source, encoding = target, None
+    for name, suffix in _STATIC_ENCODINGS:
+        compressed = target.with_name(target.name + suffix)
+        if re.search(rf'\b{name}\b', accept_encoding) and compressed.is_file():
+            source, encoding = compressed, name
+            break
+
+    response = FileResponse(source.open('rb'), content_type=content_type, filename=target.name)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if _HASHED_NAME_RE.search(target.name):
+        patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
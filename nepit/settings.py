@@ -41,6 +41,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # HTML страниц сжимается в 4-5 раз; первым - чтобы сжимать уже готовый ответ
+    'django.middleware.gzip.GZipMiddleware',
+    # Кассы и отчеты - разные полосы: отчет не начинается, пока кассы заняты
+    'munepit.lanes.LaneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,13 +77,179 @@ WSGI_APPLICATION = 'nepit.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Бэкенд выбирается переменной окружения NEPIT_DB_BACKEND:
+#   sqlite   - файл db.sqlite3 (по умолчанию, один писатель за раз)
+#   postgres - PostgreSQL, нужен пакет psycopg[binary,pool]
+# Параметры PostgreSQL: NEPIT_PG_NAME, NEPIT_PG_USER, NEPIT_PG_PASSWORD,
+# NEPIT_PG_HOST, NEPIT_PG_PORT. NEPIT_PG_POOL=1 (по умолчанию) включает пул
+# соединений psycopg; с NEPIT_PG_POOL=0 соединения держатся между запросами
+# (CONN_MAX_AGE) - Django не позволяет совмещать пул и постоянные соединения.
+
+DB_BACKEND = os.environ.get('NEPIT_DB_BACKEND', 'sqlite')
+
+if DB_BACKEND == 'postgres':
+    PG_POOL = os.environ.get('NEPIT_PG_POOL', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('NEPIT_PG_NAME', 'nepit'),
+            'USER': os.environ.get('NEPIT_PG_USER', 'nepit'),
+            'PASSWORD': os.environ.get('NEPIT_PG_PASSWORD', ''),
+            'HOST': os.environ.get('NEPIT_PG_HOST', 'localhost'),
+            'PORT': os.environ.get('NEPIT_PG_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if PG_POOL else int(os.environ.get('NEPIT_PG_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': not PG_POOL,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('NEPIT_PG_POOL_MIN', '2')),
+                    'max_size': int(os.environ.get('NEPIT_PG_POOL_MAX', '20')),
+                    'timeout': 10,
+                } if PG_POOL else False,
+            },
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Транзакции сразу берут блокировку записи и ждут ее timeout секунд:
+                # в режиме DEFERRED повышение блокировки внутри транзакции
+                # при конкуренции сразу падает с "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+                # WAL: чтение не блокирует запись и наоборот
+                'init_command': 'PRAGMA journal_mode=WAL;',
+            },
+        }
+    }
+
+# Журнал операций (LogEntry), сессии столов (UserSession) и django_session
+# живут в отдельной базе 'log' (см. munepit/routers.py): запись журнала почти
+# на каждом запросе не держит блокировку базы с ценами, кредитами и зданиями.
+# Выключено по умолчанию: журнал существующей базы нужно перенести, иначе
+# страницы читали бы пустую базу журнала. Включается явно (NEPIT_SPLIT_LOG=1),
+# полезнее всего на SQLite, где блокировка одна на файл; на существующей базе
+# сразу после включения:
+#   python manage.py migrate --database log && python manage.py split_log
+# Пока журнал не перенесен, проверка munepit.E001 не дает запустить сервер.
+
+SPLIT_LOG_DATABASE = os.environ.get('NEPIT_SPLIT_LOG', '0') == '1'
+
+if SPLIT_LOG_DATABASE:
+    DATABASES['log'] = dict(DATABASES['default'])
+    if DB_BACKEND == 'postgres':
+        DATABASES['log']['NAME'] = os.environ.get('NEPIT_PG_LOG_NAME', 'nepit_log')
+    else:
+        DATABASES['log']['NAME'] = BASE_DIR / 'log.sqlite3'
+
+# Отчеты (статистика, журнал операций, карточка игрока) читают снимок базы,
+# а не рабочую базу столов: долгие сканы не держат транзакции чтения, которые
+# задерживают checkpoint WAL. Снимок делается SQLite online backup API
+# (munepit/snapshots.py) и обновляется в фоне не чаще, чем раз в
+# NEPIT_REPORT_SNAPSHOT_INTERVAL секунд; 0 - отчеты читают рабочую базу.
+# Писать в снимок нельзя: LogRouter.db_for_write всегда выбирает рабочую базу,
+# а соединение со снимком открывается с PRAGMA query_only - запись по явному
+# using() тоже падает.
+
+REPORT_SNAPSHOT_DIR = BASE_DIR / '.snapshots'
+REPORT_SNAPSHOT_INTERVAL = int(os.environ.get('NEPIT_REPORT_SNAPSHOT_INTERVAL', '60'))
+REPORT_SNAPSHOTS = {}
+
+if DB_BACKEND == 'sqlite' and REPORT_SNAPSHOT_INTERVAL > 0:
+    for source in list(DATABASES):
+        snapshot = 'reports' if source == 'default' else f'reports_{source}'
+        DATABASES[snapshot] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': REPORT_SNAPSHOT_DIR / f'{source}.sqlite3',
+        }
+        REPORT_SNAPSHOTS[source] = snapshot
+
+DATABASE_ROUTERS = ['munepit.routers.LogRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'sessions',
+        'TIMEOUT': 60 * 60 * 24,
+    },
+    # Метки версий для кэша фрагментов (munepit/fragments.py): общие для
+    # всех воркеров, иначе запись в одном не сбросит фрагменты другого
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'versions',
+        'TIMEOUT': None,
+    },
 }
 
+# Сами фрагменты живут в кэше default; срок жизни ограничивает их число
+# после смены версий и устаревание данных, которые меняются со временем
+FRAGMENT_VERSION_CACHE = 'versions'
+FRAGMENT_CACHE_TIMEOUT = 600
+
+
+# Игровое время
+# Год срока каторги в реальных секундах: из него считается Convict.release_due_at.
+# После изменения на идущей игре сроки пересчитывает manage.py reschedule_convicts
+
+CONVICT_SECONDS_PER_YEAR = int(os.environ.get('NEPIT_CONVICT_SECONDS_PER_YEAR', '600'))
+
+# Восстановление состояния на момент времени (munepit/replay.py): контрольная
+# точка пишется через каждые REPLAY_CHECKPOINT_EVERY записей журнала, но не
+# ближе REPLAY_CHECKPOINT_LAG секунд к текущему времени - туда еще могут
+# попасть записи из незавершенных транзакций
+REPLAY_CHECKPOINT_EVERY = int(os.environ.get('NEPIT_REPLAY_CHECKPOINT_EVERY', '1000'))
+REPLAY_CHECKPOINT_LAG = 60
+
+# Фоновые отчеты (munepit/jobs.py): годовая статистика, выгрузка игрока и
+# итоги игры строит отдельный процесс manage.py run_jobs, а не воркер,
+# который обслуживает кассы. Готовые файлы лежат в REPORT_JOB_DIR; отчет
+# с теми же параметрами REPORT_JOB_CACHE_SECONDS отдается готовым. Задача,
+# которая не обновлялась REPORT_JOB_STALE_SECONDS (обработчик упал),
+# возвращается в очередь.
+REPORT_JOB_DIR = BASE_DIR / '.jobs'
+REPORT_JOB_CACHE_SECONDS = int(os.environ.get('NEPIT_REPORT_JOB_CACHE_SECONDS', '300'))
+REPORT_JOB_STALE_SECONDS = 600
+
+# Полосы запросов (munepit/lanes.py): отчетов одновременно не больше
+# REPORT_LANE_LIMIT (0 - без ограничения) на процесс, и новый отчет ждет,
+# пока в кассах CASH_LANE_BUSY и больше запросов. Не дождавшись за
+# REPORT_LANE_WAIT секунд, отчет получает 503 с Retry-After. Кассы не
+# ограничиваются никогда.
+REPORT_LANE_LIMIT = int(os.environ.get('NEPIT_REPORT_LANE_LIMIT', '2'))
+REPORT_LANE_WAIT = float(os.environ.get('NEPIT_REPORT_LANE_WAIT', '5'))
+CASH_LANE_BUSY = int(os.environ.get('NEPIT_CASH_LANE_BUSY', '4'))
+
+
+# Sessions
+# Сессии столов не должны писать в тот же SQLite-файл, что и журнал игры:
+# каждое подтверждение операции иначе превращается в UPDATE django_session.
+# Движок выбирается переменной окружения NEPIT_SESSION_BACKEND:
+#   cookie - подписанная cookie (по умолчанию, без обращений к серверу)
+#   file   - файловый кэш, общий для всех воркеров на одной машине
+#   memory - кэш в памяти процесса (только для одного воркера)
+#   db     - стандартные сессии в базе данных
+
+SESSION_BACKENDS = {
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+    'file': 'django.contrib.sessions.backends.cache',
+    'memory': 'django.contrib.sessions.backends.cache',
+    'db': 'django.contrib.sessions.backends.db',
+}
+
+SESSION_BACKEND = os.environ.get('NEPIT_SESSION_BACKEND', 'cookie')
+SESSION_ENGINE = SESSION_BACKENDS[SESSION_BACKEND]
+SESSION_CACHE_ALIAS = 'default' if SESSION_BACKEND == 'memory' else 'sessions'
+SESSION_COOKIE_HTTPONLY = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -116,3 +286,22 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Стили и сценарии страниц - общие файлы munepit/static/munepit/{css,js}.
+# python manage.py build_static собирает их в STATIC_ROOT с хешем
+# содержимого в имени (nepit.3f2a9c1b7e4d.js) и сжатыми копиями .gz/.br;
+# такие имена отдаются с Cache-Control на год (munepit.views.static_asset).
+# До сборки {% static %} выдает исходные имена (munepit/storage.py).
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'munepit.storage.FingerprintedStaticStorage',
+    },
+}
+
+# Срок кэширования статики с хешем в имени (сек)
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
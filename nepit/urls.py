@@ -1,5 +1,5 @@
 # urls.py
-from django.urls import path
+from django.urls import path, re_path
 from munepit import views
 
 urlpatterns = [
@@ -14,6 +14,9 @@ urlpatterns = [
     # Поиск игрока
     path('player/search/', views.player_search, name='player_search'),
     path('player/<str:player_id>/', views.player_detail, name='player_detail'),
+    path('state/', views.game_state, name='game_state'),
+    path('reports/', views.report_jobs, name='report_jobs'),
+    path('reports/<int:pk>/download/', views.report_job_download, name='report_job_download'),
     # Стол "Остров"
     path('island/', views.island_dashboard, name='island_dashboard'),
     path('island/deal/', views.island_deal, name='island_deal'),
@@ -51,5 +54,15 @@ urlpatterns = [
     # API endpoints
     path('api/building-profit/', views.api_get_building_profit, name='api_building_profit'),
     path('api/convict-time/', views.api_get_convict_time, name='api_convict_time'),
+    path('api/convict-times/', views.api_get_convict_times, name='api_convict_times'),
     path('api/dynamic-price/', views.api_get_dynamic_price, name='api_dynamic_price'),
+    path('api/timers/', views.api_get_timers, name='api_timers'),
+    path('api/price-history/', views.api_price_history, name='api_price_history'),
+    path('api/statistics/series/', views.api_statistics_series, name='api_statistics_series'),
+    path('api/jobs/<int:pk>/', views.api_report_job, name='api_report_job'),
+    path('api/lanes/', views.api_lanes, name='api_lanes'),
+    path('api/privateer-complaints/', views.api_privateer_complaints, name='api_privateer_complaints'),
+
+    # Собранная статика (build_static); runserver с DEBUG отдает исходники сам
+    re_path(r'^static/(?P<path>.+)$', views.static_asset, name='static_asset'),
 ]
\ No newline at end of file